@@ -0,0 +1,244 @@
+"""Async serving mode for the bot
+
+    python asgi.py
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Requests are accepted on an asyncio event loop, and the Flask views run in two
+separate thread pools. A request that will call Gemini runs on the AI pool of
+LLM_CONCURRENCY threads. It waits in the pool's queue, holding no thread,
+until a worker frees up. Every other request runs on the request pool. That
+covers cache hits, fallbacks and the deterministic endpoints (scoring, layout,
+status, metrics), so slow AI calls can never starve them. The choice is made
+per request by main.expects_gemini_call. Responses, including SSE and NDJSON
+streams, are exactly what the Flask app produces.
+
+Both pools are threads. CPU-heavy work shares the GIL, except batch
+validation and Pareto starts, which main sends to its process pool.
+"""
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from main import app as flask_app, expects_gemini_call, startup
+
+# Routes that can call Gemini; expects_gemini_call decides per request whether they will
+AI_ROUTES = frozenset(["/validate_habitat", "/optimize_habitat_ai", "/validate_habitats_batch", "/test_model"])
+# Routes whose body can be a long stream, routed on the query string alone
+STREAMED_BODY_ROUTES = frozenset(["/validate_habitats_batch"])
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '4'))
+REQUEST_WORKERS = int(os.getenv('REQUEST_WORKERS', str(min(32, (os.cpu_count() or 1) + 4))))
+
+
+class _RequestBody:
+    """wsgi.input that pulls body chunks from the ASGI receive channel on demand"""
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = b""
+        self.finished = False
+
+    def peek_all(self):
+        """Read the whole body but leave it in the buffer for the app"""
+        while self._fill():
+            pass
+        return self.buffer
+
+    def _fill(self):
+        if self.finished:
+            return False
+        message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+        if message["type"] == "http.disconnect":
+            self.finished = True
+            return False
+        self.buffer += message.get("body", b"")
+        self.finished = not message.get("more_body", False)
+        return True
+
+    def read(self, size=-1):
+        while (size is None or size < 0 or len(self.buffer) < size) and self._fill():
+            pass
+        if size is None or size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        while b"\n" not in self.buffer and (size is None or size < 0 or len(self.buffer) < size) and self._fill():
+            pass
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        data, self.buffer = self.buffer[:end], self.buffer[end:]
+        return data
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": str(client[0]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsyncServer:
+    """ASGI application serving a WSGI app from separate AI and request thread pools
+
+    needs_ai(environ, body) picks the pool for a request to one of ai_routes.
+    The AI pool's size is the Gemini concurrency limit. Requests beyond it
+    queue in the executor without holding a thread.
+    """
+
+    def __init__(self, wsgi_app, llm_concurrency=LLM_CONCURRENCY, request_workers=REQUEST_WORKERS,
+                 ai_routes=AI_ROUTES, needs_ai=expects_gemini_call, on_startup=startup):
+        self.wsgi_app = wsgi_app
+        self.on_startup = on_startup
+        self.ai_routes = ai_routes
+        self.needs_ai = needs_ai
+        self.llm_concurrency = llm_concurrency
+        self.llm_pool = ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="llm")
+        self.request_pool = ThreadPoolExecutor(max_workers=request_workers, thread_name_prefix="request")
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.in_use = 0
+        self.served = {"ai": 0, "request": 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        loop = asyncio.get_running_loop()
+        environ = await loop.run_in_executor(self.request_pool, self._route, scope, receive, send, loop)
+        if environ is None:
+            return
+        with self.lock:
+            self.waiting += 1
+        await loop.run_in_executor(self.llm_pool, self._run_ai, environ, send, loop)
+
+    def _route(self, scope, receive, send, loop):
+        """Request pool: serve the request here, or return its environ when it should go to the AI pool"""
+        body = _RequestBody(receive, loop)
+        environ = build_environ(scope, body)
+        if scope["path"] in self.ai_routes:
+            data = None if scope["path"] in STREAMED_BODY_ROUTES else body.peek_all()
+            try:
+                ai = self.needs_ai(environ, data)
+            except Exception as e:
+                print(f"AI routing check failed: {e}")
+                ai = True
+            if ai:
+                return environ
+        with self.lock:
+            self.served["request"] += 1
+        self._run_wsgi(environ, send, loop)
+        return None
+
+    def _run_ai(self, environ, send, loop):
+        with self.lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.served["ai"] += 1
+        try:
+            self._run_wsgi(environ, send, loop)
+        finally:
+            with self.lock:
+                self.in_use -= 1
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.on_startup is not None:
+                    await asyncio.get_running_loop().run_in_executor(self.request_pool, self.on_startup)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.llm_pool.shutdown(wait=False)
+                self.request_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _run_wsgi(self, environ, send, loop):
+        """Worker thread: run the WSGI app and forward its output to the ASGI send channel"""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        def forward(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        body = self.wsgi_app(environ, start_response)
+        started = False
+        try:
+            # Each chunk is sent as soon as it is produced, so SSE and NDJSON streams stay incremental
+            for chunk in body:
+                if not chunk:
+                    continue
+                if not started:
+                    forward({"type": "http.response.start", "status": response["status"],
+                             "headers": response["headers"]})
+                    started = True
+                forward({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not started:
+                forward({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+            forward({"type": "http.response.body", "body": b"", "more_body": False})
+        except OSError as e:
+            print(f"Client disconnected: {e}")
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "llmConcurrency": self.llm_concurrency,
+                "llmInUse": self.in_use,
+                "llmWaiting": self.waiting,
+                "served": dict(self.served),
+            }
+
+
+app = AsyncServer(flask_app)
+flask_app.config["ASYNC_SERVER"] = app
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv('PORT', '5000')))
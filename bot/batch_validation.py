@@ -0,0 +1,83 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from scoring import fallback_validation
+
+_pool = None
+
+
+def get_pool(workers=None):
+    """Shared process pool of spawned workers
+
+    A spawned worker re-imports the parent's __main__ script (main.py or
+    asgi.py, which imports main) before it imports this module. So those
+    scripts must not do expensive work at import time. main.py loads the
+    guidelines in startup() for that reason.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                    mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def validate_item(index, payload):
+    """Worker: validate one design given as a dict or an NDJSON line"""
+    try:
+        design_data = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+        if not isinstance(design_data, dict):
+            raise ValueError("design must be a JSON object")
+        result = fallback_validation(design_data)
+        return {"index": index, "id": design_data.get('id'), **result}
+    except Exception as e:
+        return {"index": index, "error": str(e)}
+
+
+def iter_ndjson(stream):
+    """Yield non-empty lines from a binary stream without reading it all into memory"""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def validate_chunk(start, payloads):
+    """Worker: validate consecutive designs, amortizing inter-process overhead"""
+    return [validate_item(start + offset, payload) for offset, payload in enumerate(payloads)]
+
+
+def _chunks(items, chunk_size):
+    chunk, start = [], 0
+    for index, payload in enumerate(items):
+        if not chunk:
+            start = index
+        chunk.append(payload)
+        if len(chunk) >= chunk_size:
+            yield start, chunk
+            chunk = []
+    if chunk:
+        yield start, chunk
+
+
+def run_batch(items, chunk_size=8, max_in_flight=None, pool=None):
+    """Validate designs on the process pool, yielding results as chunks complete
+
+    At most max_in_flight chunks are queued at once, so memory stays flat no
+    matter how long the input is. Results carry their input index since they
+    come back in completion order.
+    """
+    pool = pool or get_pool()
+    max_in_flight = max_in_flight or 2 * (os.cpu_count() or 1)
+    pending = set()
+    for start, chunk in _chunks(items, chunk_size):
+        if len(pending) >= max_in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+        pending.add(pool.submit(validate_chunk, start, chunk))
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from future.result()
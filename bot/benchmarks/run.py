@@ -0,0 +1,234 @@
+"""Benchmarks for the bot's scoring, layout and endpoint hot paths
+
+Run from the bot directory:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --quick --compare bench.json
+
+Gemini is replaced by an in-process stub, so no network access or API quota is used.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BOT_DIR not in sys.path:
+    sys.path.insert(0, BOT_DIR)
+
+from benchmarks.synthetic import DesignGenerator  # noqa: E402
+
+STUB_REPLY = json.dumps({
+    "validation": {"overallScore": 80, "compliance": "warning", "issues": [], "recommendations": []},
+    "analysis": {"volumeAnalysis": "", "zoningAnalysis": "", "adjacencyAnalysis": "", "safetyAnalysis": ""}
+})
+
+
+def install_genai_stub(latency=0.0):
+    """Register a fake google.generativeai that answers every call with STUB_REPLY"""
+    class Response:
+        def __init__(self, text):
+            self.text = text
+
+    class GenerativeModel:
+        def __init__(self, model_name=None, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, prompt, stream=False, **kwargs):
+            time.sleep(latency)
+            if stream:
+                return iter([Response(STUB_REPLY)])
+            return Response(STUB_REPLY)
+
+    genai = types.ModuleType('google.generativeai')
+    genai.GenerativeModel = GenerativeModel
+    genai.configure = lambda **kwargs: None
+    genai.list_models = lambda: []
+    google = sys.modules.setdefault('google', types.ModuleType('google'))
+    google.generativeai = genai
+    sys.modules['google.generativeai'] = genai
+    return genai
+
+
+def measure(fn, min_time=0.2, min_runs=3, max_runs=1000):
+    """Call fn repeatedly, returning latency stats in milliseconds"""
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_runs or (time.perf_counter() - started < min_time and len(samples) < max_runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "minMs": round(samples[0], 4),
+        "medianMs": round(statistics.median(samples), 4),
+        "p95Ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "meanMs": round(statistics.fmean(samples), 4),
+    }
+
+
+class Suite:
+    def __init__(self, min_time):
+        self.min_time = min_time
+        self.results = []
+
+    def run(self, name, params, fn, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = measure(fn, min_time=self.min_time, **kwargs)
+        self.results.append({"name": name, "params": params, "stats": stats})
+        print(f"{name:<40} {json.dumps(params):<28} median {stats['medianMs']:>10.3f} ms  ({stats['runs']} runs)")
+        return stats
+
+
+def micro_benchmarks(suite, generator, sizes):
+    from scoring import calculate_compliance_score, fallback_validation, ScoreState
+    from pathing import path_report
+    from optimizer import AnnealingOptimizer
+    import main
+
+    for n in sizes:
+        design = generator.design(n)
+        modules, habitat_config = design['modules'], design['habitatConfig']
+        params = {"modules": n}
+        suite.run("calculate_compliance_score", params, lambda: calculate_compliance_score(modules, habitat_config))
+        suite.run("fallback_validation", params, lambda: fallback_validation(design))
+        suite.run("path_report", params, lambda: path_report(modules, habitat_config), max_runs=50)
+        suite.run("ensure_essential_modules", params, lambda: main.ensure_essential_modules(modules, habitat_config))
+        suite.run("create_nasa_compliant_layout", params,
+                  lambda: main.create_nasa_compliant_layout(modules, habitat_config), max_runs=50)
+
+        state = ScoreState(modules, habitat_config)
+        target = modules[0]['id']
+        positions = iter(generator.design(1000)['modules'] * 1000)
+        suite.run("score_delta_move", params,
+                  lambda: (state.move({'id': target, 'position': next(positions)['position']}), state.score()))
+
+        if n <= 1000:
+            search = AnnealingOptimizer(modules, habitat_config, seed=0).run(0.2)
+            suite.results.append({"name": "optimizer_throughput", "params": params,
+                                  "stats": {"evaluationsPerSecond": search["evaluationsPerSecond"]}})
+            print(f"{'optimizer_throughput':<40} {json.dumps(params):<28} {search['evaluationsPerSecond']:>10} evals/s")
+
+
+def endpoint_benchmarks(suite, generator, sizes, concurrency, requests_total=200):
+    import main
+    from rate_limiter import RateLimiter
+
+    client = main.app.test_client()
+    # Unlimited AI slots so the stubbed AI path is exercised on every call
+    main.api_limiter = RateLimiter(0, 10**9)
+
+    for n in sizes:
+        design = generator.design(n)
+        params = {"modules": n}
+
+        def validate_uncached():
+            main.result_cache.clear()
+            client.post('/validate_habitat', json=design)
+
+        suite.run("POST /validate_habitat (ai stub)", params, validate_uncached, max_runs=200)
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post('/validate_habitat', json=design)
+        suite.run("POST /validate_habitat (cache hit)", params, lambda: client.post('/validate_habitat', json=design))
+        suite.run("POST /optimize_habitat", params,
+                  lambda: client.post('/optimize_habitat', json={**design, 'timeBudgetMs': 0, 'seed': 0}), max_runs=50)
+        suite.run("POST /score_delta (full)", params, lambda: client.post('/score_delta', json=design), max_runs=200)
+    suite.run("GET /api_status", {}, lambda: client.get('/api_status'))
+
+    # Throughput with concurrent clients on the deterministic endpoint
+    design = generator.design(min(sizes))
+
+    def worker(_):
+        with main.app.test_client() as c:
+            c.post('/optimize_habitat', json={**design, 'timeBudgetMs': 0, 'seed': 0})
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(requests_total)))
+        elapsed = time.perf_counter() - started
+    throughput = round(requests_total / elapsed, 1)
+    suite.results.append({"name": "throughput /optimize_habitat", "params": {"modules": min(sizes), "threads": concurrency},
+                          "stats": {"requestsPerSecond": throughput}})
+    print(f"{'throughput /optimize_habitat':<40} {json.dumps({'threads': concurrency}):<28} {throughput:>10} req/s")
+
+
+def compare(results, baseline_path):
+    """Print the change in median latency against a previous run"""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {(r["name"], json.dumps(r["params"], sort_keys=True)): r["stats"]
+                    for r in json.load(file)["results"]}
+    print(f"\nComparison against {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if not old or "medianMs" not in old or "medianMs" not in result["stats"]:
+            continue
+        change = (result["stats"]["medianMs"] - old["medianMs"]) / old["medianMs"] * 100 if old["medianMs"] else 0.0
+        flag = "  REGRESSION" if change > 20 else ""
+        print(f"{result['name']:<40} {json.dumps(result['params']):<28} {change:+7.1f}%{flag}")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000', help='comma-separated module counts')
+    parser.add_argument('--endpoint-sizes', default='10,100,1000', help='module counts for endpoint benchmarks')
+    parser.add_argument('--quick', action='store_true', help='small sizes and short runs')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds spent per benchmark')
+    parser.add_argument('--threads', type=int, default=8, help='client threads for the throughput benchmark')
+    parser.add_argument('--requests', type=int, default=200, help='requests sent in the throughput benchmark')
+    parser.add_argument('--ai-latency-ms', type=float, default=0.0, help='simulated Gemini latency')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--compare', help='previous JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.sizes, args.endpoint_sizes, args.min_time = '10,100,1000', '10,100', 0.1
+    sizes = [int(s) for s in args.sizes.split(',')]
+    endpoint_sizes = [int(s) for s in args.endpoint_sizes.split(',')]
+
+    install_genai_stub(args.ai_latency_ms / 1000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+    # Keep the stub's model choice out of the real model cache
+    main.model_discovery.cache_path = os.path.join(tempfile.mkdtemp(), 'model_cache.json')
+    import numpy
+
+    suite = Suite(args.min_time)
+    generator = DesignGenerator(seed=args.seed)
+    micro_benchmarks(suite, generator, sizes)
+    endpoint_benchmarks(suite, generator, endpoint_sizes, args.threads, args.requests)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "threads": threading.active_count(),
+        },
+        "results": suite.results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nWrote {len(suite.results)} results to {args.output}")
+    if args.compare:
+        compare(suite.results, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main_cli()
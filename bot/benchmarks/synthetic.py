@@ -0,0 +1,90 @@
+import glob
+import json
+import math
+import os
+import random
+
+SAMPLE_DESIGNS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  '..', '..', 'frontend', 'public', 'sample-designs')
+
+# Every module type the layout code knows about
+MODULE_TYPES = [
+    'life-support', 'airlock', 'sleep', 'food', 'hygiene', 'medical', 'exercise',
+    'workstation', 'storage', 'recreation', 'laboratory', 'greenhouse', 'communication', 'maintenance'
+]
+SHAPES = ['cylinder', 'sphere', 'torus']
+
+# Used for types that do not appear in any sample design
+DEFAULT_TEMPLATE = {'size': [2.5, 2.5, 2.5], 'volume': 15.6, 'color': '#6b7280'}
+
+
+def load_samples(directory=SAMPLE_DESIGNS_DIR):
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'r', encoding='utf-8') as file:
+            samples.append(json.load(file))
+    return samples
+
+
+def module_templates(samples):
+    """Size, volume and color per module type, taken from the sample designs"""
+    templates = {}
+    for design in samples:
+        for module in design.get('modules', []):
+            templates.setdefault(module.get('type'), {
+                'size': module.get('size', DEFAULT_TEMPLATE['size']),
+                'volume': module.get('volume', DEFAULT_TEMPLATE['volume']),
+                'color': module.get('color', DEFAULT_TEMPLATE['color']),
+            })
+    return {t: templates.get(t, DEFAULT_TEMPLATE) for t in MODULE_TYPES}
+
+
+class DesignGenerator:
+    """Seeded synthetic habitat designs shaped like the frontend sample designs"""
+
+    def __init__(self, seed=0, samples=None):
+        self.rng = random.Random(seed)
+        self.samples = samples if samples is not None else load_samples()
+        self.templates = module_templates(self.samples)
+        type_weights = {t: 1.0 for t in MODULE_TYPES}
+        for design in self.samples:
+            for module in design.get('modules', []):
+                type_weights[module.get('type')] = type_weights.get(module.get('type'), 1.0) + 1
+        self.types = list(type_weights)
+        self.weights = [type_weights[t] for t in self.types]
+
+    def habitat_config(self, module_count, shape=None):
+        """Habitat sized so module density stays close to the samples'"""
+        base = self.rng.choice(self.samples)['habitatConfig'] if self.samples else {}
+        radius = round(max(base.get('radius', 6), 2.0 * math.sqrt(module_count)), 1)
+        height = round(max(base.get('height', 12), radius * 1.5), 1)
+        crew = max(2, min(module_count // 4, base.get('mission', {}).get('crewSize', 4) * (1 + module_count // 50)))
+        return {
+            'shape': shape or self.rng.choice(SHAPES),
+            'radius': radius,
+            'height': height,
+            'volume': round(math.pi * radius * radius * height, 2),
+            'levels': 1,
+            'mission': {**base.get('mission', {}), 'crewSize': crew},
+        }
+
+    def design(self, module_count, shape=None):
+        habitat_config = self.habitat_config(module_count, shape)
+        radius = habitat_config['radius'] - 1.5
+        half_height = habitat_config['height'] / 2 - 1.5
+        modules = []
+        for i, mod_type in enumerate(self.rng.choices(self.types, weights=self.weights, k=module_count)):
+            angle = self.rng.uniform(0, 2 * math.pi)
+            planar = radius * math.sqrt(self.rng.random())
+            template = self.templates[mod_type]
+            modules.append({
+                'id': f'{mod_type}-{i + 1}',
+                'type': mod_type,
+                'position': [round(planar * math.cos(angle), 2), round(self.rng.uniform(-half_height, half_height), 2),
+                             round(planar * math.sin(angle), 2)],
+                'rotation': [0, self.rng.choice([0, 1.57]), 0],
+                'size': list(template['size']),
+                'volume': template['volume'],
+                'color': template['color'],
+            })
+        return {'habitatConfig': habitat_config, 'modules': modules}
@@ -0,0 +1,141 @@
+import contextlib
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Consecutive failures of each class that trip the breaker; quota errors will not clear on a retry
+DEFAULT_THRESHOLDS = {"quota": 1, "rate": 1, "429": 1, "other": 5, "deadline": 5}
+
+
+class Attempt:
+    """One call that a CircuitBreaker let through, see CircuitBreaker.attempt"""
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.recorded = False
+
+    def success(self):
+        self.breaker.record_success()
+        self.recorded = True
+
+    def failure(self, error_class):
+        self.breaker.record_failure(error_class)
+        self.recorded = True
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker that stops calling a failing upstream
+
+    While closed, calls go through and consecutive failures are counted per
+    error class. Reaching a class's threshold opens the breaker, and allow()
+    then returns False without doing any work. Once the open period ends, one
+    probe call is let through (half-open). Its success closes the breaker. Its
+    failure reopens it for twice as long, up to max_open_seconds.
+    """
+
+    def __init__(self, thresholds=DEFAULT_THRESHOLDS, open_seconds=30.0, quota_open_seconds=300.0,
+                 max_open_seconds=600.0, clock=time.monotonic):
+        self.thresholds = dict(thresholds)
+        self.open_seconds = open_seconds
+        self.quota_open_seconds = quota_open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = {}
+        self.open_until = 0.0
+        self.current_open_seconds = 0.0
+        self.probe_in_flight = False
+        self.last_error_class = None
+        self.trips = 0
+        self.short_circuited = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go out now; in half-open state only one probe at a time is allowed"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() >= self.open_until:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def release(self):
+        """Give back a probe slot that allow() granted but that never turned into a call"""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+
+    @contextlib.contextmanager
+    def attempt(self):
+        """Scope of the work after allow() returned True, yields an Attempt
+
+        Record the call's outcome with attempt.success() or
+        attempt.failure(error_class). If the block ends without either, for
+        example no model was available or the client went away mid-stream,
+        a half-open probe slot is given back.
+        """
+        call = Attempt(self)
+        try:
+            yield call
+        finally:
+            if not call.recorded:
+                self.release()
+
+    def is_open(self):
+        with self.lock:
+            return self.state == OPEN and self.clock() < self.open_until
+
+    def record_success(self):
+        with self.lock:
+            if self.state != CLOSED:
+                print("Gemini circuit closed")
+            self.state = CLOSED
+            self.failures.clear()
+            self.current_open_seconds = 0.0
+            self.probe_in_flight = False
+
+    def record_failure(self, error_class):
+        with self.lock:
+            self.last_error_class = error_class
+            if self.state == HALF_OPEN:
+                # The probe failed, back off further
+                self._open(min(self.max_open_seconds, max(self.current_open_seconds * 2, self.open_seconds)))
+                return
+            if self.state == OPEN:
+                return
+            self.failures[error_class] = self.failures.get(error_class, 0) + 1
+            if self.failures[error_class] >= self.thresholds.get(error_class, self.thresholds.get("other", 5)):
+                quota = error_class in ("quota", "rate", "429")
+                self._open(self.quota_open_seconds if quota else self.open_seconds)
+
+    def _open(self, seconds):
+        self.state = OPEN
+        self.current_open_seconds = seconds
+        self.open_until = self.clock() + seconds
+        self.probe_in_flight = False
+        self.failures.clear()
+        self.trips += 1
+        print(f"Gemini circuit open for {seconds:.0f}s after {self.last_error_class} errors")
+
+    def status(self):
+        with self.lock:
+            now = self.clock()
+            state = self.state
+            if state == OPEN and now >= self.open_until:
+                state = HALF_OPEN
+            return {
+                "state": state,
+                "retryInSeconds": round(max(0.0, self.open_until - now), 1) if state == OPEN else 0.0,
+                "lastErrorClass": self.last_error_class,
+                "failures": dict(self.failures),
+                "trips": self.trips,
+                "shortCircuited": self.short_circuited
+            }
@@ -0,0 +1,337 @@
+import math
+
+import numpy as np
+
+# Free space kept between module walls when placing or optimizing a layout, meters
+MIN_CLEARANCE = 0.5
+# Layout positions are rounded to this many decimal places, centimetres
+POSITION_DECIMALS = 2
+# Smaller protrusions outside the shell do not count
+CONTAINMENT_TOLERANCE = 0.01
+# Cross-product axes shorter than this come from parallel edges and are covered by face axes
+PARALLEL_EPSILON = 1e-6
+
+# Box corners
+CORNER_SIGNS = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=float)
+
+# Gather indices for the nine A_i x B_j cross-product axes, so each input is gathered once
+_I = np.repeat(np.arange(3), 3)
+_J = np.tile(np.arange(3), 3)
+_I1, _I2 = (_I + 1) % 3, (_I + 2) % 3
+_J1, _J2 = (_J + 1) % 3, (_J + 2) % 3
+_EDGE_ROTATION = np.concatenate([_I1 * 3 + _J, _I2 * 3 + _J, _I * 3 + _J])
+_EDGE_ABS_ROTATION = np.concatenate([_I2 * 3 + _J, _I1 * 3 + _J, _I * 3 + _J2, _I * 3 + _J1])
+_EDGE_A = np.concatenate([_I1, _I2])
+_EDGE_B = np.concatenate([_J1, _J2])
+
+
+def rotation_matrices(angles):
+    """(n, 3) XYZ Euler angles in radians to (n, 3, 3) rotation matrices, R = Rx @ Ry @ Rz like three.js"""
+    angles = np.asarray(angles, dtype=float).reshape(-1, 3)
+    cx, cy, cz = np.cos(angles).T
+    sx, sy, sz = np.sin(angles).T
+    rotations = np.empty((len(angles), 3, 3))
+    rotations[:, 0, 0] = cy * cz
+    rotations[:, 0, 1] = -cy * sz
+    rotations[:, 0, 2] = sy
+    rotations[:, 1, 0] = cx * sz + sx * sy * cz
+    rotations[:, 1, 1] = cx * cz - sx * sy * sz
+    rotations[:, 1, 2] = -sx * cy
+    rotations[:, 2, 0] = sx * sz - cx * sy * cz
+    rotations[:, 2, 1] = sx * cz + cx * sy * sz
+    rotations[:, 2, 2] = cx * cy
+    return rotations
+
+
+def _vector(value, default):
+    values = list(value[:3]) if isinstance(value, (list, tuple)) else []
+    return [float(v) for v in values] + list(default[len(values):])
+
+
+class OrientedBoxes:
+    """Module footprints as oriented boxes: centres, half sizes and rotation matrices
+
+    Module size is [width, height, depth] along the module's local x, y and z
+    axes, and rotation is three.js XYZ Euler angles in radians. A module without
+    a size is treated as a point. centers may be replaced by any (n, 3) array,
+    for example an optimizer's position array, and is read on every call.
+    """
+
+    def __init__(self, centers, half_sizes, rotations):
+        self.centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        self.half_sizes = np.abs(np.asarray(half_sizes, dtype=float).reshape(-1, 3))
+        self.axes = np.asarray(rotations, dtype=float).reshape(-1, 3, 3)
+        # World-axis half extents of each box's AABB, which do not depend on position
+        self.extents = np.einsum('nij,nj->ni', np.abs(self.axes), self.half_sizes)
+        self.bounds = np.sqrt(np.einsum('ij,ij->i', self.half_sizes, self.half_sizes))
+        # Boxes turned by multiples of 90 degrees are their own AABB, which makes SAT a 3-axis test
+        self.aligned = np.all(np.abs(np.abs(self.axes) - np.round(np.abs(self.axes))) < PARALLEL_EPSILON, axis=(1, 2))
+
+    @classmethod
+    def from_modules(cls, modules):
+        centers = [_vector(m.get('position'), (0.0, 0.0, 0.0)) for m in modules]
+        half_sizes = [[s / 2 for s in _vector(m.get('size'), (0.0, 0.0, 0.0))] for m in modules]
+        angles = [_vector(m.get('rotation'), (0.0, 0.0, 0.0)) for m in modules]
+        return cls(np.reshape(centers, (-1, 3)), np.reshape(half_sizes, (-1, 3)), rotation_matrices(angles))
+
+    def __len__(self):
+        return len(self.half_sizes)
+
+    def aabb(self, centers=None):
+        """Return (lo, hi) world-axis bounding boxes, at the given centres if passed"""
+        centers = self.centers if centers is None else centers
+        return centers - self.extents, centers + self.extents
+
+    def corners(self, centers=None, signs=CORNER_SIGNS):
+        """(n, k, 3) world points at the given local sign patterns, box corners by default"""
+        centers = self.centers if centers is None else centers
+        local = signs[None, :, :] * self.half_sizes[:, None, :]
+        return centers[:, None, :] + np.einsum('nij,nkj->nki', self.axes, local)
+
+    def clear_of(self, k, centers, clearance=0.0, among=None):
+        """For each candidate centre of box k, True if every other box is at least clearance away
+
+        among optionally limits the test to the given box indices, for callers
+        that already know which boxes are nearby. Candidates are filtered on
+        their AABBs first, then all remaining pairs go through one box_gaps call.
+        """
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        among = np.arange(len(self)) if among is None else np.asarray(among, dtype=np.intp)
+        among = among[among != k]
+        reach = self.extents[among] + self.extents[k] + clearance
+        near = np.all(np.abs(self.centers[among][None, :, :] - centers[:, None, :]) <= reach, axis=2)
+        query, others = np.nonzero(near)
+        clear = np.ones(len(centers), dtype=bool)
+        if len(query):
+            others = among[others]
+            gaps = box_gaps(self, np.full(len(query), k), centers[query], self, others, self.centers[others])
+            clear[query[gaps < clearance]] = False
+        return clear
+
+
+def box_gaps(boxes_a, index_a, centers_a, boxes_b, index_b, centers_b):
+    """Separation of boxes_a[index_a] at centers_a from boxes_b[index_b] at centers_b, pair by pair
+
+    Pairs where both boxes are axis-aligned are measured on their AABBs,
+    which is exact for them and much cheaper. Every other pair gets the full
+    separating axis test. All collision checks go through here, so incremental
+    and full rescoring always agree.
+    """
+    gaps = (np.abs(centers_b - centers_a) - (boxes_a.extents[index_a] + boxes_b.extents[index_b])).max(axis=1)
+    turned = ~(boxes_a.aligned[index_a] & boxes_b.aligned[index_b])
+    if turned.any():
+        a, b = index_a[turned], index_b[turned]
+        gaps[turned] = separation(centers_a[turned], boxes_a.half_sizes[a], boxes_a.axes[a],
+                                  centers_b[turned], boxes_b.half_sizes[b], boxes_b.axes[b])
+    return gaps
+
+
+def separation(center_a, half_a, axes_a, center_b, half_b, axes_b):
+    """Vectorized separating axis test between box pairs, returns an (m,) array
+
+    Each entry is the largest gap along any of the 15 candidate axes. A
+    positive value means the boxes are apart by at least that much, and it is
+    the exact distance when the closest features are parallel faces. A value
+    of zero or less means they overlap, and its magnitude is the smallest push
+    along any axis that would separate them.
+    """
+    to_a = axes_a.transpose(0, 2, 1)
+    rotation = to_a @ axes_b
+    abs_rotation = np.abs(rotation)
+    offset = (to_a @ (center_b - center_a)[:, :, None])[:, :, 0]
+
+    # Face axes of A, then of B
+    gap_a = np.abs(offset) - half_a - (abs_rotation @ half_b[:, :, None])[:, :, 0]
+    gap_b = (np.abs((offset[:, None, :] @ rotation)[:, 0, :])
+             - (half_a[:, None, :] @ abs_rotation)[:, 0, :] - half_b)
+    best = np.maximum(gap_a.max(axis=1), gap_b.max(axis=1))
+
+    # Edge cross-product axes A_i x B_j, normalised so gaps are in meters
+    m = len(rotation)
+    r_i1, r_i2, r_ij = rotation.reshape(m, 9)[:, _EDGE_ROTATION].reshape(m, 3, 9).transpose(1, 0, 2)
+    a_i2, a_i1, a_j2, a_j1 = abs_rotation.reshape(m, 9)[:, _EDGE_ABS_ROTATION].reshape(m, 4, 9).transpose(1, 0, 2)
+    h_a1, h_a2 = np.broadcast_to(half_a, offset.shape)[:, _EDGE_A].reshape(m, 2, 9).transpose(1, 0, 2)
+    h_b1, h_b2 = np.broadcast_to(half_b, offset.shape)[:, _EDGE_B].reshape(m, 2, 9).transpose(1, 0, 2)
+    t_1, t_2 = offset[:, _EDGE_A].reshape(m, 2, 9).transpose(1, 0, 2)
+    extent = h_a1 * a_i2 + h_a2 * a_i1 + h_b1 * a_j2 + h_b2 * a_j1
+    length = np.sqrt(np.maximum(0.0, 1.0 - r_ij * r_ij))
+    gap_edge = (np.abs(t_2 * r_i1 - t_1 * r_i2) - extent) / np.maximum(length, PARALLEL_EPSILON)
+    gap_edge[length <= PARALLEL_EPSILON] = -np.inf
+    return np.maximum(best, gap_edge.max(axis=1))
+
+
+def sweep_and_prune(lo, hi, margin=0.0):
+    """Broad phase: (i, j) index arrays, i < j, of boxes whose AABBs come within margin
+
+    Boxes are sorted along the axis with the widest spread of centres. Each one
+    is then paired with the run of later boxes that start before it ends, found
+    with a single searchsorted. The other two axes filter the candidates.
+    """
+    lo = np.asarray(lo, dtype=float).reshape(-1, 3)
+    hi = np.asarray(hi, dtype=float).reshape(-1, 3)
+    empty = np.empty(0, dtype=np.intp)
+    n = len(lo)
+    if n < 2:
+        return empty, empty
+
+    axis = int(np.argmax((lo + hi).var(axis=0)))
+    order = np.argsort(lo[:, axis], kind='stable')
+    starts = lo[order, axis]
+    stop = np.searchsorted(starts, hi[order, axis] + margin, side='right')
+    counts = np.maximum(stop - np.arange(n) - 1, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return empty, empty
+    first = np.repeat(np.arange(n), counts)
+    # Position of each pair inside its run of later boxes
+    run_offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_i = order[first]
+    pair_j = order[first + 1 + run_offsets]
+
+    close = np.all((lo[pair_j] <= hi[pair_i] + margin) & (lo[pair_i] <= hi[pair_j] + margin), axis=1)
+    pair_i, pair_j = pair_i[close], pair_j[close]
+    pair_i, pair_j = np.minimum(pair_i, pair_j), np.maximum(pair_i, pair_j)
+    order = np.lexsort((pair_j, pair_i))
+    return pair_i[order], pair_j[order]
+
+
+def find_collisions(boxes, clearance=0.0, centers=None):
+    """(i, j, separation) for box pairs closer than clearance, overlapping pairs have separation <= 0"""
+    centers = boxes.centers if centers is None else centers
+    lo, hi = boxes.aabb(centers)
+    pair_i, pair_j = sweep_and_prune(lo, hi, margin=max(clearance, 0.0))
+    if len(pair_i) == 0:
+        return pair_i, pair_j, np.empty(0)
+    gaps = box_gaps(boxes, pair_i, centers[pair_i], boxes, pair_j, centers[pair_j])
+    # Touching faces are not a collision, only real interpenetration is
+    hit = gaps < clearance if clearance > 0 else gaps < 0
+    return pair_i[hit], pair_j[hit], gaps[hit]
+
+
+def clearance_distances(boxes, max_distance, centers=None):
+    """Per box, the separation to its nearest neighbour, or inf if none is within max_distance"""
+    nearest = np.full(len(boxes), np.inf)
+    pair_i, pair_j, gaps = find_collisions(boxes, max_distance, centers)
+    np.minimum.at(nearest, pair_i, gaps)
+    np.minimum.at(nearest, pair_j, gaps)
+    return nearest
+
+
+class Shell:
+    """Signed distance to the habitat's pressure shell, negative inside
+
+    The editor draws every habitat, whatever its shape, as a capsule lying
+    along x: a cylinder of the habitat radius and `height` long, closed by two
+    hemispheres. The shell is that capsule centred on the origin of module
+    coordinates. The editor also lifts the drawn capsule by radius - 3.8 for
+    display, which modules do not follow, so containment is reported and
+    kept by placement but not scored.
+    """
+
+    shape = 'capsule'
+
+    def __init__(self, radius=5.0, height=10.0):
+        self.radius = float(radius)
+        self.height = float(height)
+
+    @classmethod
+    def from_config(cls, habitat_config):
+        return cls(habitat_config.get('radius', 5) or 5, habitat_config.get('height', 10) or 10)
+
+    @property
+    def half_extents(self):
+        """Half size of the shell's bounding box along x, y and z"""
+        return np.array([self.height / 2 + self.radius, self.radius, self.radius])
+
+    def distance(self, points):
+        """Signed distance from (..., 3) points to the shell surface"""
+        points = np.asarray(points, dtype=float)
+        along = np.clip(points[..., 0], -self.height / 2, self.height / 2)
+        return np.sqrt((points[..., 0] - along) ** 2 + points[..., 1] ** 2 + points[..., 2] ** 2) - self.radius
+
+    def depths(self, boxes, centers=None):
+        """Per box, how far its furthest point reaches outside the shell, 0 when it fits
+
+        The capsule is convex, so it contains a box exactly when it contains the box's corners.
+        """
+        centers = boxes.centers if centers is None else centers
+        return self.depths_at(boxes, np.arange(len(boxes)), centers)
+
+    def depths_at(self, boxes, index, centers):
+        """depths() for boxes[index] placed at the given (m, 3) centres"""
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        result = np.zeros(len(centers))
+        # Boxes whose bounding sphere fits need no corner test, which is the common case
+        check = self.distance(centers) + boxes.bounds[index] > 0
+        if check.any():
+            k = np.asarray(index)[check]
+            local = CORNER_SIGNS[None, :, :] * boxes.half_sizes[k][:, None, :]
+            points = centers[check][:, None, :] + np.einsum('nij,nkj->nki', boxes.axes[k], local)
+            result[check] = np.maximum(self.distance(points).max(axis=1), 0.0)
+        return result
+
+    def outside(self, boxes, centers=None):
+        """Boolean mask of boxes that do not fit inside the shell"""
+        return self.depths(boxes, centers) > CONTAINMENT_TOLERANCE
+
+    def anchor(self, center):
+        """Deepest interior point near center: its projection onto the capsule's axis"""
+        return np.array([min(max(float(center[0]), -self.height / 2), self.height / 2), 0.0, 0.0])
+
+    def fit(self, boxes, k, center, steps=6, decimals=POSITION_DECIMALS):
+        """Slide box k from center toward the shell's anchor until it fits, returns the new centre
+
+        The shortest fitting slide is found by bisection, so a box that already
+        fits costs a single check. Every candidate is rounded to decimals
+        before it is checked, so the centre still fits once it is stored.
+        """
+        center = np.asarray(center, dtype=float)
+        fitted = np.round(center, decimals)
+        if self.depths_at(boxes, [k], fitted)[0] <= CONTAINMENT_TOLERANCE:
+            return fitted
+        anchor = self.anchor(center)
+        fitted = np.round(anchor, decimals)
+        low, high = 0.0, 1.0
+        for _ in range(steps):
+            middle = (low + high) / 2
+            candidate = np.round(center + (anchor - center) * middle, decimals)
+            if self.depths_at(boxes, [k], candidate)[0] <= CONTAINMENT_TOLERANCE:
+                high, fitted = middle, candidate
+            else:
+                low = middle
+        return fitted
+
+    def limits(self, boxes):
+        """Per box, rough (max planar radius in x-z, max |y|) bounds for its centre; fit() pulls boxes fully inside"""
+        planar = self.radius - np.hypot(boxes.extents[:, 0], boxes.extents[:, 2])
+        vertical = self.radius - boxes.extents[:, 1]
+        return np.maximum(planar, 0.0), np.maximum(vertical, 0.0)
+
+
+def geometry_report(modules, habitat_config, clearance=MIN_CLEARANCE):
+    """Collisions, shell containment and clearances for a layout, as a JSON-ready dict"""
+    boxes = OrientedBoxes.from_modules(modules)
+    shell = Shell.from_config(habitat_config)
+    pair_i, pair_j, gaps = find_collisions(boxes, clearance)
+    depths = shell.depths(boxes)
+    nearest = clearance_distances(boxes, clearance)
+
+    def module_id(i):
+        return modules[i].get('id', i)
+
+    return {
+        "shell": {"shape": shell.shape, "radius": shell.radius, "height": shell.height},
+        "collisions": [{"a": module_id(i), "b": module_id(j), "penetration": round(-gap, 3)}
+                       for i, j, gap in zip(pair_i.tolist(), pair_j.tolist(), gaps.tolist()) if gap < 0],
+        "tightClearances": [{"a": module_id(i), "b": module_id(j), "clearance": round(gap, 3)}
+                            for i, j, gap in zip(pair_i.tolist(), pair_j.tolist(), gaps.tolist()) if gap >= 0],
+        "outsideShell": [{"id": module_id(i), "depth": round(float(depths[i]), 3)}
+                         for i in np.flatnonzero(depths > CONTAINMENT_TOLERANCE).tolist()],
+        "minClearance": None if not np.isfinite(nearest).any() else round(float(nearest.min()), 3),
+    }
+
+
+def bounding_radius(module):
+    """Radius of the sphere around a module's centre that contains its box"""
+    size = _vector(module.get('size'), (0.0, 0.0, 0.0))
+    return math.sqrt(sum(s * s for s in size)) / 2
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from guidelines import DEFAULT_CACHE_DIR
+
+CHUNK_WORDS = 80
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it must of on or per should that the their this to with".split()
+)
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Extra query terms for module types whose guideline wording differs from the type name
+QUERY_EXPANSIONS = {
+    'sleep': 'sleep quarters crew noise quiet',
+    'food': 'food preparation galley storage clean',
+    'hygiene': 'hygiene wet waste water',
+    'life-support': 'life support systems maintenance technical',
+    'exercise': 'exercise active ventilation hygiene',
+    'medical': 'medical bay clean isolated',
+    'airlock': 'airlock emergency exits egress',
+    'storage': 'storage stowage',
+    'workstation': 'workstation work quiet',
+    'recreation': 'recreation social',
+    'maintenance': 'maintenance accessible technical',
+    'greenhouse': 'greenhouse plant growth',
+    'laboratory': 'laboratory research',
+    'communication': 'communication',
+}
+BASE_QUERY = 'volume crew zoning adjacency safety'
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    """Rough LLM token count, about four characters per token"""
+    return (len(text) + 3) // 4
+
+
+def chunk_text(text, chunk_words=CHUNK_WORDS):
+    """Split text into chunks of whole paragraphs, breaking up paragraphs longer than chunk_words"""
+    chunks = []
+    current, current_words = [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = "\n".join(line.strip() for line in paragraph.strip().splitlines())
+        if not paragraph:
+            continue
+        words = paragraph.split()
+        if len(words) > chunk_words:
+            if current:
+                chunks.append("\n".join(current))
+                current, current_words = [], 0
+            chunks.extend(" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words))
+            continue
+        if current_words + len(words) > chunk_words and current:
+            chunks.append("\n".join(current))
+            current, current_words = [], 0
+        current.append(paragraph)
+        current_words += len(words)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class BM25Index:
+    """Inverted index over guideline chunks with BM25 ranking"""
+
+    def __init__(self, chunks, postings, lengths):
+        self.chunks = chunks
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @classmethod
+    def build(cls, text):
+        chunks = chunk_text(text)
+        postings = {}
+        lengths = []
+        for chunk_id, chunk in enumerate(chunks):
+            terms = tokenize(chunk)
+            lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, []).append([chunk_id, count])
+        return cls(chunks, postings, lengths)
+
+    def to_dict(self):
+        return {"chunks": self.chunks, "postings": self.postings, "lengths": self.lengths}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["chunks"], data["postings"], data["lengths"])
+
+    def search(self, query, k=4):
+        """Return up to k (chunk_id, score) pairs, best first"""
+        scores = Counter()
+        total = len(self.chunks)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, count in postings:
+                norm = K1 * (1 - B + B * self.lengths[chunk_id] / (self.average_length or 1))
+                scores[chunk_id] += idf * count * (K1 + 1) / (count + norm)
+        return scores.most_common(k)
+
+    def select(self, query, token_budget, k=4):
+        """Top-k chunks for query that fit in token_budget, in document order"""
+        selected = []
+        used = 0
+        for chunk_id, _ in self.search(query, k):
+            cost = estimate_tokens(self.chunks[chunk_id])
+            if used + cost > token_budget:
+                continue
+            selected.append(chunk_id)
+            used += cost
+        return [self.chunks[i] for i in sorted(selected)]
+
+
+def design_query(design_data):
+    """Build a retrieval query from a design's module types and mission destination"""
+    habitat_config = design_data.get('habitatConfig', {})
+    mission = habitat_config.get('mission', {})
+    types = sorted(set(m.get('type') for m in design_data.get('modules', []) if m.get('type')))
+    parts = [BASE_QUERY, str(mission.get('destination', '')), habitat_config.get('shape', '')]
+    parts.extend(QUERY_EXPANSIONS.get(t, t.replace('-', ' ')) for t in types)
+    return " ".join(p for p in parts if p)
+
+
+def load_or_build_index(text, cache_dir=DEFAULT_CACHE_DIR):
+    """Load the index for this exact text from the guideline cache, building it if missing"""
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    path = os.path.join(cache_dir, f"{text_hash}.index.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return BM25Index.from_dict(json.load(file))
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = BM25Index.build(text)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(index.to_dict(), file)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write guideline index cache: {e}")
+    return index
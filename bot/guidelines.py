@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.guidelines_cache')
+# PDFs shorter than this are extracted inline, a process pool costs more than it saves
+PARALLEL_MIN_PAGES = 32
+PAGES_PER_TASK = 16
+
+# Fallback to hardcoded NASA guidelines
+BUILTIN_GUIDELINES = """
+            NASA SPACE HABITAT DESIGN GUIDELINES:
+            
+            VOLUME REQUIREMENTS (per crew member):
+            - Sleep quarters: 2.5-4.0 m³ minimum
+            - Food preparation: 1.0-2.0 m³
+            - Hygiene facilities: 0.5-1.0 m³
+            - Exercise area: 3.0-5.0 m³
+            - Workstation: 1.0-2.0 m³
+            - Recreation: 1.5-3.0 m³
+            - Medical bay: 2.0-4.0 m³
+            - Storage: 0.8-1.5 m³
+            - Total habitable volume: 25-50 m³ minimum per crew member
+            
+            ZONING REQUIREMENTS:
+            - Quiet zones (sleep, work): Isolated from noisy areas
+            - Active zones (exercise, recreation): Good ventilation, higher ceilings
+            - Wet zones (hygiene): Separate from food preparation areas
+            - Clean zones (medical, food): Isolated from contamination sources
+            - Technical zones (life support): Accessible for maintenance
+            
+            ADJACENCY RULES:
+            - Exercise areas must be near hygiene facilities
+            - Food preparation must be adjacent to storage
+            - Sleep quarters must be away from noisy equipment
+            - Medical bay must be in clean, isolated location
+            - Life support systems must be accessible but separated from living areas
+            
+            SAFETY REQUIREMENTS:
+            - Multiple emergency exits
+            - Fire suppression systems
+            - Radiation shielding considerations
+            - Structural integrity for launch and operational loads
+            """
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Worker: extract the text of pages [start, stop) from a PDF on disk"""
+    reader = PyPDF2.PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def extract_pdf_pages(pdf_path, workers=None):
+    """Extract per-page text, spreading page ranges over a process pool for large PDFs"""
+    page_count = len(PyPDF2.PdfReader(pdf_path).pages)
+    if page_count < PARALLEL_MIN_PAGES or workers == 1:
+        return _extract_page_range(pdf_path, 0, page_count)
+
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = executor.map(_extract_page_range, [pdf_path] * len(ranges),
+                              [r[0] for r in ranges], [r[1] for r in ranges])
+        return [page for chunk in chunks for page in chunk]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_cache(cache_dir, content_hash):
+    """Return the cached ingestion record for a PDF hash, or None"""
+    try:
+        with open(os.path.join(cache_dir, f"{content_hash}.json"), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(cache_dir, content_hash, record):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"{content_hash}.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(record, file)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write guidelines cache: {e}")
+
+
+def load_guidelines(pdf_path, cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    """Load guideline text from a PDF (or the built-in text), returns (text, stats)"""
+    started = time.perf_counter()
+    if not os.path.exists(pdf_path):
+        return BUILTIN_GUIDELINES, {
+            "source": "builtin",
+            "pages": 0,
+            "characters": len(BUILTIN_GUIDELINES),
+            "seconds": round(time.perf_counter() - started, 4)
+        }
+
+    content_hash = file_sha256(pdf_path)
+    record = read_cache(cache_dir, content_hash)
+    source = "cache"
+    if record is None:
+        pages = extract_pdf_pages(pdf_path, workers=workers)
+        record = {"text": "".join(pages), "pages": len(pages)}
+        write_cache(cache_dir, content_hash, record)
+        source = "pdf"
+
+    return record["text"], {
+        "source": source,
+        "pages": record["pages"],
+        "characters": len(record["text"]),
+        "sha256": content_hash,
+        "seconds": round(time.perf_counter() - started, 4)
+    }
@@ -0,0 +1,160 @@
+import json
+
+CLOSERS = {'{': '}', '[': ']'}
+
+
+class JsonExtractor:
+    """Pull one JSON object out of model output, fed all at once or chunk by chunk
+
+    Anything before the first '{' (prose, a ```json fence) is skipped and
+    anything after the object is ignored. The scanner keeps its state between
+    feed() calls, so streamed replies are parsed as they arrive. done is set as
+    soon as a balanced {...} parses as an object. A candidate that does not
+    parse (prose such as "{see below}") is dropped, and scanning resumes at
+    the next '{' after its start. If the text ends early,
+    for example at max_output_tokens, finish() cuts it back to the last
+    complete value and closes the open brackets, so every fully received
+    array element (such as a module row) is kept.
+    """
+
+    def __init__(self):
+        # Received text; joined only when a candidate is checked or repaired
+        self.chunks = []
+        self.length = 0
+        self.result = None
+        self._reset(0)
+
+    def _reset(self, pos):
+        self.pos = pos
+        self.start = None
+        self.candidate_end = None
+        self.stack = []
+        self.expecting_value = []
+        self.in_string = False
+        self.escape = False
+        self.safe_pos = None
+        self.safe_closers = ""
+
+    @property
+    def done(self):
+        return self.result is not None
+
+    def _text(self):
+        if len(self.chunks) > 1:
+            self.chunks[:] = ["".join(self.chunks)]
+        return self.chunks[0] if self.chunks else ""
+
+    def feed(self, chunk):
+        """Scan more text, returns True once a complete JSON object has been parsed"""
+        if self.done:
+            return True
+        self.chunks.append(chunk)
+        text, offset = chunk, self.length
+        self.length += len(chunk)
+        while True:
+            self._scan(text, offset)
+            if self.candidate_end is None:
+                return False
+            text, offset = self._text(), 0
+            try:
+                result = json.loads(text[self.start:self.candidate_end])
+            except ValueError:
+                result = None
+            if isinstance(result, dict):
+                self.result = result
+                return True
+            # Braces around prose, try the next '{'
+            self._reset(self.start + 1)
+
+    def _mark_safe(self, pos):
+        # The value ending at pos is complete; remember how to close everything still open
+        self.safe_pos = pos
+        self.safe_closers = "".join(CLOSERS[c] for c in reversed(self.stack))
+
+    def _scan(self, text, offset):
+        """Advance over text, which starts at position offset of the output, up to the end of a candidate"""
+        i = self.pos
+        n = offset + len(text)
+        if self.start is None:
+            found = text.find('{', i - offset)
+            if found < 0:
+                self.pos = n
+                return
+            i = offset + found
+            self.start = i
+        while i < n:
+            c = text[i - offset]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    # Strings in arrays and after ':' are values, other strings are object keys
+                    if self.stack[-1] == '[' or self.expecting_value[-1]:
+                        self._mark_safe(i + 1)
+            elif c == '"':
+                self.in_string = True
+            elif c in '{[':
+                self.stack.append(c)
+                self.expecting_value.append(False)
+            elif c in '}]':
+                self.stack.pop()
+                self.expecting_value.pop()
+                if not self.stack:
+                    self.candidate_end = i + 1
+                    self.pos = i + 1
+                    return
+                self._mark_safe(i + 1)
+            elif c == ':':
+                self.expecting_value[-1] = True
+            elif c == ',':
+                self._mark_safe(i)
+                if self.stack[-1] == '{':
+                    self.expecting_value[-1] = False
+            i += 1
+        self.pos = n
+
+    def finish(self):
+        """Return (object, repaired); raises ValueError when no JSON object can be recovered"""
+        if self.done:
+            return self.result, False
+        text = self._text()
+        if self.start is None:
+            raise ValueError("no JSON object in model output")
+        if self.safe_pos is not None:
+            repaired = text[self.start:self.safe_pos].rstrip().rstrip(',') + self.safe_closers
+            try:
+                return json.loads(repaired), True
+            except ValueError as e:
+                error = f"could not repair truncated model output: {e}"
+        else:
+            error = "model output ended before any complete value"
+        # A stray quote in prose can swallow the real object into a string, so look again from scratch
+        try:
+            return _scan_for_object(text), False
+        except ValueError:
+            raise ValueError(error) from None
+
+
+def _scan_for_object(text):
+    """Slow path: the first '{' that starts a valid JSON object anywhere in text"""
+    decoder = json.JSONDecoder()
+    i = text.find('{')
+    while i >= 0:
+        try:
+            result, _ = decoder.raw_decode(text, i)
+            if isinstance(result, dict):
+                return result
+        except ValueError:
+            pass
+        i = text.find('{', i + 1)
+    raise ValueError("no valid JSON object in model output")
+
+
+def extract_json(text):
+    """Parse the JSON object in a complete model reply, returns (object, repaired)"""
+    extractor = JsonExtractor()
+    extractor.feed(text or "")
+    return extractor.finish()
@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+# Marks the end of a streamed reply in the chunk queue
+_END = object()
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for picking when to hedge"""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction, min_samples=10):
+        """The given percentile (0-1) of recent latencies, or None until enough calls were seen"""
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class HedgedClient:
+    """Deadline-bound Gemini calls that hedge to backup models when the primary is slow
+
+    The primary model is called first. If it has not answered by the hedge
+    percentile of its recent latencies, the same prompt goes to the next
+    backup model, and whichever answers first wins. A failure moves on to the
+    next model straight away. Every call ends by its deadline. The losing call is
+    left to finish in the background, since an in-flight HTTP request cannot
+    be cancelled. Calls with a session_id are never hedged, because each
+    session's history belongs to one model.
+    """
+
+    def __init__(self, primary, backups=(), hedge_percentile=0.9, default_hedge_after=4.0,
+                 min_hedge_after=0.5, max_workers=8):
+        self.primary = primary
+        self.backups = list(backups)
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_after = default_hedge_after
+        self.min_hedge_after = min_hedge_after
+        self.latency = LatencyTracker()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-call')
+        self.lock = threading.Lock()
+        self.counts = {"calls": 0, "hedged": 0, "backupWins": 0, "deadlineExceeded": 0}
+
+    def hedge_after(self):
+        """Seconds to wait on one model before also asking the next"""
+        observed = self.latency.percentile(self.hedge_percentile)
+        if observed is None:
+            return self.default_hedge_after
+        return max(self.min_hedge_after, observed)
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def _call(self, manager, prompt, session_id, kwargs):
+        started = time.monotonic()
+        response = manager.generate(prompt, session_id=session_id, **kwargs)
+        if manager is self.primary:
+            self.latency.record(time.monotonic() - started)
+        return response
+
+    def generate(self, prompt, deadline, session_id=None, **kwargs):
+        """Return (response, model_name); raises DeadlineExceeded, or the last error if every model failed"""
+        self._count("calls")
+        if time.monotonic() >= deadline:
+            self._count("deadlineExceeded")
+            raise DeadlineExceeded("no time left for an AI call")
+
+        candidates = deque(self.backups if session_id is None else [])
+        futures = {self.executor.submit(self._call, self.primary, prompt, session_id, kwargs): self.primary}
+        hedge_at = time.monotonic() + self.hedge_after()
+        last_error = None
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if candidates:
+                timeout = min(timeout, max(0.0, hedge_at - now))
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            failed = False
+            for future in done:
+                manager = futures.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    print(f"Gemini call to {manager.model_name} failed: {e}")
+                    last_error = e
+                    failed = True
+                    continue
+                if manager is not self.primary:
+                    self._count("backupWins")
+                return response, manager.model_name
+            if candidates and ((failed and not futures) or time.monotonic() >= hedge_at):
+                backup = candidates.popleft()
+                print(f"Hedging Gemini call to {backup.model_name}")
+                self._count("hedged")
+                futures[self.executor.submit(self._call, backup, prompt, session_id, kwargs)] = backup
+                hedge_at = time.monotonic() + self.hedge_after()
+
+        if futures or last_error is None:
+            self._count("deadlineExceeded")
+            raise DeadlineExceeded("AI call did not finish before the request deadline")
+        raise last_error
+
+    def stream(self, prompt, deadline, **kwargs):
+        """Yield the primary model's reply chunk by chunk; raises DeadlineExceeded when the deadline passes between chunks
+
+        The stream is read on a pool thread and handed over through a queue, so
+        a stalled connection cannot hold the caller past the deadline. Streams
+        are never hedged, since a reply cannot switch models halfway. When the
+        caller stops early or runs out of time, the reader stops at its next
+        chunk.
+        """
+        self._count("calls")
+        chunks = queue.Queue()
+        stop = threading.Event()
+
+        def read():
+            try:
+                for chunk in self.primary.generate(prompt, stream=True, **kwargs):
+                    if stop.is_set():
+                        return
+                    chunks.put((chunk, None))
+            except Exception as e:
+                chunks.put((None, e))
+                return
+            chunks.put((_END, None))
+
+        if time.monotonic() >= deadline:
+            self._count("deadlineExceeded")
+            raise DeadlineExceeded("no time left for an AI call")
+        self.executor.submit(read)
+        try:
+            while True:
+                try:
+                    chunk, error = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self._count("deadlineExceeded")
+                    raise DeadlineExceeded("AI stream did not finish before the request deadline") from None
+                if error is not None:
+                    raise error
+                if chunk is _END:
+                    return
+                yield chunk
+        finally:
+            stop.set()
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        return {
+            **counts,
+            "models": [self.primary.model_name] + [b.model_name for b in self.backups],
+            "hedgeAfterSeconds": round(self.hedge_after(), 3),
+        }
@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+
+try:
+    from google.api_core import exceptions as api_exceptions
+except ImportError:  # Installed with google-generativeai, only missing when genai is stubbed
+    api_exceptions = None
+
+
+def classify_error(error):
+    """Error class of a failed Gemini call: quota, rate, 429 or other
+
+    Decided by exception type and HTTP status only. Messages are free text,
+    "rate" for one is part of "generate".
+    """
+    if api_exceptions is not None:
+        if isinstance(error, api_exceptions.ResourceExhausted):
+            return "quota"
+        if isinstance(error, api_exceptions.TooManyRequests):
+            return "rate"
+    for attribute in ("status_code", "code"):
+        if getattr(error, attribute, None) == 429:
+            return "429"
+    return "other"
+
+
+class _Session:
+    def __init__(self):
+        self.history = []
+        self.lock = threading.Lock()
+
+
+class SessionManager:
+    """Gemini calls that stay the same size over the life of the process
+
+    By default every call is a single-shot generate_content with the system
+    instruction and nothing else, so concurrent requests never share context.
+    Callers that pass a session_id get a short conversation: only the last
+    history_turns exchanges are resent, and the least recently used sessions
+    are dropped beyond max_sessions.
+    """
+
+    def __init__(self, genai_module, model_name, generation_config, system_instruction,
+                 history_turns=4, max_sessions=64):
+        self.model = genai_module.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config,
+            system_instruction=system_instruction,
+        )
+        self.model_name = model_name
+        self.history_turns = history_turns
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _session(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = _Session()
+                self.sessions[session_id] = session
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def generate(self, prompt, session_id=None, **kwargs):
+        """Send one prompt, statelessly unless a session_id is given"""
+        if session_id is None:
+            return self.model.generate_content(prompt, **kwargs)
+
+        session = self._session(session_id)
+        with session.lock:
+            user_turn = {"role": "user", "parts": [prompt]}
+            response = self.model.generate_content(session.history + [user_turn], **kwargs)
+            session.history.extend([user_turn, {"role": "model", "parts": [response.text]}])
+            keep = 2 * self.history_turns
+            session.history[:] = session.history[-keep:] if keep > 0 else []
+            return response
+
+    def stats(self):
+        with self.lock:
+            return {
+                "model": self.model_name,
+                "sessions": len(self.sessions),
+                "maxSessions": self.max_sessions,
+                "historyTurns": self.history_turns
+            }
@@ -1,14 +1,44 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS  # Import CORS
+from werkzeug.wrappers import Request as WsgiRequest
 import google.generativeai as genai
 from dotenv import load_dotenv
-import PyPDF2
 import json
+import math
 import os
 import ssl
 import urllib3
 import time
-from functools import wraps
+import uuid
+import threading
+from collections import OrderedDict
+from collections import Counter
+from scoring import calculate_compliance_score, fallback_validation, ScoreState
+from spatial_index import SpatialHashGrid
+from geometry import OrientedBoxes, Shell, MIN_CLEARANCE, geometry_report
+from voxels import OccupancyGrid
+from pathing import path_report
+from optimizer import optimize_layout
+from pareto import pareto_optimize
+from result_cache import ResultCache, design_key
+from rate_limiter import RateLimiter
+from single_flight import SingleFlight
+from model_discovery import ModelDiscovery, DEFAULT_MODEL
+from llm_sessions import SessionManager, classify_error
+from llm_client import HedgedClient, DeadlineExceeded
+from circuit_breaker import CircuitBreaker
+from batch_validation import run_batch, iter_ndjson
+from guidelines import load_guidelines
+from guideline_index import load_or_build_index, design_query
+from prompt_codec import (encode_design, encode_habitat, encode_modules, expand_optimization_result,
+                          legacy_design_json, response_usage, TokenLedger)
+from metrics import Registry, CONTENT_TYPE, SCORE_BUCKETS, WAIT_BUCKETS
+from tracing import start_trace, end_trace, span, TraceBuffer
+from json_extract import extract_json, JsonExtractor
+
+startup_started = time.perf_counter()
+startup_stats = {}
+startup_lock = threading.Lock()
 
 # Disable SSL warnings for development
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -35,148 +65,286 @@ generation_config = {
   "max_output_tokens": 1024,  # Reasonable for free tier
 }
 
-# Global variables to store the chat sessions
-chat_session = None
-habitat_chat_session = None
+# Stateless Gemini calls by default, optional short per-user sessions (X-Session-Id header)
+llm_sessions = None
+session_init_lock = threading.Lock()
+SESSION_HISTORY_TURNS = int(os.getenv('SESSION_HISTORY_TURNS', '4'))
+MAX_LLM_SESSIONS = int(os.getenv('MAX_LLM_SESSIONS', '64'))
+
+# Every AI call ends by the request deadline; slow calls are hedged to backup models
+llm_client = None
+LLM_DEADLINE_SECONDS = float(os.getenv('LLM_DEADLINE_SECONDS', '25'))
+MAX_LLM_DEADLINE_SECONDS = 60.0
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '0.9'))
+HEDGE_BACKUP_MODELS = int(os.getenv('HEDGE_BACKUP_MODELS', '1'))
+RETRY_DELAY = 2.0
 nasa_guidelines_text = ""
+guidelines_stats = {}
+guideline_index = None
+
+# Guideline excerpts injected into AI prompts
+GUIDELINE_TOKEN_BUDGET = int(os.getenv('GUIDELINE_TOKEN_BUDGET', '400'))
+GUIDELINE_TOP_K = int(os.getenv('GUIDELINE_TOP_K', '4'))
+
+# Model discovery is lazy and cached on disk so worker startup never waits on the network
+MODEL_CACHE_TTL = float(os.getenv('MODEL_CACHE_TTL', str(24 * 3600)))
+MODEL_PROBE_DEADLINE = float(os.getenv('MODEL_PROBE_DEADLINE', '8'))
+model_discovery = ModelDiscovery(genai, ttl=MODEL_CACHE_TTL, deadline=MODEL_PROBE_DEADLINE)
 
 # Rate limiting for API calls
-last_api_call = 0
 MIN_API_INTERVAL = 10.0  # Increased to 10 seconds between API calls
-api_call_count = 0
 MAX_API_CALLS_PER_HOUR = 50  # Conservative limit
+CLIENT_API_INTERVAL = float(os.getenv('CLIENT_API_INTERVAL', '0'))  # Per-client spacing, 0 disables
+api_limiter = RateLimiter(MIN_API_INTERVAL, MAX_API_CALLS_PER_HOUR, client_interval=CLIENT_API_INTERVAL)
+
+# Stop calling Gemini during outages or quota exhaustion, probing now and then to recover
+gemini_breaker = CircuitBreaker(
+    open_seconds=float(os.getenv('BREAKER_OPEN_SECONDS', '30')),
+    quota_open_seconds=float(os.getenv('BREAKER_QUOTA_OPEN_SECONDS', '300')),
+    max_open_seconds=float(os.getenv('BREAKER_MAX_OPEN_SECONDS', '600')),
+)
+
+# Results for identical designs, fallback results expire sooner so AI gets retried
+result_cache = ResultCache(max_entries=512, max_bytes=16 * 1024 * 1024, ttl=3600)
+FALLBACK_CACHE_TTL = 300
+
+# Prompt/response token usage per AI request
+token_ledger = TokenLedger()
+
+# Identical concurrent AI requests wait on one in-flight Gemini call
+ai_flights = SingleFlight()
+SINGLE_FLIGHT_TIMEOUT = 30.0
+
+# Live score states for /score_delta, least recently used evicted first
+score_states = OrderedDict()
+score_states_lock = threading.Lock()
+MAX_SCORE_STATES = 256
+
+# At most this many designs per batch request get AI enrichment
+BATCH_AI_LIMIT = 5
+
+# Wall-clock budget for the layout search behind /optimize_habitat
+DEFAULT_OPTIMIZER_BUDGET_MS = 250
+MAX_OPTIMIZER_BUDGET_MS = 10000
+# Upper bound on independent starts behind /optimize_habitat_pareto
+MAX_PARETO_STARTS = 64
+
+# Prometheus metrics served from /metrics
+metrics_registry = Registry()
+request_latency = metrics_registry.histogram(
+    "habitat_http_request_duration_seconds", "Request latency by route", ("route", "method", "status"))
+gemini_latency = metrics_registry.histogram(
+    "habitat_gemini_request_duration_seconds", "Gemini call latency", ("endpoint", "outcome"))
+gemini_errors = metrics_registry.counter(
+    "habitat_gemini_errors_total", "Failed Gemini calls by error class", ("endpoint", "error_class"))
+fallback_counter = metrics_registry.counter(
+    "habitat_fallback_total", "Requests answered by the deterministic path instead of Gemini", ("endpoint", "reason"))
+optimizer_scores = metrics_registry.histogram(
+    "habitat_optimizer_score", "Compliance score of returned layouts", ("source",), buckets=SCORE_BUCKETS)
+metrics_registry.gauge(
+    "habitat_gemini_circuit_state", "Gemini circuit breaker state: 0 closed, 1 half-open, 2 open",
+    lambda: {"closed": 0, "half_open": 1, "open": 2}[gemini_breaker.status()["state"]])
+metrics_registry.gauge(
+    "habitat_gemini_circuit_short_circuited_total", "AI calls skipped because the circuit was open",
+    lambda: gemini_breaker.status()["shortCircuited"], kind="counter")
+llm_parse_counter = metrics_registry.counter(
+    "habitat_llm_parse_total", "Model replies by JSON extraction outcome", ("endpoint", "outcome"))
+metrics_registry.gauge(
+    "habitat_gemini_hedges_total", "Gemini calls hedged to a backup model, and how many the backup won",
+    lambda: {"hedged": llm_client.stats()["hedged"], "backup_won": llm_client.stats()["backupWins"]} if llm_client else {},
+    ("outcome",), kind="counter")
+rate_limit_wait = metrics_registry.histogram(
+    "habitat_rate_limiter_wait_seconds", "Time until the next AI slot for denied calls", buckets=WAIT_BUCKETS)
+metrics_registry.gauge(
+    "habitat_result_cache_lookups_total", "Result cache lookups",
+    lambda: {"hit": result_cache.stats()["hits"], "miss": result_cache.stats()["misses"]}, ("result",), kind="counter")
+metrics_registry.gauge("habitat_result_cache_hit_ratio", "Result cache hit ratio", lambda: result_cache.stats()["hitRate"])
+metrics_registry.gauge("habitat_result_cache_entries", "Cached results", lambda: result_cache.stats()["entries"])
+metrics_registry.gauge("habitat_result_cache_bytes", "Approximate cached result size", lambda: result_cache.stats()["bytes"])
+metrics_registry.gauge(
+    "habitat_rate_limiter_decisions_total", "AI slot requests by decision",
+    lambda: {"granted": api_limiter.status()["granted"], "denied": api_limiter.status()["denied"]}, ("decision",),
+    kind="counter")
+metrics_registry.gauge(
+    "habitat_rate_limiter_remaining_calls", "AI calls left in the hourly quota", lambda: api_limiter.status()["remaining_calls"])
+metrics_registry.gauge("habitat_single_flight_in_flight", "Gemini calls in flight", lambda: ai_flights.stats()["inFlight"])
 
-def rate_limit(func):
-    """Decorator to enforce rate limiting on API calls"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        global last_api_call, api_call_count
-        current_time = time.time()
-        time_since_last = current_time - last_api_call
-        
-        # Reset hourly counter
-        if current_time - last_api_call > 3600:  # 1 hour
-            api_call_count = 0
-        
-        # Check hourly limit
-        if api_call_count >= MAX_API_CALLS_PER_HOUR:
-            print(f"Hourly API limit reached ({MAX_API_CALLS_PER_HOUR}), using fallback")
-            return None  # Signal to use fallback
-        
-        if time_since_last < MIN_API_INTERVAL:
-            sleep_time = MIN_API_INTERVAL - time_since_last
-            print(f"Rate limiting: sleeping for {sleep_time:.1f}s")
-            time.sleep(sleep_time)
-        
-        last_api_call = time.time()
-        api_call_count += 1
-        return func(*args, **kwargs)
-    return wrapper
+# Per-request stage timings; slow traces and those requested with the debug header are kept
+TRACE_HEADER = 'X-Debug-Trace'
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '1000'))
+trace_buffer = TraceBuffer(capacity=int(os.getenv('TRACE_BUFFER_SIZE', '100')), slow_ms=TRACE_SLOW_MS)
+
+def acquire_api_slot():
+    """Take an AI call slot without blocking, returns False when the fallback should be used"""
+    client = request.headers.get('X-Client-Id') or request.remote_addr
+    allowed, wait = api_limiter.try_acquire(client)
+    if not allowed:
+        rate_limit_wait.observe(wait)
+        print(f"Rate limited, next AI call possible in {wait:.1f}s")
+    return allowed
+
+def ensure_llm_sessions(endpoint):
+    """Initialize the LLM sessions on first use; False, counted as a fallback, when no model is available"""
+    if llm_sessions is None:
+        print("LLM sessions not initialized, initializing...")
+        with span("model_init"):
+            try:
+                initialize_llm_sessions()
+            except Exception as e:
+                print(f"LLM session initialization failed: {e}")
+    if llm_sessions is None:
+        print("AI model not available, using fallback")
+        fallback_counter.inc(endpoint=endpoint, reason="model_unavailable")
+        return False
+    return True
+
+def ai_call_blocked(endpoint):
+    """Check the circuit breaker, then the rate limiter; returns the fallback reason, or None to go ahead"""
+    if not gemini_breaker.allow():
+        fallback_counter.inc(endpoint=endpoint, reason="circuit_open")
+        return "circuit_open"
+    with span("rate_limit"):
+        allowed = acquire_api_slot()
+    if not allowed:
+        gemini_breaker.release()
+        fallback_counter.inc(endpoint=endpoint, reason="rate_limited")
+        return "rate_limited"
+    return None
+
+# Cache namespaces of the routes whose answer may come from Gemini
+AI_CACHE_NAMESPACES = {"/validate_habitat": "validate", "/optimize_habitat_ai": "optimize_ai"}
+
+def expects_gemini_call(environ, body):
+    """Whether a request would call Gemini right now, for the async server to pick its pool
+
+    Cache hits, an open circuit and an exhausted rate limit all mean no call.
+    This is only a routing hint. The view still makes those checks itself, so
+    a wrong guess can only put a request in the other pool.
+    """
+    req = WsgiRequest(environ)
+    if req.path == "/test_model":
+        return True
+    if req.path == "/validate_habitats_batch":
+        return min(req.args.get('ai', 0, type=int), BATCH_AI_LIMIT) > 0
+    namespace = AI_CACHE_NAMESPACES.get(req.path)
+    if namespace is None or gemini_breaker.is_open():
+        return False
+    if api_limiter.wait_time(req.headers.get('X-Client-Id') or req.remote_addr) > 0:
+        return False
+    try:
+        design_data = json.loads(body or b"null")
+    except ValueError:
+        return False
+    if not design_data:
+        return False
+    session_id = req.headers.get('X-Session-Id')
+    return not result_cache.contains(design_key(f"{namespace}:{session_id or ''}", design_data))
 
 app = Flask(__name__)
 
 CORS(app, resources={
     "/validate_habitat": {"origins": ["http://localhost:3000", "http://localhost:5173"]},
-    "/optimize_habitat": {"origins": ["http://localhost:3000", "http://localhost:5173"]}
+    "/optimize_habitat": {"origins": ["http://localhost:3000", "http://localhost:5173"]},
+    "/score_delta": {"origins": ["http://localhost:3000", "http://localhost:5173"]}
 })
 
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.trace, g.trace_token = start_trace(f"{request.method} {request.path}")
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get('request_started')
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    if started is not None:
+        request_latency.observe(time.perf_counter() - started, route=route, method=request.method,
+                                status=response.status_code)
+    trace = g.get('trace')
+    if trace is not None:
+        trace.finish(route=route, status=response.status_code)
+        debug = request.headers.get(TRACE_HEADER, '').lower() in ('1', 'true')
+        trace_buffer.offer(trace, force=debug)
+        if debug:
+            response.headers['X-Trace-Id'] = trace.id
+            response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
+
+def request_deadline():
+    """Monotonic deadline for this request's AI work, from X-Request-Deadline-Ms or LLM_DEADLINE_SECONDS"""
+    budget = LLM_DEADLINE_SECONDS
+    try:
+        requested = float(request.headers.get('X-Request-Deadline-Ms', budget * 1000)) / 1000
+        # nan and inf parse as floats but are not deadlines
+        if math.isfinite(requested):
+            budget = requested
+    except ValueError:
+        pass
+    return time.monotonic() + min(max(budget, 0.0), MAX_LLM_DEADLINE_SECONDS)
+
+def generate_with_metrics(endpoint, prompt, deadline, call, **kwargs):
+    """Deadline-bound, hedged Gemini call, recording latency, error class and the outcome on call (a breaker Attempt)"""
+    started = time.perf_counter()
+    try:
+        response, _ = llm_client.generate(prompt, deadline, **kwargs)
+    except Exception as e:
+        gemini_latency.observe(time.perf_counter() - started, endpoint=endpoint, outcome="error")
+        error_class = "deadline" if isinstance(e, DeadlineExceeded) else classify_error(e)
+        gemini_errors.inc(endpoint=endpoint, error_class=error_class)
+        call.failure(error_class)
+        raise
+    gemini_latency.observe(time.perf_counter() - started, endpoint=endpoint, outcome="ok")
+    call.success()
+    return response
 
 def load_nasa_guidelines():
-    """Load NASA guidelines from PDF if available"""
-    global nasa_guidelines_text
+    """Load NASA guidelines from PDF if available, reusing the on-disk extraction cache"""
+    global nasa_guidelines_text, guidelines_stats, guideline_index
     try:
-        # Try to load NASA guidelines PDF
-        pdf_path = "nasa_guidelines.pdf"
-        if os.path.exists(pdf_path):
-            with open(pdf_path, 'rb') as file:
-                nasa_guidelines_text = extract_text_from_pdf(file)
-        else:
-            # Fallback to hardcoded NASA guidelines
-            nasa_guidelines_text = """
-            NASA SPACE HABITAT DESIGN GUIDELINES:
-            
-            VOLUME REQUIREMENTS (per crew member):
-            - Sleep quarters: 2.5-4.0 m³ minimum
-            - Food preparation: 1.0-2.0 m³
-            - Hygiene facilities: 0.5-1.0 m³
-            - Exercise area: 3.0-5.0 m³
-            - Workstation: 1.0-2.0 m³
-            - Recreation: 1.5-3.0 m³
-            - Medical bay: 2.0-4.0 m³
-            - Storage: 0.8-1.5 m³
-            - Total habitable volume: 25-50 m³ minimum per crew member
-            
-            ZONING REQUIREMENTS:
-            - Quiet zones (sleep, work): Isolated from noisy areas
-            - Active zones (exercise, recreation): Good ventilation, higher ceilings
-            - Wet zones (hygiene): Separate from food preparation areas
-            - Clean zones (medical, food): Isolated from contamination sources
-            - Technical zones (life support): Accessible for maintenance
-            
-            ADJACENCY RULES:
-            - Exercise areas must be near hygiene facilities
-            - Food preparation must be adjacent to storage
-            - Sleep quarters must be away from noisy equipment
-            - Medical bay must be in clean, isolated location
-            - Life support systems must be accessible but separated from living areas
-            
-            SAFETY REQUIREMENTS:
-            - Multiple emergency exits
-            - Fire suppression systems
-            - Radiation shielding considerations
-            - Structural integrity for launch and operational loads
-            """
+        nasa_guidelines_text, guidelines_stats = load_guidelines("nasa_guidelines.pdf")
+        guideline_index = load_or_build_index(nasa_guidelines_text)
+        guidelines_stats["chunks"] = len(guideline_index.chunks)
+        print(f"Loaded NASA guidelines from {guidelines_stats['source']}: "
+              f"{guidelines_stats['pages']} pages, {guidelines_stats['characters']} characters "
+              f"in {guidelines_stats['seconds']}s")
     except Exception as e:
         print(f"Error loading NASA guidelines: {e}")
         nasa_guidelines_text = "NASA guidelines not available"
+        guidelines_stats = {"source": "error", "error": str(e)}
+
+def relevant_guidelines(design_data):
+    """Guideline excerpts most relevant to a design, within the prompt token budget"""
+    if guideline_index is None:
+        return "Use standard NASA habitat design guidelines."
+    excerpts = guideline_index.select(design_query(design_data), GUIDELINE_TOKEN_BUDGET, k=GUIDELINE_TOP_K)
+    return "\n\n".join(excerpts) or "Use standard NASA habitat design guidelines."
 
-def get_available_model():
-    """Get the best FREE TIER Gemini model only"""
+def get_available_model(refresh=False):
+    """Get the best FREE TIER Gemini model only, probing lazily on first use"""
     try:
-        # FORCE use of free tier models only
-        free_tier_models = [
-            'gemini-1.5-flash',    # Current free tier model
-            'gemini-pro',          # Legacy free model
-            'gemini-1.0-pro',      # Alternative free model
-        ]
-        
-        # Try each free model in order
-        for model in free_tier_models:
-            try:
-                # Test the model quickly
-                test_model = genai.GenerativeModel(model_name=model)
-                test_response = test_model.generate_content("test", generation_config={"max_output_tokens": 10})
-                print(f"Successfully using FREE TIER model: {model}")
-                return model
-            except Exception as model_error:
-                print(f"Model {model} failed: {model_error}")
-                continue
-        
-        print("WARNING: All free models failed, using gemini-1.5-flash as fallback")
-        return "gemini-1.5-flash"
-            
+        return model_discovery.get_model(refresh=refresh)
     except Exception as e:
         print(f"Error testing models: {e}")
-        return "gemini-1.5-flash"
+        return DEFAULT_MODEL
 
-# Initialize chat sessions
-def initialize_chat_sessions():
-    global chat_session, habitat_chat_session, nasa_guidelines_text
-    
-    # Load NASA guidelines
-    load_nasa_guidelines()
+# Initialize LLM sessions
+def initialize_llm_sessions():
+    global llm_sessions, llm_client
     
-    # Get the best available model
-    model_name = get_available_model()
-    
-    # New chat session for habitat design validation and optimization
-    if habitat_chat_session is None:
+    with session_init_lock:
+        if llm_sessions is not None:
+            return
+        
+        # Get the best available model
+        model_name = get_available_model()
+        
+        # System instruction for habitat design validation and optimization
         habitat_system_instruction = """You are a space habitat design validator. Analyze designs for NASA compliance.
 
 KEY RULES:
@@ -193,46 +361,87 @@ OUTPUT JSON:
 
 Be concise and technical."""
         
-        habitat_model = genai.GenerativeModel(
-            model_name=model_name,
-            generation_config=generation_config,
-            system_instruction=habitat_system_instruction,
+        sessions = SessionManager(
+            genai,
+            model_name,
+            generation_config,
+            habitat_system_instruction,
+            history_turns=SESSION_HISTORY_TURNS,
+            max_sessions=MAX_LLM_SESSIONS,
         )
-        habitat_chat_session = habitat_model.start_chat(history=[])
+        
+        # Backup models only ever receive stateless, hedged calls
+        backups = [SessionManager(genai, name, generation_config, habitat_system_instruction, history_turns=0)
+                   for name in model_discovery.backup_models(model_name)[:HEDGE_BACKUP_MODELS]]
+        llm_client = HedgedClient(sessions, backups, hedge_percentile=HEDGE_PERCENTILE)
+        llm_sessions = sessions
+
+def startup():
+    """Load the guidelines and their index, once per server process
+
+    Not done at import time: spawned process pool workers re-import the
+    parent's __main__, so a module-level load would repeat in every worker.
+    """
+    with startup_lock:
+        if "startupSeconds" in startup_stats:
+            return
+        load_nasa_guidelines()
+        startup_stats["startupSeconds"] = round(time.perf_counter() - startup_started, 4)
 
-# Initialize on startup
-initialize_chat_sessions()
+# Servers that never call startup() load the guidelines on the first request; the model is discovered lazily on the first AI request
+@app.before_request
+def ensure_startup():
+    startup()
 
 @app.route("/api_status", methods=["GET"])
 def api_status():
     """Check API availability and quota status"""
-    global api_call_count, last_api_call
-    
-    current_time = time.time()
-    time_since_last = current_time - last_api_call
-    
-    # Reset hourly counter if needed
-    if time_since_last > 3600:
-        api_call_count = 0
-    
-    remaining_calls = MAX_API_CALLS_PER_HOUR - api_call_count
-    next_call_available = max(0, MIN_API_INTERVAL - time_since_last)
+    limiter_status = api_limiter.status()
+    remaining_calls = limiter_status["remaining_calls"]
+    next_call_available = limiter_status["next_call_in_seconds"]
+    breaker_status = gemini_breaker.status()
     
     return jsonify({
-        "api_available": remaining_calls > 0 and next_call_available <= 0,
+        "api_available": remaining_calls > 0 and next_call_available <= 0 and breaker_status["state"] != "open",
         "remaining_calls": remaining_calls,
         "next_call_in_seconds": next_call_available,
-        "fallback_mode": remaining_calls <= 0,
+        "fallback_mode": remaining_calls <= 0 or breaker_status["state"] == "open",
+        "rate_limiter": limiter_status,
+        "circuit_breaker": breaker_status,
+        "cache": result_cache.stats(),
+        "single_flight": ai_flights.stats(),
+        "startup": startup_stats,
+        "guidelines": guidelines_stats,
+        "tokens": token_ledger.stats(),
+        "llm_sessions": llm_sessions.stats() if llm_sessions is not None else None,
+        "llm_client": llm_client.stats() if llm_client is not None else None,
+        "async_server": app.config["ASYNC_SERVER"].stats() if "ASYNC_SERVER" in app.config else None,
         "status": "ok"
     })
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(metrics_registry.render(), content_type=CONTENT_TYPE)
+
+@app.route("/debug/traces", methods=["GET"])
+def debug_traces():
+    """Recent slow or debug-requested traces, newest first"""
+    trace_id = request.args.get('id')
+    traces = trace_buffer.recent(limit=request.args.get('limit', type=int),
+                                 min_ms=request.args.get('minMs', 0.0, type=float))
+    if trace_id:
+        traces = [t for t in traces if t["traceId"] == trace_id]
+    return jsonify({"traces": traces, **trace_buffer.stats()})
+
 @app.route("/test_model", methods=["GET"])
 def test_model():
     """Test model availability and list available models"""
     try:
         models = genai.list_models()
         available_models = [m.name for m in models if 'generateContent' in m.supported_generation_methods]
-        current_model = get_available_model()
+        # Cached choice unless ?refresh=1 asks for a fresh parallel probe
+        current_model = get_available_model(refresh=request.args.get('refresh') == '1')
         
         # Test the current model
         try:
@@ -249,6 +458,8 @@ def test_model():
             "available_models": available_models,
             "model_working": model_working,
             "test_result": test_result,
+            "discovery": model_discovery.stats,
+            "startup": startup_stats,
             "status": "success"
         })
     except Exception as e:
@@ -257,11 +468,189 @@ def test_model():
             "status": "error"
         }), 500
 
+def build_validation_prompt(design_data):
+    """Prepare the prompt for validation, with the design in compact tabular form"""
+    compact_design = encode_design(design_data)
+    validation_prompt = f"""
+    Please analyze this space habitat design for NASA compliance and provide validation feedback:
+
+    RELEVANT NASA GUIDELINES:
+    {relevant_guidelines(design_data)}
+
+    HABITAT DESIGN (module rows are id|type|position|size|rotation, meters and radians):
+    {compact_design}
+
+    Analyze the design and provide:
+    1. Overall compliance score (0-100)
+    2. Specific issues found
+    3. Recommendations for improvement
+    4. Volume analysis per crew member
+    5. Zoning compliance assessment
+    6. Adjacency rules validation
+
+    Focus on NASA guidelines for crew safety, volume requirements, and operational efficiency.
+    """
+    return validation_prompt, compact_design
+
+def ai_validation(design_data, session_id=None, endpoint="validate_habitat", deadline=None):
+    """Ask Gemini to validate a design, returns None when the fallback should be used"""
+    deadline = deadline or time.monotonic() + LLM_DEADLINE_SECONDS
+    
+    # Skip Gemini while the circuit is open or rate limited, falling back immediately instead of waiting
+    blocked = ai_call_blocked(endpoint)
+    if blocked:
+        print(f"AI call skipped ({blocked}), using fallback validation")
+        return None
+    
+    with gemini_breaker.attempt() as call:
+        if not ensure_llm_sessions(endpoint):
+            return None
+        
+        with span("prompt_build"):
+            validation_prompt, compact_design = build_validation_prompt(design_data)
+        
+        # Send to Gemini for analysis with minimal retries
+        max_retries = 2
+        for attempt in range(max_retries):
+            try:
+                with span("gemini", attempt=attempt + 1):
+                    response = generate_with_metrics(endpoint, validation_prompt, deadline, call, session_id=session_id)
+                break
+            except DeadlineExceeded:
+                print("AI validation ran out of time, using fallback")
+                fallback_counter.inc(endpoint=endpoint, reason="deadline")
+                return None
+            except Exception as api_error:
+                if classify_error(api_error) != "other":
+                    print(f"API quota/rate limit hit on attempt {attempt + 1}, using fallback")
+                    fallback_counter.inc(endpoint=endpoint, reason="api_quota")
+                    return None
+                elif attempt < max_retries - 1 and deadline - time.monotonic() > RETRY_DELAY and not gemini_breaker.is_open():
+                    print(f"API error on attempt {attempt + 1}, retrying...")
+                    with span("retry_sleep"):
+                        time.sleep(RETRY_DELAY)
+                    continue
+                else:
+                    print(f"API failed after {max_retries} attempts, using fallback")
+                    fallback_counter.inc(endpoint=endpoint, reason="api_error")
+                    return None
+    
+    usage = token_ledger.record(endpoint, response_usage(response, validation_prompt, response.text),
+                                baseline_prompt=validation_prompt.replace(compact_design, legacy_design_json(design_data)))
+    print(f"Validation tokens: {usage['promptTokens']} prompt (was ~{usage['baselineTokens']}), {usage['responseTokens']} response")
+    
+    # Parse the JSON response, tolerating fences, prose and truncation
+    try:
+        with span("parse"):
+            validation_result, repaired = extract_json(response.text)
+        llm_parse_counter.inc(endpoint=endpoint, outcome="repaired" if repaired else "ok")
+        if repaired:
+            # A truncated reply may be missing fields, so fill them from the deterministic result
+            print("AI response was truncated, merging with fallback validation")
+            validation_result = reconcile_validation(validation_result, fallback_validation(design_data))
+        print(f"AI validation complete. Score: {validation_result.get('validation', {}).get('overallScore', 'N/A')}")
+        return validation_result
+    except ValueError as e:
+        print(f"AI response parsing failed: {e}, using fallback")
+        llm_parse_counter.inc(endpoint=endpoint, outcome="failed")
+        gemini_errors.inc(endpoint=endpoint, error_class="parse")
+        fallback_counter.inc(endpoint=endpoint, reason="parse_error")
+        return None
+
+def sse_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+def reconcile_validation(ai_result, fallback_result):
+    """Merge an AI analysis with the deterministic result, keeping the computed score authoritative"""
+    ai_validation_block = ai_result.get("validation", {})
+    validation = fallback_result["validation"]
+    issues = list(validation["issues"])
+    issues.extend(i for i in ai_validation_block.get("issues", []) if i not in issues)
+    recommendations = ai_validation_block.get("recommendations") or validation["recommendations"]
+    result = {
+        **ai_result,
+        "validation": {
+            **validation,
+            "aiScore": ai_validation_block.get("overallScore"),
+            "issues": issues,
+            "recommendations": recommendations
+        },
+        "analysis": ai_result.get("analysis") or fallback_result["analysis"]
+    }
+    if "paths" in fallback_result:
+        result["paths"] = fallback_result["paths"]
+    return result
+
+def stream_validation(design_data, cache_key, deadline):
+    """SSE events: the deterministic result at once, then streamed AI text, then the reconciled result
+
+    The AI stream ends with the fallback result if the deadline (from
+    request_deadline) passes between chunks.
+    """
+    fallback_result = fallback_validation(design_data)
+    yield sse_event("fallback", fallback_result)
+    
+    if ai_call_blocked("validate_habitat_stream"):
+        yield sse_event("final", {**fallback_result, "source": "fallback"})
+        return
+    # A client can disconnect mid-stream, the attempt then gives back a half-open probe slot
+    with gemini_breaker.attempt() as call:
+        if not ensure_llm_sessions("validate_habitat_stream"):
+            yield sse_event("final", {**fallback_result, "source": "fallback"})
+            return
+    
+        validation_prompt, compact_design = build_validation_prompt(design_data)
+        extractor = JsonExtractor()
+        started = time.perf_counter()
+        chunk, streamed = None, []
+        try:
+            # Streaming calls are always stateless; JSON is scanned as it arrives
+            for chunk in llm_client.stream(validation_prompt, deadline):
+                text = getattr(chunk, 'text', '') or ''
+                if text:
+                    streamed.append(text)
+                    yield sse_event("ai_chunk", {"text": text})
+                    if extractor.feed(text):
+                        break  # The object is complete, anything after it is prose
+            gemini_latency.observe(time.perf_counter() - started, endpoint="validate_habitat_stream", outcome="ok")
+            call.success()
+        except Exception as e:
+            print(f"Streaming AI validation failed: {e}, keeping fallback result")
+            timed_out = isinstance(e, DeadlineExceeded)
+            error_class = "deadline" if timed_out else classify_error(e)
+            gemini_latency.observe(time.perf_counter() - started, endpoint="validate_habitat_stream", outcome="error")
+            gemini_errors.inc(endpoint="validate_habitat_stream", error_class=error_class)
+            call.failure(error_class)
+            reason = "deadline" if timed_out else "api_error" if error_class == "other" else "api_quota"
+            fallback_counter.inc(endpoint="validate_habitat_stream", reason=reason)
+            yield sse_event("final", {**fallback_result, "source": "fallback"})
+            return
+        
+        # The last chunk carries the usage totals of a streamed reply, when the API reports them
+        usage = token_ledger.record("validate_habitat_stream",
+                                    response_usage(chunk, validation_prompt, "".join(streamed)),
+                                    baseline_prompt=validation_prompt.replace(compact_design, legacy_design_json(design_data)))
+        print(f"Streamed validation tokens: {usage['promptTokens']} prompt (was ~{usage['baselineTokens']}), "
+              f"{usage['responseTokens']} response")
+    
+        try:
+            ai_result, repaired = extractor.finish()
+        except ValueError as e:
+            print(f"Streaming AI response parsing failed: {e}, keeping fallback result")
+            llm_parse_counter.inc(endpoint="validate_habitat_stream", outcome="failed")
+            gemini_errors.inc(endpoint="validate_habitat_stream", error_class="parse")
+            fallback_counter.inc(endpoint="validate_habitat_stream", reason="parse_error")
+            yield sse_event("final", {**fallback_result, "source": "fallback"})
+            return
+        llm_parse_counter.inc(endpoint="validate_habitat_stream", outcome="repaired" if repaired else "ok")
+    
+        final_result = reconcile_validation(ai_result, fallback_result)
+        result_cache.set(cache_key, final_result)
+        yield sse_event("final", {**final_result, "source": "ai"})
+
 @app.route("/validate_habitat", methods=["POST"])
 def validate_habitat():
     """Validate habitat design against NASA guidelines"""
-    global habitat_chat_session
-    
     try:
         # Get the habitat design data
         design_data = request.get_json()
@@ -271,160 +660,62 @@ def validate_habitat():
         
         print(f"Validating habitat design with {len(design_data.get('modules', []))} modules")
         
-        # Try AI validation first (with rate limiting)
-        ai_result = None
+        # Identical designs are answered from the cache without touching the rate limiter
+        session_id = request.headers.get('X-Session-Id')
+        with span("cache_lookup"):
+            cache_key = design_key(f"validate:{session_id or ''}", design_data)
+            cached = result_cache.get(cache_key)
+        streaming = request.args.get('stream') == '1' or request.accept_mimetypes.best == "text/event-stream"
+        if streaming:
+            if cached is not None:
+                events = iter([sse_event("final", {**cached, "source": "cache"})])
+            else:
+                events = stream_validation(design_data, cache_key, request_deadline())
+            return Response(stream_with_context(events), mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        if cached is not None:
+            return jsonify(cached)
+        
+        # Try AI validation first, sharing one Gemini call between identical concurrent requests
         try:
-            # Apply rate limiting
-            if rate_limit(lambda: True)() is None:
-                print("Rate limit exceeded, using fallback validation")
-                return jsonify(fallback_validation(design_data))
-            
-            # Check if habitat chat session is initialized
-            if habitat_chat_session is None:
-                print("Habitat chat session not initialized, attempting to reinitialize...")
-                initialize_chat_sessions()
-                if habitat_chat_session is None:
-                    print("AI model not available, using fallback")
-                    return jsonify(fallback_validation(design_data))
-            
-            # Prepare the prompt for validation
-            validation_prompt = f"""
-            Please analyze this space habitat design for NASA compliance and provide validation feedback:
-
-            HABITAT DESIGN DATA:
-            {json.dumps(design_data, indent=2)}
-
-            Analyze the design and provide:
-            1. Overall compliance score (0-100)
-            2. Specific issues found
-            3. Recommendations for improvement
-            4. Volume analysis per crew member
-            5. Zoning compliance assessment
-            6. Adjacency rules validation
-
-            Focus on NASA guidelines for crew safety, volume requirements, and operational efficiency.
-            """
-            
-            # Send to Gemini for analysis with minimal retries
-            max_retries = 2
-            for attempt in range(max_retries):
-                try:
-                    response = habitat_chat_session.send_message(validation_prompt)
-                    break
-                except Exception as api_error:
-                    error_msg = str(api_error).lower()
-                    if "quota" in error_msg or "rate" in error_msg or "429" in error_msg:
-                        print(f"API quota/rate limit hit on attempt {attempt + 1}, using fallback")
-                        return jsonify(fallback_validation(design_data))
-                    elif attempt < max_retries - 1:
-                        print(f"API error on attempt {attempt + 1}, retrying...")
-                        time.sleep(2)
-                        continue
-                    else:
-                        print(f"API failed after {max_retries} attempts, using fallback")
-                        return jsonify(fallback_validation(design_data))
-            
-            # Parse the JSON response
-            try:
-                validation_result = json.loads(response.text)
-                print(f"AI validation complete. Score: {validation_result.get('validation', {}).get('overallScore', 'N/A')}")
-                return jsonify(validation_result)
-            except json.JSONDecodeError:
-                print("AI response parsing failed, using fallback")
-                return jsonify(fallback_validation(design_data))
-                
+            validation_result, shared = shared_ai_validation(design_data, cache_key, request_deadline(), session_id)
         except Exception as e:
             print(f"AI validation failed: {e}, using fallback")
-            return jsonify(fallback_validation(design_data))
+            fallback_counter.inc(endpoint="validate_habitat", reason="shared_call_failed")
+            return cached_fallback_validation(design_data, cache_key)
+        
+        if validation_result is None:
+            if shared:
+                fallback_counter.inc(endpoint="validate_habitat", reason="shared_fallback")
+            return cached_fallback_validation(design_data, cache_key)
+        
+        if shared:
+            print("Shared in-flight AI validation result")
+        return jsonify(validation_result)
         
     except Exception as e:
         print(f"Error in habitat validation: {e}")
         return jsonify({"error": f"Validation failed: {str(e)}"}), 500
-def fallback_validation(design_data):
-    """Fallback validation when AI is unavailable due to quota limits"""
-    modules = design_data.get('modules', [])
-    habitat_config = design_data.get('habitatConfig', {})
-    
-    # Use the existing compliance calculation
-    score, issues = calculate_compliance_score(modules, habitat_config)
-    
-    # Generate recommendations based on issues
-    recommendations = []
-    if score < 85:
-        recommendations.append("Consider adding missing essential modules")
-        recommendations.append("Optimize module positioning for better adjacency")
-        recommendations.append("Ensure adequate volume per crew member")
-    else:
-        recommendations.append("Design meets basic NASA requirements")
-    
-    return {
-        "validation": {
-            "overallScore": score,
-            "compliance": "compliant" if score >= 85 else "warning" if score >= 70 else "critical",
-            "issues": issues,
-            "recommendations": recommendations
-        },
-        "analysis": {
-            "volumeAnalysis": f"Analyzed {len(modules)} modules for compliance",
-            "zoningAnalysis": "Basic zoning analysis completed",
-            "adjacencyAnalysis": "Adjacency rules checked",
-            "safetyAnalysis": f"Safety score: {score}%"
-        }
-    }
 
-def calculate_compliance_score(modules, habitat_config):
-    """Calculate NASA compliance score for a layout"""
-    import math
-    
-    score = 100
-    issues = []
-    
-    # Check crew volume requirements
-    crew_size = habitat_config.get('mission', {}).get('crewSize', 4)
-    total_volume = habitat_config.get('volume', 0)
-    volume_per_crew = total_volume / crew_size if crew_size > 0 else 0
-    
-    if volume_per_crew < 25:  # NASA minimum
-        score -= 30
-        issues.append(f"Insufficient volume per crew: {volume_per_crew:.1f}m³ < 25m³")
-    
-    # Check essential modules
-    module_types = [m.get('type') for m in modules]
-    essential_modules = ['sleep', 'food', 'hygiene', 'life-support']
-    
-    for essential in essential_modules:
-        if essential not in module_types:
-            score -= 20
-            issues.append(f"Missing essential module: {essential}")
-    
-    # Check sleep quarters count
-    sleep_count = len([m for m in modules if m.get('type') == 'sleep'])
-    if sleep_count < crew_size:
-        score -= 15
-        issues.append(f"Insufficient sleep quarters: {sleep_count} < {crew_size}")
-    
-    # Check adjacency violations
-    for module in modules:
-        mod_type = module.get('type')
-        position = module.get('position', [0, 0, 0])
-        
-        # Check forbidden adjacencies
-        forbidden = {
-            'sleep': ['exercise', 'maintenance', 'life-support'],
-            'food': ['hygiene', 'medical', 'exercise'],
-            'medical': ['food', 'exercise', 'maintenance'],
-            'exercise': ['sleep', 'medical', 'food']
-        }.get(mod_type, [])
-        
-        for other in modules:
-            if other.get('type') in forbidden:
-                other_pos = other.get('position', [0, 0, 0])
-                distance = math.sqrt(sum((a - b) ** 2 for a, b in zip(position, other_pos)))
-                if distance < 4:  # Too close
-                    score -= 5
-                    issues.append(f"{mod_type} too close to {other.get('type')}")
-    
-    return max(0, score), issues
+def shared_ai_validation(design_data, cache_key, deadline, session_id=None, endpoint="validate_habitat"):
+    """AI validation shared with identical in-flight requests, returns (result or None, shared)
+
+    A successful result is cached under cache_key. Raises when the shared call failed.
+    """
+    validation_result, shared = ai_flights.do(
+        cache_key, lambda: ai_validation(design_data, session_id, endpoint=endpoint, deadline=deadline),
+        timeout=min(SINGLE_FLIGHT_TIMEOUT, max(0.0, deadline - time.monotonic()))
+    )
+    if validation_result is not None:
+        result_cache.set(cache_key, validation_result)
+    return validation_result, shared
+
+def cached_fallback_validation(design_data, cache_key):
+    """Run fallback validation and cache it for a shorter time than AI results"""
+    with span("fallback_validation"):
+        result = fallback_validation(design_data)
+    result_cache.set(cache_key, result, ttl=FALLBACK_CACHE_TTL)
+    return jsonify(result)
 
 def ensure_essential_modules(modules, habitat_config):
     """Ensure all essential modules are present, add missing ones"""
@@ -558,8 +849,16 @@ def create_nasa_compliant_layout(modules, habitat_config):
         'maintenance': {'radius': 0.8 * radius, 'level': -0.4, 'angle_offset': math.pi}
     }
     
-    # Track used positions to avoid overlaps
-    used_positions = []
+    # Module boxes are filled in as modules are placed, so walls stay MIN_CLEARANCE apart
+    boxes = OrientedBoxes.from_modules(sorted_modules)
+    shell = Shell.from_config(habitat_config)
+    planar_limits, vertical_limits = shell.limits(boxes)
+    max_bound = float(boxes.bounds.max())
+    
+    # Track placed centres in a spatial grid, so each placement only tests nearby boxes
+    used_positions = SpatialHashGrid.for_habitat(radius, height, 2 * max_bound + MIN_CLEARANCE)
+    type_counts = Counter(m.get('type') for m in sorted_modules)
+    placed_counts = Counter()
     
     for i, module in enumerate(sorted_modules):
         mod_type = module.get('type', 'unknown')
@@ -571,8 +870,8 @@ def create_nasa_compliant_layout(modules, habitat_config):
         base_angle = zone_config['angle_offset']
         
         # For multiple modules of same type, distribute around circle
-        type_count = len([m for m in sorted_modules if m.get('type') == mod_type])
-        type_index = len([m for m in optimized_modules if m.get('type') == mod_type])
+        type_count = type_counts[mod_type]
+        type_index = placed_counts[mod_type]
         
         if type_count > 1:
             angle_step = 2 * math.pi / type_count
@@ -580,50 +879,52 @@ def create_nasa_compliant_layout(modules, habitat_config):
         else:
             angle = base_angle
         
-        # Calculate position
-        x = base_radius * math.cos(angle)
-        z = base_radius * math.sin(angle)
-        y = base_level
-        
-        # Ensure within bounds
-        distance_from_center = math.sqrt(x*x + z*z)
-        max_radius = radius - 1.5  # Safety margin
-        
-        if distance_from_center > max_radius:
-            scale_factor = max_radius / distance_from_center
-            x *= scale_factor
-            z *= scale_factor
-        
-        # Ensure within height bounds
-        max_height = height/2 - 1.5  # Safety margin
-        if abs(y) > max_height:
-            y = math.copysign(max_height, y)
-        
-        # Avoid overlaps with existing modules
-        min_distance = 3.0  # Minimum separation
-        attempts = 0
-        while attempts < 10:
-            collision = False
-            for used_pos in used_positions:
-                distance = math.sqrt((x - used_pos[0])**2 + (y - used_pos[1])**2 + (z - used_pos[2])**2)
-                if distance < min_distance:
-                    collision = True
-                    break
-            
-            if not collision:
-                break
-            
-            # Adjust position to avoid collision
-            angle += math.pi / 6  # Rotate 30 degrees
+        # Safety margin, widened so large modules keep their whole footprint inside
+        max_radius = min(radius - 1.5, planar_limits[i])
+        max_height = min(height/2 - 1.5, vertical_limits[i])
+        
+        def place(angle):
             x = base_radius * math.cos(angle)
             z = base_radius * math.sin(angle)
-            attempts += 1
+            y = base_level
+            
+            # Ensure within bounds
+            distance_from_center = math.sqrt(x*x + z*z)
+            if distance_from_center > max_radius:
+                scale_factor = max_radius / distance_from_center
+                x *= scale_factor
+                z *= scale_factor
+            
+            # Ensure within height bounds
+            if abs(y) > max_height:
+                y = math.copysign(max_height, y)
+            
+            # The margins above are rough, pull inward until the whole box fits the shell once rounded
+            x, y, z = shell.fit(boxes, i, (x, y, z))
+            return [round(float(x), 2), round(float(y), 2), round(float(z), 2)]
+        
+        reach = boxes.bounds[i] + max_bound + MIN_CLEARANCE
+        
+        def first_clear(candidates):
+            nearby = set()
+            for candidate in candidates:
+                nearby.update(used_positions.query_radius(candidate, reach))
+            clear = boxes.clear_of(i, candidates, MIN_CLEARANCE, among=sorted(nearby)).tolist()
+            return candidates[clear.index(True)] if True in clear else None
+        
+        # Try the zone angle, then 30 degree turns around the ring, and keep the first spot clear of placed modules
+        position = first_clear([place(angle)])
+        if position is None:
+            candidates = [place(angle + attempt * math.pi / 6) for attempt in range(1, 11)]
+            position = first_clear(candidates) or candidates[-1]
         
         # Create optimized module
         optimized_module = module.copy()
-        optimized_module['position'] = [round(x, 2), round(y, 2), round(z, 2)]
+        optimized_module['position'] = position
         optimized_modules.append(optimized_module)
-        used_positions.append([x, y, z])
+        boxes.centers[i] = position
+        used_positions.insert(i, position)
+        placed_counts[module.get('type')] += 1
     
     return optimized_modules
 
@@ -632,14 +933,29 @@ def optimize_habitat_algorithmic(design_data):
     modules = design_data.get('modules', [])
     habitat_config = design_data.get('habitatConfig', {})
     
-    # Create NASA-compliant layout
-    optimized_modules = create_nasa_compliant_layout(modules, habitat_config)
+    try:
+        budget_ms = float(design_data.get('timeBudgetMs', DEFAULT_OPTIMIZER_BUDGET_MS))
+        seed = design_data.get('seed')
+        seed = int(seed) if seed is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeBudgetMs and seed must be numbers"}), 400
+    budget_ms = min(max(budget_ms, 0), MAX_OPTIMIZER_BUDGET_MS)
+    
+    # Create NASA-compliant layout as the starting point
+    with span("layout"):
+        initial_modules = create_nasa_compliant_layout(modules, habitat_config)
     
-    if not optimized_modules:
+    if not initial_modules:
         return jsonify({"error": "No modules to optimize"}), 400
     
-    # Calculate compliance score
-    score, issues = calculate_compliance_score(optimized_modules, habitat_config)
+    # Improve it with simulated annealing within the time budget
+    with span("annealing", budgetMs=budget_ms):
+        search = optimize_layout(initial_modules, habitat_config, time_budget=budget_ms / 1000, seed=seed)
+    optimized_modules = search["modules"]
+    score, issues = search["score"], search["issues"]
+    optimizer_scores.observe(score, source="algorithmic")
+    print(f"Layout search: {search['iterations']} iterations in {search['elapsedMs']}ms, score {score}%")
+    occupancy = OccupancyGrid(habitat_config, optimized_modules)
     
     # Determine compliance level
     if score >= 85:
@@ -658,6 +974,11 @@ def optimize_habitat_algorithmic(design_data):
         changes.append(f"Added {added_count} essential modules for NASA compliance")
     
     changes.append("Repositioned modules using NASA algorithms")
+    if search["iterations"]:
+        changes.append(f"Refined positions over {search['iterations']} simulated annealing iterations")
+    if search["truncated"]:
+        changes.append(f"Search stopped at the {budget_ms:g}ms time budget after {search['iterations']} of "
+                       f"{search['iterationBudget']} seeded iterations, so it is not reproducible")
     
     result = {
         "validation": {
@@ -681,7 +1002,19 @@ def optimize_habitat_algorithmic(design_data):
             "zoningAnalysis": "Modules positioned by functional zones using algorithms",
             "adjacencyAnalysis": "NASA adjacency rules enforced programmatically",
             "safetyAnalysis": f"Algorithmic layout achieves {score}% NASA compliance"
-        }
+        },
+        "optimizer": {
+            "iterations": search["iterations"],
+            "iterationBudget": search["iterationBudget"],
+            "truncated": search["truncated"],
+            "scoreTrajectory": search["scoreTrajectory"],
+            "seed": search["seed"],
+            "elapsedMs": search["elapsedMs"],
+            "evaluationsPerSecond": search["evaluationsPerSecond"]
+        },
+        "geometry": geometry_report(optimized_modules, habitat_config),
+        "occupancy": occupancy.stats(),
+        "paths": path_report(optimized_modules, habitat_config, occupancy)
     }
     
     return jsonify(result)
@@ -700,11 +1033,56 @@ def optimize_habitat():
         print(f"Error in optimization: {e}")
         return jsonify({"error": f"Optimization failed: {str(e)}"}), 500
 
+@app.route("/optimize_habitat_pareto", methods=["POST"])
+def optimize_habitat_pareto():
+    """Multi-start optimization across all cores, returning the ranked Pareto front"""
+    try:
+        design_data = request.get_json()
+        if not design_data:
+            return jsonify({"error": "No design data provided"}), 400
+        
+        habitat_config = design_data.get('habitatConfig', {})
+        try:
+            budget_ms = float(design_data.get('timeBudgetMs', DEFAULT_OPTIMIZER_BUDGET_MS))
+            seed = design_data.get('seed')
+            seed = int(seed) if seed is not None else None
+            starts = design_data.get('starts')
+            starts = int(starts) if starts is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "timeBudgetMs, seed and starts must be numbers"}), 400
+        budget_ms = min(max(budget_ms, 0), MAX_OPTIMIZER_BUDGET_MS)
+        if starts is not None:
+            starts = min(max(starts, 1), MAX_PARETO_STARTS)
+        
+        with span("layout"):
+            initial_modules = create_nasa_compliant_layout(design_data.get('modules', []), habitat_config)
+        if not initial_modules:
+            return jsonify({"error": "No modules to optimize"}), 400
+        
+        with span("pareto", budgetMs=budget_ms):
+            result = pareto_optimize(initial_modules, habitat_config, starts=starts,
+                                     time_budget=budget_ms / 1000, seed=seed)
+        stats = result["stats"]
+        print(f"Pareto search: {stats['starts']} starts on {stats['workers']} workers in {stats['wallMs']}ms, "
+              f"{stats['frontSize']} non-dominated layouts")
+        for entry in result["front"]:
+            optimizer_scores.observe(entry["objectives"]["score"], source="pareto")
+        return jsonify(result)
+        
+    except Exception as e:
+        print(f"Error in Pareto optimization: {e}")
+        return jsonify({"error": f"Optimization failed: {str(e)}"}), 500
+
+def cached_algorithmic_optimization(design_data, cache_key):
+    """Run algorithmic optimization as the AI fallback, caching successful results"""
+    response = optimize_habitat_algorithmic(design_data)
+    if not isinstance(response, tuple):
+        result_cache.set(cache_key, response.get_json(), ttl=FALLBACK_CACHE_TTL)
+    return response
+
 @app.route("/optimize_habitat_ai", methods=["POST"])
 def optimize_habitat_ai():
     """AI-powered optimization with NASA compliance validation"""
-    global habitat_chat_session
-    
     try:
         design_data = request.get_json()
         if not design_data:
@@ -716,25 +1094,28 @@ def optimize_habitat_ai():
         
         print(f"AI optimization requested for {len(modules)} modules")
         
-        # Check rate limits first - if exceeded, use algorithmic optimization
-        if rate_limit(lambda: True)() is None:
-            print("Rate limit exceeded, using algorithmic optimization")
-            # Use algorithmic optimization instead
-            design_data_copy = design_data.copy()
-            design_data_copy['modules'] = complete_modules
-            return optimize_habitat_algorithmic(design_data_copy)
+        session_id = request.headers.get('X-Session-Id')
+        deadline = request_deadline()
+        with span("cache_lookup"):
+            cache_key = design_key(f"optimize_ai:{session_id or ''}", design_data)
+            cached = result_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
         
         # Ensure all essential modules are present
-        complete_modules = ensure_essential_modules(modules, habitat_config)
+        with span("ensure_essentials"):
+            complete_modules = ensure_essential_modules(modules, habitat_config)
         
         if not complete_modules:
             return jsonify({"error": "No modules to optimize"}), 400
         
         # Enhanced AI prompt with NASA compliance requirements
+        prompt_started = time.perf_counter()
+        compact_modules = encode_modules(complete_modules)
         optimization_prompt = f"""SPACE HABITAT OPTIMIZATION TASK
 
 REQUIREMENTS:
-- Container: Cylinder R={habitat_config.get('radius', 5)}m H={habitat_config.get('height', 10)}m
+- Container: {encode_habitat(habitat_config)} (meters)
 - Crew: {crew_size} members
 - Modules: {len(complete_modules)} total (including added essential modules)
 
@@ -746,74 +1127,115 @@ NASA COMPLIANCE RULES:
 5. Life support: Accessible but separated from living areas
 6. Hygiene: Near exercise, away from food/medical
 
-COMPLETE MODULE LIST (including added essentials):
-{json.dumps([{"id": m.get("id"), "type": m.get("type"), "position": m.get("position"), "zone": m.get("zone"), "size": m.get("size"), "volume": m.get("volume"), "color": m.get("color")} for m in complete_modules], indent=1)}
+RELEVANT NASA GUIDELINES:
+{relevant_guidelines(design_data)}
+
+COMPLETE MODULE LIST (including added essentials, rows are id|type|position|size|rotation):
+{compact_modules}
 
-OUTPUT REQUIRED - Complete optimized layout achieving 90%+ NASA compliance:
+OUTPUT REQUIRED - Complete optimized layout achieving 90%+ NASA compliance, one [id, x, y, z] row per module:
 {{
   "validation": {{"overallScore": 90-95, "compliance": "compliant", "issues": [], "recommendations": []}},
-  "optimizedLayout": {{
-    "habitatConfig": {json.dumps(habitat_config)},
-    "modules": [
-      {{"id": "module_id", "type": "module_type", "position": [x,y,z], "size": [w,h,d], "zone": "zone", "volume": num, "color": "color"}},
-      ...
-    ],
-    "changes": ["specific changes made"],
-    "reasoning": "NASA compliance explanation"
-  }},
+  "modules": [["module_id", x, y, z], ...],
+  "changes": ["specific changes made"],
+  "reasoning": "NASA compliance explanation",
   "analysis": {{"volumeAnalysis": "", "zoningAnalysis": "", "adjacencyAnalysis": "", "safetyAnalysis": ""}}
 }}
 
 Ensure ALL {len(complete_modules)} modules (including newly added essentials) are repositioned for maximum NASA compliance."""
+        legacy_modules = json.dumps([{"id": m.get("id"), "type": m.get("type"), "position": m.get("position"), "zone": m.get("zone"), "size": m.get("size"), "volume": m.get("volume"), "color": m.get("color")} for m in complete_modules], indent=1)
+        baseline_prompt = optimization_prompt.replace(compact_modules, legacy_modules) + json.dumps(habitat_config) * 2
+        g.trace.add_span("prompt_build", prompt_started, time.perf_counter())
         
         print(f"AI optimizing {len(modules)} modules for NASA compliance")
         
-        # Try AI optimization with minimal retries
-        try:
-            if habitat_chat_session is None:
-                initialize_chat_sessions()
-                if habitat_chat_session is None:
-                    print("AI not available, using algorithmic optimization")
-                    return optimize_habitat()
+        def request_optimization():
+            """Rate-limited Gemini call, returns the reply text or None for the algorithmic fallback"""
+            # Check the circuit and rate limits first - if either says no, use algorithmic optimization
+            blocked = ai_call_blocked("optimize_habitat_ai")
+            if blocked:
+                print(f"AI call skipped ({blocked}), using algorithmic optimization")
+                return None
             
-            response = habitat_chat_session.send_message(optimization_prompt)
-            
-        except Exception as api_error:
-            error_msg = str(api_error).lower()
-            if "quota" in error_msg or "rate" in error_msg or "429" in error_msg:
-                print("API quota/rate limit hit, using algorithmic optimization")
-                design_data_copy = design_data.copy()
-                design_data_copy['modules'] = complete_modules
-                return optimize_habitat_algorithmic(design_data_copy)
-            else:
-                print(f"AI optimization failed: {api_error}, using algorithmic optimization")
-                design_data_copy = design_data.copy()
-                design_data_copy['modules'] = complete_modules
-                return optimize_habitat_algorithmic(design_data_copy)
+            with gemini_breaker.attempt() as call:
+                try:
+                    if not ensure_llm_sessions("optimize_habitat_ai"):
+                        return None
+                    with span("gemini"):
+                        response = generate_with_metrics("optimize_habitat_ai", optimization_prompt, deadline, call,
+                                                          session_id=session_id)
+                    usage = token_ledger.record("optimize_habitat_ai",
+                                                response_usage(response, optimization_prompt, response.text),
+                                                baseline_prompt=baseline_prompt)
+                    print(f"Optimization tokens: {usage['promptTokens']} prompt (was ~{usage['baselineTokens']}), "
+                          f"{usage['responseTokens']} response")
+                    return response.text or ""
+                except DeadlineExceeded:
+                    print("AI optimization ran out of time, using algorithmic optimization")
+                    fallback_counter.inc(endpoint="optimize_habitat_ai", reason="deadline")
+                    return None
+                except Exception as api_error:
+                    if classify_error(api_error) != "other":
+                        print("API quota/rate limit hit, using algorithmic optimization")
+                        fallback_counter.inc(endpoint="optimize_habitat_ai", reason="api_quota")
+                    else:
+                        print(f"AI optimization failed: {api_error}, using algorithmic optimization")
+                        fallback_counter.inc(endpoint="optimize_habitat_ai", reason="api_error")
+                    return None
+        
+        # Identical concurrent requests share one Gemini call; each parses its own copy of the reply
+        try:
+            response_text, shared = ai_flights.do(cache_key, request_optimization,
+                                                  timeout=min(SINGLE_FLIGHT_TIMEOUT, max(0.0, deadline - time.monotonic())))
+        except Exception as e:
+            print(f"AI optimization failed: {e}, using algorithmic optimization")
+            fallback_counter.inc(endpoint="optimize_habitat_ai", reason="shared_call_failed")
+            response_text, shared = None, False
         
-        if not response.text or not response.text.strip():
+        if response_text is None:
+            if shared:
+                fallback_counter.inc(endpoint="optimize_habitat_ai", reason="shared_fallback")
+            design_data_copy = design_data.copy()
+            design_data_copy['modules'] = complete_modules
+            return cached_algorithmic_optimization(design_data_copy, cache_key)
+        
+        if not response_text.strip():
             return jsonify({"error": "AI response was empty or blocked"}), 503
         
         # Parse the JSON response
         try:
-            optimization_result = json.loads(response.text)
+            with span("parse"):
+                parsed, repaired = extract_json(response_text)
+                optimization_result = expand_optimization_result(parsed, complete_modules, habitat_config)
+            llm_parse_counter.inc(endpoint="optimize_habitat_ai", outcome="repaired" if repaired else "ok")
+            optimization_result.setdefault("validation", {})
             
             # Validate the AI result
             ai_modules = optimization_result.get("optimizedLayout", {}).get("modules", [])
+            if repaired and 0 < len(ai_modules) < len(complete_modules):
+                # Modules cut off by a truncated reply keep their current positions
+                returned_ids = {m.get('id') for m in ai_modules}
+                missing = [dict(m) for m in complete_modules if m.get('id') not in returned_ids]
+                ai_modules.extend(missing)
+                optimization_result["optimizedLayout"].setdefault("changes", []).append(
+                    f"{len(missing)} modules kept their positions because the AI reply was truncated")
             if len(ai_modules) != len(complete_modules):
+                gemini_errors.inc(endpoint="optimize_habitat_ai", error_class="module_count")
                 return jsonify({"error": f"AI returned {len(ai_modules)} modules, expected {len(complete_modules)}"}), 422
             
             # Ensure all module properties are preserved
-            for i, original in enumerate(complete_modules):
-                if i < len(ai_modules):
-                    ai_module = ai_modules[i]
-                    # Preserve all original properties
-                    for key, value in original.items():
-                        if key not in ai_module or ai_module[key] is None:
-                            ai_module[key] = value
+            with span("backfill"):
+                for i, original in enumerate(complete_modules):
+                    if i < len(ai_modules):
+                        ai_module = ai_modules[i]
+                        # Preserve all original properties
+                        for key, value in original.items():
+                            if key not in ai_module or ai_module[key] is None:
+                                ai_module[key] = value
             
             # Validate compliance score
-            actual_score, actual_issues = calculate_compliance_score(ai_modules, habitat_config)
+            with span("rescore"):
+                actual_score, actual_issues = calculate_compliance_score(ai_modules, habitat_config)
             
             # Update the result with actual calculated score
             optimization_result["validation"]["overallScore"] = actual_score
@@ -826,16 +1248,109 @@ Ensure ALL {len(complete_modules)} modules (including newly added essentials) ar
             else:
                 optimization_result["validation"]["compliance"] = "critical"
             
+            optimizer_scores.observe(actual_score, source="ai")
             print(f"AI optimization complete. Actual score: {actual_score}%")
+            result_cache.set(cache_key, optimization_result)
             return jsonify(optimization_result)
             
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             print(f"AI response parsing failed: {e}")
+            llm_parse_counter.inc(endpoint="optimize_habitat_ai", outcome="failed")
+            gemini_errors.inc(endpoint="optimize_habitat_ai", error_class="parse")
             return jsonify({"error": "AI response format invalid"}), 422
         
     except Exception as e:
         print(f"Error in AI optimization: {e}")
         return jsonify({"error": f"AI optimization failed: {str(e)}"}), 500
 
+@app.route("/validate_habitats_batch", methods=["POST"])
+def validate_habitats_batch():
+    """Validate many designs, streaming one NDJSON result line per design as it completes"""
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        items = iter_ndjson(request.stream)
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({"error": "Expected a JSON array or NDJSON stream of designs"}), 400
+    
+    ai_count = min(request.args.get('ai', 0, type=int), BATCH_AI_LIMIT)
+    ai_designs = {}
+    
+    def remember_ai_designs(items):
+        # Keep only the designs selected for AI enrichment, everything else streams through
+        for index, payload in enumerate(items):
+            if index < ai_count:
+                try:
+                    ai_designs[index] = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+                except ValueError:
+                    pass  # The worker reports the parse error for this line
+            yield payload
+    
+    def generate():
+        for result in run_batch(remember_ai_designs(items)):
+            design_data = ai_designs.pop(result["index"], None)
+            if design_data is not None and "error" not in result:
+                # Same cache and in-flight calls as /validate_habitat, so a design is not sent to Gemini twice
+                try:
+                    cache_key = design_key("validate:", design_data)
+                    result["ai"] = result_cache.get(cache_key)
+                    if result["ai"] is None:
+                        result["ai"], _ = shared_ai_validation(design_data, cache_key, request_deadline(),
+                                                               endpoint="validate_habitats_batch")
+                except Exception as e:
+                    print(f"Batch AI enrichment failed: {e}")
+                    result["ai"] = None
+            yield json.dumps(result) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/score_delta", methods=["POST"])
+def score_delta():
+    """Rescore a design after a single module edit without a full rescore"""
+    try:
+        delta_data = request.get_json()
+        if not delta_data:
+            return jsonify({"error": "No design data provided"}), 400
+        
+        # The registry lock only covers the LRU; each state has its own lock for edits
+        state_id = delta_data.get('stateId')
+        edit = state_id is not None
+        if not edit:
+            # First call: build the state from the full design
+            state = ScoreState(delta_data.get('modules', []), delta_data.get('habitatConfig', {}))
+            state_id = uuid.uuid4().hex
+            with score_states_lock:
+                score_states[state_id] = state
+                if len(score_states) > MAX_SCORE_STATES:
+                    score_states.popitem(last=False)
+        else:
+            with score_states_lock:
+                state = score_states.get(state_id)
+                if state is not None:
+                    score_states.move_to_end(state_id)
+            if state is None:
+                return jsonify({"error": "Unknown or expired stateId, resend the full design"}), 404
+        
+        with state.lock:
+            if edit:
+                state.apply(delta_data.get('op'), delta_data.get('module', {}))
+            score, issues = state.score()
+        
+        return jsonify({
+            "stateId": state_id,
+            "validation": {
+                "overallScore": score,
+                "compliance": "compliant" if score >= 85 else "warning" if score >= 70 else "critical",
+                "issues": issues
+            }
+        })
+    
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid edit: {e.args[0] if e.args else e}"}), 400
+    except Exception as e:
+        print(f"Error in delta scoring: {e}")
+        return jsonify({"error": f"Delta scoring failed: {str(e)}"}), 500
+
 if __name__ == "__main__":
+    startup()
     app.run(debug=True,host='0.0.0.0',port=5000)
\ No newline at end of file
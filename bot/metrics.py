@@ -0,0 +1,198 @@
+import bisect
+import itertools
+import math
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request and Gemini call latencies, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Compliance scores, 0-100
+SCORE_BUCKETS = (10, 20, 30, 40, 50, 60, 70, 80, 85, 90, 95, 100)
+# Seconds until the next AI slot when the rate limiter says no
+WAIT_BUCKETS = (1, 5, 10, 30, 60, 300, 900, 3600)
+# Lock stripes per metric; threads share them round-robin
+SHARD_COUNT = 16
+
+
+def _label_key(label_names, labels):
+    if set(labels) != set(label_names):
+        raise ValueError(f"expected labels {label_names}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Shards:
+    """A fixed set of lock-striped dicts, so concurrent writers rarely wait on the same lock
+
+    Each thread is given a stripe the first time it writes and keeps it. A
+    scrape sums across all stripes. The stripe count never changes, so
+    threads that come and go do not grow it.
+    """
+
+    def __init__(self, count=SHARD_COUNT):
+        self.stripes = [({}, threading.Lock()) for _ in range(count)]
+        self.local = threading.local()
+        self.next_stripe = itertools.count()
+
+    def mine(self):
+        """(dict, lock) of the calling thread's stripe; write to the dict only while holding the lock"""
+        stripe = getattr(self.local, 'stripe', None)
+        if stripe is None:
+            stripe = self.stripes[next(self.next_stripe) % len(self.stripes)]
+            self.local.stripe = stripe
+        return stripe
+
+    def snapshot(self, copy=None):
+        """Copies of every stripe's dict, with values passed through copy when given"""
+        copies = []
+        for shard, lock in self.stripes:
+            with lock:
+                copies.append({key: copy(value) for key, value in shard.items()} if copy else dict(shard))
+        return copies
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.shards = _Shards()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        shard, lock = self.shards.mine()
+        with lock:
+            shard[key] = shard.get(key, 0) + amount
+
+    def values(self):
+        totals = {}
+        for shard in self.shards.snapshot():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(zip(self.label_names, key))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.shards = _Shards()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        shard, lock = self.shards.mine()
+        with lock:
+            series = shard.get(key)
+            if series is None:
+                # Bucket counts (non-cumulative, last slot is +Inf), then sum
+                series = [0] * (len(self.buckets) + 1) + [0.0]
+                shard[key] = series
+            series[bucket] += 1
+            series[-1] += value
+
+    def values(self):
+        totals = {}
+        for shard in self.shards.snapshot(copy=list):
+            for key, series in shard.items():
+                total = totals.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, value in enumerate(series):
+                    total[i] += value
+        return totals
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.values().items()):
+            pairs = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                labels = _format_labels(pairs + [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {series[-1]!r}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time, for stats other components already keep
+
+    Use kind="counter" when the callback returns a running total.
+    """
+
+    def __init__(self, name, help_text, callback, label_names=(), kind="gauge"):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_format_labels(zip(self.label_names, key))} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if any(m.name == metric.name for m in self.metrics):
+                raise ValueError(f"metric {metric.name} already registered")
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self.register(Counter(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def gauge(self, name, help_text, callback, label_names=(), kind="gauge"):
+        return self.register(Gauge(name, help_text, callback, label_names, kind))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Could not render metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
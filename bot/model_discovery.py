@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# FREE TIER models only, in order of preference
+FREE_TIER_MODELS = [
+    'gemini-1.5-flash',    # Current free tier model
+    'gemini-pro',          # Legacy free model
+    'gemini-1.0-pro',      # Alternative free model
+]
+DEFAULT_MODEL = 'gemini-1.5-flash'
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.model_cache.json')
+
+
+class ModelDiscovery:
+    """Lazy, cached selection of the best working Gemini model
+
+    Nothing touches the network until get_model() is first called. Candidate
+    models are then probed concurrently under a deadline and the winner is
+    written to a small JSON cache, so restarts and extra workers within the
+    TTL skip probing entirely. The genai module is passed in so it can be stubbed.
+    """
+
+    def __init__(self, genai_module, models=FREE_TIER_MODELS, cache_path=DEFAULT_CACHE_PATH,
+                 ttl=24 * 3600, deadline=8.0):
+        self.genai = genai_module
+        self.models = list(models)
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.deadline = deadline
+        self.model = None
+        self.stats = {"source": None, "seconds": None, "probes": {}}
+        self.lock = threading.Lock()
+
+    def get_model(self, refresh=False):
+        """Return the chosen model name, discovering it on first use"""
+        with self.lock:
+            if self.model is not None and not refresh:
+                return self.model
+            started = time.perf_counter()
+            model = None if refresh else self._read_cache()
+            source = "disk"
+            if model is None:
+                model, source = self._probe()
+                if source == "probe":
+                    self._write_cache(model)
+            self.model = model
+            self.stats["source"] = source
+            self.stats["seconds"] = round(time.perf_counter() - started, 4)
+            return model
+
+    def backup_models(self, primary):
+        """Other candidate models, in order of preference, that have not failed a probe"""
+        probes = self.stats["probes"]
+        return [m for m in self.models if m != primary and probes.get(m, "ok") == "ok"]
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, 'r') as file:
+                cached = json.load(file)
+            if cached.get('model') in self.models and time.time() - cached.get('checked_at', 0) < self.ttl:
+                print(f"Using cached FREE TIER model: {cached['model']}")
+                return cached['model']
+        except (OSError, ValueError, AttributeError):
+            pass
+        return None
+
+    def _write_cache(self, model):
+        try:
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump({"model": model, "checked_at": time.time()}, file)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not write model cache: {e}")
+
+    def _probe_one(self, model):
+        test_model = self.genai.GenerativeModel(model_name=model)
+        test_model.generate_content("test", generation_config={"max_output_tokens": 10})
+        return model
+
+    def _probe(self):
+        """Probe all models in parallel, returns (model, source)"""
+        probes = {}
+        executor = ThreadPoolExecutor(max_workers=len(self.models), thread_name_prefix='model-probe')
+        futures = {executor.submit(self._probe_one, model): model for model in self.models}
+        end = time.monotonic() + self.deadline
+        try:
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    model = futures[future]
+                    error = future.exception()
+                    probes[model] = "ok" if error is None else str(error)
+                    if error is not None:
+                        print(f"Model {model} failed: {error}")
+                # The best model wins as soon as every preferred model has answered
+                for model in self.models:
+                    if model not in probes:
+                        break
+                    if probes[model] == "ok":
+                        print(f"Successfully using FREE TIER model: {model}")
+                        self.stats["probes"] = probes
+                        return model, "probe"
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self.stats["probes"] = probes
+        working = [m for m in self.models if probes.get(m) == "ok"]
+        if working:
+            # Not cached: a preferred model may just have been slow this time
+            print(f"Probe deadline reached, using FREE TIER model: {working[0]}")
+            return working[0], "deadline"
+        print(f"WARNING: No free model answered, using {DEFAULT_MODEL} as fallback")
+        return DEFAULT_MODEL, "default"
@@ -0,0 +1,336 @@
+import math
+import random
+import time
+
+import numpy as np
+
+from geometry import CONTAINMENT_TOLERANCE, MIN_CLEARANCE, OrientedBoxes, Shell, box_gaps, find_collisions
+from pathing import EXIT_TYPE
+from scoring import (
+    ADJACENCY_PENALTY,
+    COLLISION_PENALTY,
+    MIN_ADJACENCY_DISTANCE,
+    LayoutScorer,
+    base_score,
+    encode_types,
+    forbidden_mask,
+    layout_positions,
+)
+
+# Cost of one pair closer than MIN_CLEARANCE relative to one adjacency violation
+OVERLAP_WEIGHT = 0.5
+
+# Sleep quarters should be kept away from these ("sleep away from noise")
+QUIET_TYPES = ['sleep']
+NOISY_TYPES = ['exercise', 'life-support', 'maintenance']
+# Quiet-noisy centre distance below which the noise weight applies, meters
+NOISE_DISTANCE = 8.0
+# Overlap weight multiplier at a spread weight of 1
+SPREAD_FACTOR = 4.0
+# Secondary objectives that can be weighted into the energy
+WEIGHT_NAMES = ('egress', 'noise', 'spread')
+
+START_TEMPERATURE = 2.0
+END_TEMPERATURE = 0.02
+SWAP_PROBABILITY = 0.2
+JUMP_PROBABILITY = 0.1
+# A seeded search runs a fixed number of iterations, so the seed repeats it on any machine.
+# A time budget buys this many of them per second, a fixed rate rather than a measured one
+ITERATIONS_PER_SECOND = 2000
+# How often the wall clock and temperature are updated, in iterations
+CLOCK_INTERVAL = 32
+
+
+class AnnealingOptimizer:
+    """Simulated annealing over module positions with incremental move evaluation
+
+    The objective is the position-dependent part of calculate_compliance_score
+    (adjacency and box collisions) plus a soft penalty for module walls closer
+    than MIN_CLEARANCE. Every module is kept inside the habitat shell. Moving one module only rescores the
+    pairs it takes part in, so a move costs O(n) vector work instead of a full
+    O(n²) rescore.
+
+    weights adds pairwise secondary terms to the energy, keyed by WEIGHT_NAMES:
+    egress pulls modules towards the airlocks, noise pushes quiet modules away
+    from noisy ones and spread raises the cost of pairs closer than
+    MIN_CLEARANCE. Compliance still decides which layout is best, the
+    secondary terms break ties and steer the walk.
+    """
+
+    def __init__(self, modules, habitat_config, seed=None, weights=None):
+        self.modules = modules
+        self.habitat_config = habitat_config
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = np.random.default_rng(self.seed)
+
+        radius = habitat_config.get('radius', 5)
+        height = habitat_config.get('height', 10)
+        self.positions = layout_positions(modules)
+        # The boxes read the live position array, so moves never have to be copied over
+        self.boxes = OrientedBoxes.from_modules(modules)
+        self.boxes.centers = self.positions
+        self.shell = Shell.from_config(habitat_config)
+        # Same safety margins as create_nasa_compliant_layout, widened for large modules
+        planar_limits, vertical_limits = self.shell.limits(self.boxes)
+        self.max_radius = np.maximum(np.minimum(radius - 1.5, planar_limits), 0.0)
+        self.max_height = np.maximum(np.minimum(height / 2 - 1.5, vertical_limits), 0.0)
+
+        # Free volume per crew is taken at the starting positions and held fixed while annealing
+        self.base, _ = base_score(modules, habitat_config)
+        type_names, self.codes = encode_types(modules)
+        mask = forbidden_mask(type_names)
+        # A module pair counts once per direction it is forbidden in
+        pair_weights = mask.astype(np.int64) + mask.T
+        self.weight_rows = pair_weights[:, self.codes]
+
+        self.weights = {name: float((weights or {}).get(name, 0.0)) for name in WEIGHT_NAMES}
+        self.overlap_weight = OVERLAP_WEIGHT * (1 + SPREAD_FACTOR * self.weights['spread'])
+        self.pull_rows, self.push_rows = self._secondary_rows(type_names, radius)
+        self.weighted = bool(self.pull_rows.any() or self.push_rows.any())
+
+        self.penalty, self.overlaps, self.secondary = self._totals()
+
+    def _secondary_rows(self, type_names, radius):
+        """Per-pair secondary weights by type, laid out like weight_rows
+
+        The egress term adds up to the mean centre distance of the crew modules
+        to the airlocks over the shell radius, the noise term to the shortfall
+        of each quiet-noisy pair from NOISE_DISTANCE over NOISE_DISTANCE.
+        """
+        types = len(type_names)
+        pull, push = np.zeros((types, types)), np.zeros((types, types))
+        counts = np.bincount(self.codes, minlength=types)
+        exits = [t for t, name in enumerate(type_names) if name == EXIT_TYPE]
+        crew = len(self.codes) - sum(counts[t] for t in exits)
+        if exits and crew and self.weights['egress']:
+            pull_weight = self.weights['egress'] / (counts[exits[0]] * crew * max(radius, 1e-6))
+            pull[exits, :] = pull_weight
+            pull[:, exits] = pull_weight
+            pull[np.ix_(exits, exits)] = 0.0
+        if self.weights['noise']:
+            quiet = [t for t, name in enumerate(type_names) if name in QUIET_TYPES]
+            noisy = [t for t, name in enumerate(type_names) if name in NOISY_TYPES]
+            push[np.ix_(quiet, noisy)] = self.weights['noise'] / NOISE_DISTANCE
+            push[np.ix_(noisy, quiet)] = self.weights['noise'] / NOISE_DISTANCE
+        return pull[:, self.codes], push[:, self.codes]
+
+    def _pair_costs(self, codes, distance):
+        """Secondary cost of each row's pairs, distance being inf for pairs to leave out"""
+        finite = np.isfinite(distance)
+        pull = self.pull_rows[codes] * np.where(finite, distance, 0.0)
+        push = self.push_rows[codes] * np.maximum(0.0, NOISE_DISTANCE - distance)
+        return (pull + push).sum(axis=-1)
+
+    def _totals(self):
+        """Full O(n²) evaluation: (score penalty in points, pairs closer than MIN_CLEARANCE, secondary cost)"""
+        diff = self.positions[:, None, :] - self.positions[None, :, :]
+        distance = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+        np.fill_diagonal(distance, np.inf)
+        weights = self.weight_rows[self.codes]
+        violations = int((weights * (distance < MIN_ADJACENCY_DISTANCE)).sum()) // 2
+        _, _, gaps = find_collisions(self.boxes, MIN_CLEARANCE)
+        penalty = ADJACENCY_PENALTY * violations + COLLISION_PENALTY * int(np.count_nonzero(gaps < 0))
+        secondary = float(self._pair_costs(self.codes, distance).sum()) / 2 if self.weighted else 0.0
+        return penalty, len(gaps), secondary
+
+    def _change(self, moves):
+        """(penalty delta, close-pair delta, secondary delta) of moving modules, given as (k, old point, new point, skip) tuples
+
+        skip is the partner in a swap, whose pair with k is measured separately
+        at both placements. All placements are evaluated together, so a move
+        costs a fixed number of O(n) vector operations.
+        """
+        modules = np.array([k for k, _, _, _ in moves for _ in (0, 1)])
+        points = np.array([point for _, old, new, _ in moves for point in (old, new)], dtype=float)
+        signs = np.tile([-1, 1], len(moves))
+        rows = np.arange(len(modules))
+
+        offset = np.abs(self.positions[None, :, :] - points[:, None, :])
+        distance = np.sqrt(np.einsum('qij,qij->qi', offset, offset))
+        distance[rows, modules] = np.inf
+        for row, (_, _, _, skip) in zip(range(0, len(modules), 2), moves):
+            if skip is not None:
+                distance[row:row + 2, skip] = np.inf
+        violations = (self.weight_rows[self.codes[modules]] * (distance < MIN_ADJACENCY_DISTANCE)).sum(axis=1)
+        delta_penalty = ADJACENCY_PENALTY * int(signs @ violations)
+        delta_secondary = float(signs @ self._pair_costs(self.codes[modules], distance)) if self.weighted else 0.0
+
+        # Box pairs: every module whose AABB comes near each placement, plus the swapped pair itself
+        reach = self.boxes.extents[None, :, :] + self.boxes.extents[modules][:, None, :] + MIN_CLEARANCE
+        near = np.all(offset <= reach, axis=2) & np.isfinite(distance)
+        query, others = np.nonzero(near)
+        index_a, centers_a = modules[query], points[query]
+        index_b, centers_b = others, self.positions[others]
+        pair_signs = signs[query]
+        if len(moves) == 2 and moves[0][3] is not None:
+            (k, old_k, new_k, j), (_, old_j, new_j, _) = moves
+            index_a = np.concatenate([index_a, [k, k]])
+            centers_a = np.concatenate([centers_a, [old_k, new_k]])
+            index_b = np.concatenate([index_b, [j, j]])
+            centers_b = np.concatenate([centers_b, [old_j, new_j]])
+            pair_signs = np.concatenate([pair_signs, [-1, 1]])
+        if len(pair_signs) == 0:
+            return delta_penalty, 0, delta_secondary
+        gaps = box_gaps(self.boxes, index_a, centers_a, self.boxes, index_b, centers_b)
+        delta_penalty += COLLISION_PENALTY * int(pair_signs @ (gaps < 0))
+        return delta_penalty, int(pair_signs @ (gaps < MIN_CLEARANCE)), delta_secondary
+
+    def _clamp(self, k, point):
+        """Keep module k's centre inside the habitat's safety margins, quantized like layout output"""
+        max_radius, max_height = self.max_radius[k], self.max_height[k]
+        planar = math.hypot(point[0], point[2])
+        if planar > max_radius:
+            scale = max_radius / planar
+            point[0] *= scale
+            point[2] *= scale
+        point[1] = min(max(point[1], -max_height), max_height)
+        # The margins above are rough, pull inward until the whole box fits the shell once rounded
+        return self.shell.fit(self.boxes, k, point)
+
+    def _random_point(self, k):
+        """Uniform point within module k's margins"""
+        max_radius, max_height = self.max_radius[k], self.max_height[k]
+        angle = self.rng.uniform(0, 2 * math.pi)
+        planar = max_radius * math.sqrt(self.rng.random())
+        return np.array([planar * math.cos(angle), self.rng.uniform(-max_height, max_height), planar * math.sin(angle)])
+
+    def _propose_point(self, k, progress):
+        if self.rng.random() < JUMP_PROBABILITY:
+            point = self._random_point(k)
+        else:
+            # Step size shrinks as the search cools down
+            sigma = max(0.1, (1 - progress) * max(self.max_radius[k], self.max_height[k]) / 2)
+            point = self.positions[k] + self.rng.normal(0, sigma, 3)
+        return self._clamp(k, point)
+
+    def scatter(self):
+        """Move every module to a random point, so independent starts explore different layouts"""
+        for k in range(len(self.modules)):
+            self.positions[k] = self._clamp(k, self._random_point(k))
+        self.penalty, self.overlaps, self.secondary = self._totals()
+
+    def _score(self, penalty):
+        return max(0, self.base - penalty)
+
+    def energy(self, penalty, overlaps, secondary=0.0):
+        # Penalties are in score points, scaled so one adjacency violation costs 1
+        return penalty / ADJACENCY_PENALTY + self.overlap_weight * overlaps + secondary
+
+    def _key(self):
+        # Compliance first, the weighted secondary terms only among equally compliant layouts
+        return (self.penalty, self.overlaps, self.secondary) if self.weighted else (self.penalty, self.overlaps)
+
+    def run(self, time_budget, iterations=None):
+        """Anneal within time_budget seconds, returns a result dict
+
+        Without iterations, the search cools down over the time budget and
+        stops when it is spent. With iterations, it cools down over that many
+        iterations, so the result only depends on the seed and the count. The
+        time budget then still stops it (when above 0), and the result reports
+        the cut as truncated.
+        """
+        n = len(self.modules)
+        budget = iterations
+        started = time.perf_counter()
+        deadline = started + max(0.0, time_budget)
+        timed = budget is None or time_budget > 0
+        truncated = False
+
+        best_positions = self.positions.copy()
+        best_key = self._key()
+        trajectory = [[0, self._score(self.penalty)]]
+        iterations = 0
+        progress = 0.0
+        temperature = START_TEMPERATURE
+
+        # Unweighted searches are done once the layout is clean, weighted ones keep improving the secondary terms
+        while n > 1 and (self.weighted or best_key != (0, 0)) and (budget is None or iterations < budget):
+            if iterations % CLOCK_INTERVAL == 0:
+                now = time.perf_counter()
+                if timed and now >= deadline:
+                    truncated = budget is not None
+                    break
+                progress = iterations / budget if budget is not None else (now - started) / time_budget
+                temperature = START_TEMPERATURE * (END_TEMPERATURE / START_TEMPERATURE) ** progress
+            iterations += 1
+
+            k = int(self.rng.integers(n))
+            if self.rng.random() < SWAP_PROBABILITY:
+                j = int(self.rng.integers(n))
+                if j == k or self.codes[j] == self.codes[k]:
+                    continue
+                # The k-j centre distance stays the same, but their boxes may differ in size
+                point_k, point_j = self.positions[k].copy(), self.positions[j].copy()
+                # Moves are clamped into the shell, swaps that would leave it are skipped
+                if np.any(self.shell.depths_at(self.boxes, [k, j], [point_j, point_k]) > CONTAINMENT_TOLERANCE):
+                    continue
+                delta_penalty, delta_overlaps, delta_secondary = self._change(
+                    [(k, point_k, point_j, j), (j, point_j, point_k, k)])
+            else:
+                j = None
+                point = self._propose_point(k, progress)
+                delta_penalty, delta_overlaps, delta_secondary = self._change(
+                    [(k, self.positions[k].copy(), point, None)])
+
+            delta = self.energy(delta_penalty, delta_overlaps, delta_secondary)
+            if delta > 0 and self.rng.random() >= math.exp(-delta / temperature):
+                continue
+
+            if j is None:
+                self.positions[k] = point
+            else:
+                self.positions[[k, j]] = self.positions[[j, k]]
+            self.penalty += delta_penalty
+            self.overlaps += delta_overlaps
+            self.secondary += delta_secondary
+
+            if self._key() < best_key:
+                best_key = self._key()
+                best_positions = self.positions.copy()
+                if self._score(self.penalty) != trajectory[-1][1]:
+                    trajectory.append([iterations, self._score(self.penalty)])
+
+        elapsed = time.perf_counter() - started
+        best_modules = []
+        for module, position in zip(self.modules, best_positions.tolist()):
+            best_module = module.copy()
+            best_module['position'] = [round(c, 2) for c in position]
+            best_modules.append(best_module)
+
+        score, issues = LayoutScorer(best_modules, self.habitat_config).score()
+        if trajectory[-1] != [iterations, score]:
+            trajectory.append([iterations, score])
+
+        return {
+            "modules": best_modules,
+            "score": score,
+            "issues": issues,
+            "overlaps": best_key[1],
+            "iterations": iterations,
+            "iterationBudget": budget,
+            "truncated": truncated,
+            "scoreTrajectory": trajectory,
+            "seed": self.seed,
+            "weights": self.weights,
+            "elapsedMs": round(elapsed * 1000, 2),
+            "evaluationsPerSecond": round(iterations / elapsed) if elapsed > 0 else 0,
+        }
+
+
+def iteration_budget(time_budget):
+    """Iterations granted by a time budget in seconds"""
+    return max(0, int(round(time_budget * ITERATIONS_PER_SECOND)))
+
+
+def optimize_layout(modules, habitat_config, time_budget=0.25, seed=None, scatter=False, weights=None):
+    """Improve module positions by simulated annealing within a wall-clock budget
+
+    A given seed fixes the iteration count at iteration_budget(time_budget),
+    so the search can be repeated. Without one, the search uses the whole
+    budget. With scatter, the search starts from random positions instead of
+    the given layout. weights are passed on to AnnealingOptimizer.
+    """
+    optimizer = AnnealingOptimizer(modules, habitat_config, seed=seed, weights=weights)
+    if scatter:
+        optimizer.scatter()
+    return optimizer.run(time_budget, iterations=iteration_budget(time_budget) if seed is not None else None)
@@ -0,0 +1,182 @@
+import math
+import os
+import random
+import time
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from batch_validation import get_pool
+from geometry import OrientedBoxes, Shell, find_collisions
+from optimizer import NOISY_TYPES, QUIET_TYPES, WEIGHT_NAMES, optimize_layout
+from pathing import path_report
+from scoring import layout_positions
+from voxels import OccupancyGrid
+
+# Sum of the secondary objective weights of a scattered start
+SECONDARY_WEIGHT = 2.0
+
+# Objective name -> +1 when higher is better, -1 when lower is better
+OBJECTIVES = {
+    'score': 1,
+    'freeVolume': 1,
+    'worstEgress': -1,
+    'noiseSeparation': 1,
+}
+
+
+def noise_separation(modules):
+    """Smallest centre distance between a quiet and a noisy module, None if the layout has no such pair"""
+    positions = layout_positions(modules)
+    quiet = [i for i, m in enumerate(modules) if m.get('type') in QUIET_TYPES]
+    noisy = [i for i, m in enumerate(modules) if m.get('type') in NOISY_TYPES]
+    if not quiet or not noisy:
+        return None
+    diff = positions[quiet][:, None, :] - positions[noisy][None, :, :]
+    return round(float(np.sqrt(np.einsum('ijk,ijk->ij', diff, diff)).min()), 2)
+
+
+def start_weights(seed):
+    """Secondary objective weights of a scattered start, a random split of SECONDARY_WEIGHT drawn from its seed"""
+    split = np.random.default_rng(seed).dirichlet(np.ones(len(WEIGHT_NAMES)))
+    return {name: round(float(w) * SECONDARY_WEIGHT, 4) for name, w in zip(WEIGHT_NAMES, split)}
+
+
+def constraint_violations(modules, habitat_config):
+    """Colliding module pairs plus modules outside the shell; a layout is only feasible at 0"""
+    boxes = OrientedBoxes.from_modules(modules)
+    pair_i, _, _ = find_collisions(boxes)
+    return len(pair_i) + int(np.count_nonzero(Shell.from_config(habitat_config).outside(boxes)))
+
+
+def run_start(modules, habitat_config, seed, time_budget, scatter, weights=None):
+    """Worker: one seeded annealing start and its objectives
+
+    freeVolume is only measured for feasible layouts, since overlapping or
+    protruding modules would otherwise leave more of the shell free.
+    """
+    started = time.perf_counter()
+    search = optimize_layout(modules, habitat_config, time_budget=time_budget, seed=seed, scatter=scatter,
+                             weights=weights)
+    violations = constraint_violations(search["modules"], habitat_config)
+    occupancy = OccupancyGrid(habitat_config, search["modules"])
+    paths = path_report(search["modules"], habitat_config, occupancy)
+    worst = paths["worstEgress"]
+    # Free space walled off from the airlocks is not usable, count only what can be reached
+    free_volume = paths["reachableVolume"] if paths["reachableVolume"] is not None else paths["walkableVolume"]
+    objectives = {
+        "score": search["score"],
+        "freeVolume": free_volume if violations == 0 else None,
+        "worstEgress": None if worst is None else worst["distance"],
+        "noiseSeparation": noise_separation(search["modules"]),
+    }
+    return {
+        "seed": seed,
+        "scattered": scatter,
+        "weights": weights,
+        "feasible": violations == 0,
+        "constraintViolations": violations,
+        "objectives": objectives,
+        "modules": search["modules"],
+        "issues": search["issues"],
+        "pathViolations": paths["violations"],
+        "iterations": search["iterations"],
+        "optimizerMs": search["elapsedMs"],
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 2),
+        "pid": os.getpid(),
+    }
+
+
+def objective_matrix(results):
+    """(n, objectives) array oriented so higher is always better; a missing value ranks worst"""
+    matrix = np.empty((len(results), len(OBJECTIVES)))
+    for i, result in enumerate(results):
+        for j, (name, sense) in enumerate(OBJECTIVES.items()):
+            value = result["objectives"][name]
+            matrix[i, j] = -math.inf if value is None else sense * value
+    return matrix
+
+
+def non_dominated(matrix):
+    """Boolean mask of rows no other row dominates; of rows with identical objectives only the first is kept"""
+    at_least = np.all(matrix[:, None, :] >= matrix[None, :, :], axis=2)
+    better = np.any(matrix[:, None, :] > matrix[None, :, :], axis=2)
+    # dominated[j] when some row i is at least as good everywhere and better somewhere
+    dominated = np.any(at_least & better, axis=0)
+    same = at_least & at_least.T
+    duplicate = np.any(np.triu(same, k=1), axis=0)
+    return ~dominated & ~duplicate
+
+
+def front_candidates(results):
+    """Indices of the results that compete for the front
+
+    Collisions and containment are hard constraints: only feasible layouts
+    compete, or when there are none, the layouts with the fewest violations.
+    """
+    violations = np.array([result["constraintViolations"] for result in results])
+    return np.flatnonzero(violations == violations.min())
+
+
+def rank_front(matrix):
+    """Order of front rows: compliance score first, then the sum of the other objectives scaled to [0, 1]"""
+    balance = np.zeros(len(matrix))
+    for column in matrix[:, 1:].T:
+        finite = np.isfinite(column)
+        if not finite.any():
+            continue
+        low, high = column[finite].min(), column[finite].max()
+        scaled = (column - low) / (high - low) if high > low else np.ones(len(column))
+        balance += np.where(finite, scaled, 0.0)
+    return np.lexsort((-balance, -matrix[:, 0]))
+
+
+def pareto_optimize(modules, habitat_config, starts=None, time_budget=0.25, seed=None, pool=None):
+    """Run independently seeded annealing starts on the process pool and return the ranked Pareto front
+
+    The first start refines the given layout on compliance alone. The others
+    scatter the modules before annealing and weigh the secondary objectives
+    with their own start_weights, so the front covers different trade-offs.
+    """
+    pool = pool or get_pool()
+    workers = os.cpu_count() or 1
+    starts = starts or workers
+    seed = seed if seed is not None else random.randrange(2**32)
+    started = time.perf_counter()
+    seeds = [(seed + i) % 2**32 for i in range(starts)]
+    futures = [pool.submit(run_start, modules, habitat_config, start_seed, time_budget, i > 0,
+                           start_weights(start_seed) if i > 0 else None)
+               for i, start_seed in enumerate(seeds)]
+    results = [future.result() for future in as_completed(futures)]
+    wall_ms = (time.perf_counter() - started) * 1000
+    results.sort(key=lambda result: (result["seed"] - seed) % 2**32)
+
+    matrix = objective_matrix(results)
+    candidates = front_candidates(results)
+    front = candidates[non_dominated(matrix[candidates])]
+    order = front[rank_front(matrix[front])]
+    for result in results:
+        result["dominated"] = True
+    ranked = []
+    for rank, i in enumerate(order.tolist(), start=1):
+        results[i]["dominated"] = False
+        ranked.append({"rank": rank, **{key: results[i][key] for key in
+                                        ("seed", "weights", "feasible", "objectives", "modules", "issues",
+                                         "pathViolations")}})
+
+    busy_ms = sum(result["elapsedMs"] for result in results)
+    return {
+        "front": ranked,
+        "starts": [{key: value for key, value in result.items() if key not in ("modules", "issues")}
+                   for result in results],
+        "stats": {
+            "starts": starts,
+            "workers": workers,
+            "frontSize": len(ranked),
+            "feasibleStarts": sum(result["feasible"] for result in results),
+            "wallMs": round(wall_ms, 2),
+            "busyMs": round(busy_ms, 2),
+            # Close to the worker count when starts scale linearly across cores
+            "parallelSpeedup": round(busy_ms / wall_ms, 2) if wall_ms > 0 else 0,
+        },
+    }
@@ -0,0 +1,165 @@
+import numpy as np
+
+from geometry import OrientedBoxes
+from voxels import OccupancyGrid
+
+# Longest walk allowed between module pairs the guidelines want "near" or "adjacent", meters
+NEAR_WALK_DISTANCE = 8.0
+ADJACENT_WALK_DISTANCE = 3.0
+
+# Module types that must be reachable from another type within a walking distance
+REQUIRED_ADJACENCIES = {
+    'exercise': {'hygiene': NEAR_WALK_DISTANCE},
+    'food': {'storage': ADJACENT_WALK_DISTANCE},
+}
+
+EXIT_TYPE = 'airlock'
+MIN_EXITS = 2  # "multiple emergency exits"
+
+
+class FreeSpace:
+    """Walkable voxels of a layout: inside the shell and not covered by any module
+
+    The grid is padded with one blocked voxel on every side, so a neighbour of
+    any walkable voxel is always a valid flat index and the search never has to
+    check bounds. Steps go along the grid axes, so a path length is the
+    number of steps times the voxel size.
+    """
+
+    def __init__(self, occupancy):
+        grid = occupancy.grid
+        self.grid = grid
+        self.resolution = grid.resolution
+        walkable = np.pad(grid.inside & (occupancy.counts == 0), 1)
+        self.shape = walkable.shape
+        self.walkable = walkable.ravel()
+        self.size = int(np.count_nonzero(self.walkable))
+        stride_x, stride_y = self.shape[1] * self.shape[2], self.shape[2]
+        self.offsets = np.array([stride_x, -stride_x, stride_y, -stride_y, 1, -1])
+
+    def doors(self, boxes):
+        """Flat indices of the walkable voxels touching each box, one array per box"""
+        low = np.floor((boxes.centers - boxes.extents - self.grid.origin) / self.resolution).astype(int)
+        high = np.ceil((boxes.centers + boxes.extents - self.grid.origin) / self.resolution).astype(int)
+        # One voxel of margin around the box, shifted by the padding
+        low = np.maximum(low, -1) + 1
+        high = np.minimum(high + 1, self.grid.dims) + 1
+        walkable = self.walkable.reshape(self.shape)
+        found = []
+        for box_low, box_high in zip(low.tolist(), high.tolist()):
+            if any(b <= a for a, b in zip(box_low, box_high)):
+                found.append(np.empty(0, dtype=np.intp))
+                continue
+            block = tuple(slice(a, b) for a, b in zip(box_low, box_high))
+            cells = np.nonzero(walkable[block])
+            found.append(np.ravel_multi_index(tuple(c + a for c, a in zip(cells, box_low)), self.shape))
+        return found
+
+    def distances(self, sources):
+        """Steps from the nearest source to every voxel, -1 where unreachable
+
+        A breadth-first search that expands the whole frontier with array
+        operations, so the Python loop runs once per step of the longest path.
+        """
+        steps = np.full(self.walkable.size, -1, dtype=np.int32)
+        unvisited = self.walkable.copy()
+        frontier = np.unique(sources)
+        frontier = frontier[unvisited[frontier]]
+        unvisited[frontier] = False
+        steps[frontier] = 0
+        # Scratch array that keeps one copy of each voxel reached twice in a step
+        first = np.empty(self.walkable.size, dtype=np.intp)
+        step = 0
+        while frontier.size:
+            step += 1
+            reached = (frontier[:, None] + self.offsets).ravel()
+            reached = reached[unvisited[reached]]
+            order = np.arange(reached.size)
+            first[reached] = order
+            reached = reached[first[reached] == order]
+            unvisited[reached] = False
+            steps[reached] = step
+            frontier = reached
+        return steps
+
+    def nearest(self, steps, doors):
+        """Walking distance in meters from each door set to the nearest source, inf where unreachable"""
+        found = np.full(len(doors), np.inf)
+        for i, cells in enumerate(doors):
+            reached = steps[cells]
+            reached = reached[reached >= 0]
+            if reached.size:
+                found[i] = reached.min() * self.resolution
+        return found
+
+
+def _distance(value):
+    return None if not np.isfinite(value) else round(float(value), 2)
+
+
+def path_report(modules, habitat_config, occupancy=None):
+    """Egress distances from airlocks and walking lengths of required adjacencies, as a JSON-ready dict
+
+    Pass an OccupancyGrid already holding the modules to reuse it.
+    """
+    if occupancy is None:
+        occupancy = OccupancyGrid(habitat_config, modules)
+    space = FreeSpace(occupancy)
+    doors = space.doors(OrientedBoxes.from_modules(modules))
+    types = [m.get('type') for m in modules]
+    violations = []
+
+    def module_id(i):
+        return modules[i].get('id', i)
+
+    # Egress: one search spreading from every airlock at once
+    exits = [i for i, t in enumerate(types) if t == EXIT_TYPE]
+    if len(exits) < MIN_EXITS:
+        violations.append(f"Only {len(exits)} airlock(s), at least {MIN_EXITS} emergency exits required")
+    egress = np.full(len(modules), np.inf)
+    reachable = None
+    if exits:
+        steps = space.distances(np.concatenate([doors[i] for i in exits]))
+        egress = space.nearest(steps, doors)
+        egress[exits] = 0.0
+        reachable = int(np.count_nonzero(steps >= 0))
+    crew_modules = [i for i, t in enumerate(types) if t != EXIT_TYPE]
+    if exits:
+        for i in crew_modules:
+            if not np.isfinite(egress[i]):
+                violations.append(f"{types[i]} has no walkable path to an airlock")
+    worst = max(crew_modules, key=lambda i: egress[i], default=None)
+
+    # Required adjacencies: one search per target type, read at every module of the source type
+    adjacency = []
+    for mod_type, targets in REQUIRED_ADJACENCIES.items():
+        sources = [i for i, t in enumerate(types) if t == mod_type]
+        if not sources:
+            continue
+        for target, limit in targets.items():
+            found = [i for i, t in enumerate(types) if t == target]
+            if not found:
+                violations.append(f"No {target} module for {mod_type} to reach")
+                continue
+            steps = space.distances(np.concatenate([doors[i] for i in found]))
+            walks = space.nearest(steps, [doors[i] for i in sources])
+            for i, walk in zip(sources, walks.tolist()):
+                adjacency.append({"id": module_id(i), "type": mod_type, "target": target,
+                                  "distance": _distance(walk), "maxDistance": limit})
+                if not np.isfinite(walk):
+                    violations.append(f"{mod_type} has no walkable path to {target}")
+                elif walk > limit:
+                    violations.append(f"{mod_type} is a {walk:.1f}m walk from {target} (max {limit:g}m)")
+
+    return {
+        "resolutionM": round(space.resolution, 4),
+        "walkableVolume": round(space.size * occupancy.grid.voxel_volume, 2),
+        # Free space that can be walked to from an airlock, None without airlocks
+        "reachableVolume": None if reachable is None else round(reachable * occupancy.grid.voxel_volume, 2),
+        "exits": len(exits),
+        "worstEgress": None if worst is None or not exits else {"id": module_id(worst),
+                                                                "distance": _distance(egress[worst])},
+        "egress": [{"id": module_id(i), "distance": _distance(egress[i])} for i in crew_modules] if exits else [],
+        "adjacencyPaths": adjacency,
+        "violations": violations,
+    }
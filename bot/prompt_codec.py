@@ -0,0 +1,151 @@
+import json
+import math
+import threading
+from collections import deque
+
+from guideline_index import estimate_tokens
+
+# Positions and sizes are sent to the model at this resolution, in meters
+POSITION_STEP = 0.1
+# Rotations are sent at this resolution, in radians
+ROTATION_STEP = 0.01
+
+MODULE_TABLE_HEADER = "id|type|x,y,z|w,h,d|rx,ry,rz"
+
+
+def _quantize(values, step=POSITION_STEP):
+    values = values if isinstance(values, (list, tuple)) else [0, 0, 0]
+    return ",".join(f"{round(float(v) / step) * step:g}" for v in values[:3])
+
+
+def _coordinate(value, current):
+    """A finite float from a model row, None keeps the current value; raises ValueError otherwise"""
+    if value is None:
+        value = current
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"not a coordinate: {value!r}")
+    return float(value)
+
+
+def encode_habitat(habitat_config):
+    """One-line summary of the habitat fields that matter for compliance"""
+    mission = habitat_config.get('mission', {})
+    fields = [
+        f"shape={habitat_config.get('shape', 'cylinder')}",
+        f"r={habitat_config.get('radius', 5)}",
+        f"h={habitat_config.get('height', 10)}",
+        f"vol={habitat_config.get('volume', 0)}",
+        f"crew={mission.get('crewSize', 4)}",
+    ]
+    if mission.get('destination'):
+        fields.append(f"dest={mission['destination']}")
+    if mission.get('missionDuration'):
+        fields.append(f"days={mission['missionDuration']}")
+    return " ".join(fields)
+
+
+def encode_modules(modules):
+    """Tabular module list: one pipe-separated row per module, no colors or stats
+
+    Rotations matter because modules collide as oriented boxes. The rotation
+    column is left empty for unrotated modules.
+    """
+    rows = [MODULE_TABLE_HEADER]
+    for module in modules:
+        rotation = module.get('rotation')
+        turned = isinstance(rotation, (list, tuple)) and any(rotation[:3])
+        rows.append("|".join([
+            str(module.get('id', '')),
+            str(module.get('type', '')),
+            _quantize(module.get('position')),
+            _quantize(module.get('size')),
+            _quantize(rotation, ROTATION_STEP) if turned else "",
+        ]))
+    return "\n".join(rows)
+
+
+def encode_design(design_data):
+    """Compact, schema-aware text encoding of a design for LLM prompts"""
+    habitat = encode_habitat(design_data.get('habitatConfig', {}))
+    return f"HABITAT {habitat}\nMODULES\n{encode_modules(design_data.get('modules', []))}"
+
+
+def decode_modules(rows, original_modules):
+    """Map compact [id, x, y, z] rows from the model back to full module dicts
+
+    A null coordinate keeps the module's current one. Modules keep their
+    rotation, since the model only moves them. Rows with unknown ids or
+    coordinates that are not numbers are skipped, so callers should check
+    the count.
+    """
+    by_id = {m.get('id'): m for m in original_modules}
+    modules = []
+    for row in rows if isinstance(rows, list) else []:
+        if not isinstance(row, (list, tuple)) or len(row) < 4 or not isinstance(row[0], (str, int)) or row[0] not in by_id:
+            continue
+        module = dict(by_id[row[0]])
+        current = module.get('position')
+        current = list(current)[:3] if isinstance(current, (list, tuple)) else []
+        current += [0.0] * (3 - len(current))
+        try:
+            module['position'] = [_coordinate(v, c) for v, c in zip(row[1:4], current)]
+        except ValueError:
+            continue
+        modules.append(module)
+    return modules
+
+
+def expand_optimization_result(result, original_modules, habitat_config):
+    """Turn a compact optimization reply into the optimizedLayout shape the frontend expects"""
+    if "optimizedLayout" in result or "modules" not in result:
+        return result
+    result["optimizedLayout"] = {
+        "habitatConfig": habitat_config,
+        "modules": decode_modules(result.pop("modules"), original_modules),
+        "changes": result.pop("changes", []),
+        "reasoning": result.pop("reasoning", "")
+    }
+    return result
+
+
+def response_usage(response, prompt, text):
+    """Prompt and response token counts, from the API when reported, else estimated"""
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+    response_tokens = getattr(usage, 'candidates_token_count', None)
+    return {
+        "promptTokens": prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt),
+        "responseTokens": response_tokens if response_tokens is not None else estimate_tokens(text or ""),
+        "estimated": prompt_tokens is None
+    }
+
+
+class TokenLedger:
+    """Per-request prompt/response token records plus running totals"""
+
+    def __init__(self, history=100):
+        self.records = deque(maxlen=history)
+        self.totals = {"requests": 0, "promptTokens": 0, "responseTokens": 0, "baselineTokens": 0}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, usage, baseline_prompt=None):
+        """Store one request's usage; baseline_prompt is the uncompressed prompt it replaces"""
+        entry = {"endpoint": endpoint, **usage}
+        if baseline_prompt is not None:
+            entry["baselineTokens"] = estimate_tokens(baseline_prompt)
+        with self.lock:
+            self.records.append(entry)
+            self.totals["requests"] += 1
+            self.totals["promptTokens"] += entry["promptTokens"]
+            self.totals["responseTokens"] += entry["responseTokens"]
+            self.totals["baselineTokens"] += entry.get("baselineTokens", entry["promptTokens"])
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return {**self.totals, "recent": list(self.records)[-10:]}
+
+
+def legacy_design_json(design_data):
+    """The pretty-printed JSON the prompts used to embed, kept for savings accounting"""
+    return json.dumps(design_data, indent=2)
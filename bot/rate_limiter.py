@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class TokenBucket:
+    """Token bucket refilled at a fixed rate, not thread-safe on its own"""
+
+    def __init__(self, interval, capacity=1, clock=time.monotonic):
+        self.interval = interval
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def _refill(self, now):
+        if self.interval <= 0:
+            self.tokens = float(self.capacity)
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.interval
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class SlidingWindowQuota:
+    """At most `limit` events in any trailing `window` seconds, not thread-safe on its own"""
+
+    def __init__(self, limit, window=3600, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.events = deque()
+
+    def _expire(self, now):
+        while self.events and self.events[0] <= now - self.window:
+            self.events.popleft()
+
+    def remaining(self, now):
+        self._expire(now)
+        return max(0, self.limit - len(self.events))
+
+    def wait_time(self, now):
+        """Seconds until the oldest event leaves the window, 0 if there is room"""
+        if self.remaining(now) > 0:
+            return 0.0
+        return self.events[0] + self.window - now
+
+    def take(self, now):
+        self.events.append(now)
+
+
+class RateLimiter:
+    """Non-blocking API limiter: global token bucket, hourly quota and optional per-client buckets
+
+    try_acquire never sleeps. It either consumes a slot from every bucket or
+    reports how long the caller would have to wait, so the caller can pick
+    the fallback path straight away.
+    """
+
+    def __init__(self, min_interval, max_per_hour, client_interval=0, max_clients=1024, clock=time.monotonic):
+        self.clock = clock
+        self.bucket = TokenBucket(min_interval, clock=clock)
+        self.quota = SlidingWindowQuota(max_per_hour, window=3600, clock=clock)
+        self.client_interval = client_interval
+        self.max_clients = max_clients
+        self.client_buckets = OrderedDict()
+        self.granted = 0
+        self.denied = 0
+        self.lock = threading.Lock()
+
+    def _client_bucket(self, client):
+        bucket = self.client_buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(self.client_interval, clock=self.clock)
+            self.client_buckets[client] = bucket
+            if len(self.client_buckets) > self.max_clients:
+                self.client_buckets.popitem(last=False)
+        else:
+            self.client_buckets.move_to_end(client)
+        return bucket
+
+    def try_acquire(self, client=None):
+        """Return (allowed, wait_seconds); wait is 0 when allowed"""
+        with self.lock:
+            now = self.clock()
+            buckets = [self.bucket, self.quota]
+            if client is not None and self.client_interval > 0:
+                buckets.append(self._client_bucket(client))
+            wait = max(b.wait_time(now) for b in buckets)
+            if wait > 0:
+                self.denied += 1
+                return False, wait
+            for b in buckets:
+                b.take(now)
+            self.granted += 1
+            return True, 0.0
+
+    def wait_time(self, client=None):
+        """Seconds until try_acquire would succeed, without taking a slot or counting a denial"""
+        with self.lock:
+            now = self.clock()
+            buckets = [self.bucket, self.quota]
+            if client is not None and self.client_interval > 0 and client in self.client_buckets:
+                buckets.append(self.client_buckets[client])
+            return max(b.wait_time(now) for b in buckets)
+
+    def status(self):
+        with self.lock:
+            now = self.clock()
+            return {
+                "remaining_calls": self.quota.remaining(now),
+                "next_call_in_seconds": max(self.bucket.wait_time(now), self.quota.wait_time(now)),
+                "granted": self.granted,
+                "denied": self.denied
+            }
@@ -0,0 +1,532 @@
+import math
+import threading
+from collections import Counter
+
+import numpy as np
+
+from geometry import OrientedBoxes, bounding_radius, box_gaps, find_collisions
+from spatial_index import SpatialHashGrid, neighbor_pairs
+from voxels import OccupancyGrid
+from pathing import path_report
+
+# Modules every NASA-compliant habitat must contain
+ESSENTIAL_MODULES = ['sleep', 'food', 'hygiene', 'life-support']
+
+# Module types that must not be placed next to each other
+FORBIDDEN_ADJACENCIES = {
+    'sleep': ['exercise', 'maintenance', 'life-support'],
+    'food': ['hygiene', 'medical', 'exercise'],
+    'medical': ['food', 'exercise', 'maintenance'],
+    'exercise': ['sleep', 'medical', 'food']
+}
+
+MIN_ADJACENCY_DISTANCE = 4  # meters between forbidden neighbours
+MIN_VOLUME_PER_CREW = 25    # NASA minimum, m³
+
+VOLUME_PENALTY = 30
+MISSING_ESSENTIAL_PENALTY = 20
+SLEEP_SHORTAGE_PENALTY = 15
+ADJACENCY_PENALTY = 5
+COLLISION_PENALTY = 5     # per pair of interpenetrating module boxes
+
+# Upper bound on pair distances computed at once, keeps memory flat on big stations
+PAIR_BLOCK_SIZE = 1 << 21
+# Above this many candidate pairs, adjacency checks go through the spatial grid
+GRID_PAIR_THRESHOLD = 1 << 18
+
+
+def layout_positions(modules):
+    """Stack module positions into an (n, 3) float array"""
+    positions = np.zeros((len(modules), 3), dtype=float)
+    for i, module in enumerate(modules):
+        position = module.get('position', [0, 0, 0])
+        positions[i, :len(position[:3])] = position[:3]
+    return positions
+
+
+def adjacency_positions(modules):
+    """Like layout_positions, but missing coordinates are NaN instead of 0
+
+    Adjacency distances only compare the coordinates both modules have, the
+    way the original zip over the two position lists did.
+    """
+    positions = np.full((len(modules), 3), np.nan)
+    for i, module in enumerate(modules):
+        position = module.get('position', [0, 0, 0])
+        positions[i, :len(position[:3])] = position[:3]
+    return positions
+
+
+def pair_distances(diff):
+    """Euclidean lengths of the last axis of diff, skipping NaN coordinates"""
+    if np.isnan(diff).any():
+        diff = np.nan_to_num(diff)
+    return np.sqrt(np.einsum('...k,...k->...', diff, diff))
+
+
+def encode_types(modules):
+    """Map module types to integer codes, returns (type_names, codes)"""
+    type_names = []
+    lookup = {}
+    codes = np.empty(len(modules), dtype=np.intp)
+    for i, module in enumerate(modules):
+        mod_type = module.get('type')
+        if mod_type not in lookup:
+            lookup[mod_type] = len(type_names)
+            type_names.append(mod_type)
+        codes[i] = lookup[mod_type]
+    return type_names, codes
+
+
+def forbidden_mask(type_names):
+    """Build the (T, T) mask of type pairs that must not be adjacent"""
+    index = {name: i for i, name in enumerate(type_names)}
+    mask = np.zeros((len(type_names), len(type_names)), dtype=bool)
+    for mod_type, forbidden in FORBIDDEN_ADJACENCIES.items():
+        if mod_type not in index:
+            continue
+        for other in forbidden:
+            if other in index:
+                mask[index[mod_type], index[other]] = True
+    return mask
+
+
+def volume_issue(volume_per_crew):
+    """Issue text for a habitat short on free volume, or None if there is enough"""
+    if volume_per_crew < MIN_VOLUME_PER_CREW:
+        return f"Insufficient free volume per crew: {volume_per_crew:.1f}m³ < 25m³"
+    return None
+
+
+def base_score(modules, habitat_config, occupancy=None):
+    """Score the layout-wide terms: free volume per crew, essentials and sleep count
+
+    Free volume is measured on the voxel grid at the modules' own positions;
+    pass an OccupancyGrid already holding the modules to reuse it.
+    """
+    score = 100
+    issues = []
+
+    # Check crew volume requirements against the shell volume the modules leave free
+    crew_size = habitat_config.get('mission', {}).get('crewSize', 4)
+    if occupancy is None:
+        occupancy = OccupancyGrid(habitat_config, modules)
+    issue = volume_issue(occupancy.free_volume_per_crew())
+    if issue:
+        score -= VOLUME_PENALTY
+        issues.append(issue)
+
+    # Check essential modules
+    module_types = set(m.get('type') for m in modules)
+    for essential in ESSENTIAL_MODULES:
+        if essential not in module_types:
+            score -= MISSING_ESSENTIAL_PENALTY
+            issues.append(f"Missing essential module: {essential}")
+
+    # Check sleep quarters count
+    sleep_count = sum(1 for m in modules if m.get('type') == 'sleep')
+    if sleep_count < crew_size:
+        score -= SLEEP_SHORTAGE_PENALTY
+        issues.append(f"Insufficient sleep quarters: {sleep_count} < {crew_size}")
+
+    return score, issues
+
+
+class LayoutScorer:
+    """Vectorized compliance scorer for one module list at any number of positions"""
+
+    def __init__(self, modules, habitat_config):
+        self.modules = modules
+        self.habitat_config = habitat_config
+        self.boxes = OrientedBoxes.from_modules(modules)
+        self.occupancy = OccupancyGrid(habitat_config, modules, boxes=self.boxes)
+        self.base, self.base_issues = base_score(modules, habitat_config, self.occupancy)
+        self.type_names, self.codes = encode_types(modules)
+
+        mask = forbidden_mask(self.type_names)
+        # Only modules with a forbidden rule (rows) or targeted by one (cols) matter
+        self.rows = np.flatnonzero(mask.any(axis=1)[self.codes])
+        self.cols = np.flatnonzero(mask.any(axis=0)[self.codes])
+        self.pair_mask = mask[self.codes[self.rows]][:, self.codes[self.cols]]
+
+    def _blocks(self, batch=1):
+        """Yield row slices sized so each distance block stays under PAIR_BLOCK_SIZE"""
+        step = max(1, PAIR_BLOCK_SIZE // max(1, batch * len(self.cols)))
+        for start in range(0, len(self.rows), step):
+            yield slice(start, start + step)
+
+    def violations(self, positions):
+        """Return (i, j) index arrays of forbidden pairs closer than the minimum
+
+        NaN coordinates, as from adjacency_positions, are left out of the distance.
+        """
+        found_i, found_j = [], []
+        if len(self.rows) == 0 or len(self.cols) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        if len(self.rows) * len(self.cols) > GRID_PAIR_THRESHOLD:
+            return self._grid_violations(positions)
+        targets = positions[self.cols]
+        for block in self._blocks():
+            distance = pair_distances(positions[self.rows[block], None, :] - targets[None, :, :])
+            hits = self.pair_mask[block] & (distance < MIN_ADJACENCY_DISTANCE)
+            block_i, block_j = np.nonzero(hits)
+            found_i.append(self.rows[block][block_i])
+            found_j.append(self.cols[block_j])
+        return np.concatenate(found_i), np.concatenate(found_j)
+
+    def _grid_violations(self, positions):
+        """Sparse path for large layouts: only test pairs sharing neighbouring grid cells
+
+        Modules with missing coordinates have no place in the grid, so their
+        pairs are checked directly against every candidate.
+        """
+        partial = np.isnan(positions).any(axis=1)
+        row_partial, col_partial = partial[self.rows], partial[self.cols]
+        full = np.nan_to_num(positions)
+        near_i, near_j = neighbor_pairs(full[self.rows], full[self.cols], MIN_ADJACENCY_DISTANCE)
+        allowed = self.pair_mask[near_i, near_j] & ~row_partial[near_i] & ~col_partial[near_j]
+        near_i, near_j = near_i[allowed], near_j[allowed]
+        if row_partial.any() or col_partial.any():
+            extra_i, extra_j = np.nonzero(self.pair_mask & (row_partial[:, None] | col_partial[None, :]))
+            near_i, near_j = np.concatenate([near_i, extra_i]), np.concatenate([near_j, extra_j])
+            order = np.lexsort((near_j, near_i))
+            near_i, near_j = near_i[order], near_j[order]
+        close = pair_distances(positions[self.rows[near_i]] - positions[self.cols[near_j]]) < MIN_ADJACENCY_DISTANCE
+        return self.rows[near_i[close]], self.cols[near_j[close]]
+
+    def collisions(self, positions):
+        """Return (i, j) index arrays of overlapping module boxes"""
+        pair_i, pair_j, _ = find_collisions(self.boxes, centers=positions)
+        return pair_i, pair_j
+
+    def score(self, positions=None):
+        """Score one layout, returns (score, issues) like calculate_compliance_score
+
+        Without positions, the modules' own positions are used. Boxes are then
+        placed with missing coordinates at 0, while adjacency only compares the
+        coordinates a pair both has.
+        """
+        if positions is None:
+            pair_i, pair_j = self.violations(adjacency_positions(self.modules))
+            positions = layout_positions(self.modules)
+        else:
+            pair_i, pair_j = self.violations(positions)
+        issues = list(self.base_issues)
+        names = self.type_names
+        issues.extend(f"{names[self.codes[i]]} too close to {names[self.codes[j]]}"
+                      for i, j in zip(pair_i.tolist(), pair_j.tolist()))
+        hit_i, hit_j = self.collisions(positions)
+        issues.extend(f"{names[self.codes[i]]} overlaps {names[self.codes[j]]}"
+                      for i, j in zip(hit_i.tolist(), hit_j.tolist()))
+        penalty = ADJACENCY_PENALTY * len(pair_i) + COLLISION_PENALTY * len(hit_i)
+        return max(0, self.base - penalty), issues
+
+    def score_batch(self, positions):
+        """Score a stacked (B, n, 3) batch of layouts, returns a (B,) int array"""
+        positions = np.asarray(positions, dtype=float)
+        counts = np.zeros(positions.shape[0], dtype=np.int64)
+        if len(self.rows) and len(self.cols):
+            targets = positions[:, self.cols]
+            for block in self._blocks(batch=positions.shape[0]):
+                diff = positions[:, self.rows[block], None, :] - targets[:, None, :, :]
+                distance = np.sqrt(np.einsum('bijk,bijk->bij', diff, diff))
+                hits = self.pair_mask[block] & (distance < MIN_ADJACENCY_DISTANCE)
+                counts += hits.sum(axis=(1, 2))
+        penalties = ADJACENCY_PENALTY * counts
+        for b, layout in enumerate(positions):
+            hit_i, _ = self.collisions(layout)
+            penalties[b] += COLLISION_PENALTY * len(hit_i)
+        return np.maximum(0, self.base - penalties)
+
+
+def calculate_compliance_score(modules, habitat_config):
+    """Calculate NASA compliance score for a layout"""
+    return LayoutScorer(modules, habitat_config).score()
+
+
+def fallback_validation(design_data):
+    """Fallback validation when AI is unavailable due to quota limits
+
+    The walking-path report costs far more than scoring, so it is only added
+    when the design asks for it with "paths": true.
+    """
+    modules = design_data.get('modules', [])
+    habitat_config = design_data.get('habitatConfig', {})
+
+    # Use the existing compliance calculation
+    scorer = LayoutScorer(modules, habitat_config)
+    score, issues = scorer.score()
+    volume = scorer.occupancy.stats()
+    safety = f"Safety score: {score}%"
+    paths = None
+    if design_data.get('paths') is True:
+        paths = path_report(modules, habitat_config, scorer.occupancy)
+        worst = paths["worstEgress"]
+        egress = "no airlock to egress from" if worst is None else f"worst egress walk {worst['distance']}m"
+        safety = f"{safety}, {egress}, {len(paths['violations'])} path issue(s)"
+
+    # Generate recommendations based on issues
+    recommendations = []
+    if score < 85:
+        recommendations.append("Consider adding missing essential modules")
+        recommendations.append("Optimize module positioning for better adjacency")
+        recommendations.append("Ensure adequate volume per crew member")
+    else:
+        recommendations.append("Design meets basic NASA requirements")
+
+    result = {
+        "validation": {
+            "overallScore": score,
+            "compliance": "compliant" if score >= 85 else "warning" if score >= 70 else "critical",
+            "issues": issues,
+            "recommendations": recommendations
+        },
+        "analysis": {
+            "volumeAnalysis": (f"Analyzed {len(modules)} modules for compliance: "
+                               f"{volume['usedVolume']}m³ used, {volume['freeVolume']}m³ free "
+                               f"({volume['freeVolumePerCrew']}m³ per crew), {volume['overlapVolume']}m³ overlapping"),
+            "zoningAnalysis": "Basic zoning analysis completed",
+            "adjacencyAnalysis": "Adjacency rules checked",
+            "safetyAnalysis": safety
+        }
+    }
+    if paths is not None:
+        result["paths"] = paths
+    return result
+
+
+def score_layout_batch(modules, habitat_config, positions):
+    """Score many position sets for the same modules in a single call"""
+    return LayoutScorer(modules, habitat_config).score_batch(positions)
+
+
+def _is_vector(value, lengths=(3,)):
+    return (isinstance(value, (list, tuple)) and len(value) in lengths and
+            all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in value))
+
+
+def check_edit(op, module):
+    """Raise ValueError unless module is a valid edit for op
+
+    Edits name their module by a string or integer id, except adds, which may
+    leave it out. Size and rotation, when given, are 3 finite numbers, and
+    positions up to 3, as short positions are scored on the axes they have.
+    """
+    if op not in ('add', 'move', 'remove'):
+        raise ValueError(f"Unknown edit operation: {op}")
+    if not isinstance(module, dict):
+        raise ValueError("module must be an object")
+    module_id = module.get('id')
+    if module_id is None and op != 'add' or module_id is not None and (
+            isinstance(module_id, bool) or not isinstance(module_id, (str, int))):
+        raise ValueError(f"{op} needs a string or integer module id")
+    if 'position' in module and not _is_vector(module['position'], lengths=(0, 1, 2, 3)):
+        raise ValueError("position must be up to 3 numbers")
+    for field in ('size', 'rotation'):
+        if field in module and not _is_vector(module[field]):
+            raise ValueError(f"{field} must be 3 numbers")
+
+
+def module_coords(module):
+    """Module position as a tuple of its own coordinates, at most 3, unpadded"""
+    return tuple(float(c) for c in module.get('position', [0, 0, 0])[:3])
+
+
+def module_point(module):
+    """Module position as a 3-tuple, padded the same way as layout_positions"""
+    coords = module_coords(module)
+    return coords + (0.0,) * (3 - len(coords))
+
+
+def adjacency_distance(a, b):
+    """Distance over the coordinates both positions have, like adjacency_positions"""
+    return math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)))
+
+
+class ScoreState:
+    """Incrementally maintained compliance score for single-module edits
+
+    Keeps per-type counts, the set of violating (i, j) pairs, the set of
+    overlapping box pairs and a voxel occupancy grid, with modules held in a
+    spatial grid. Adding, moving or removing one module only touches the k
+    modules within MIN_ADJACENCY_DISTANCE of it (or within reach of its box),
+    and score() always equals calculate_compliance_score on the current module list.
+    Modules with fewer than 3 coordinates are checked for adjacency against
+    every module, since their distances ignore the missing axes.
+    Not thread-safe on its own: hold lock around apply() and score().
+    """
+
+    def __init__(self, modules, habitat_config):
+        self.lock = threading.Lock()
+        self.habitat_config = habitat_config
+        self.crew_size = habitat_config.get('mission', {}).get('crewSize', 4)
+        self.slots = {}
+        self.slot_by_id = {}
+        self.type_counts = Counter()
+        self.pairs = set()
+        self.collisions = set()
+        self.partners = {}
+        self.coords = {}
+        # Slots whose position has fewer than 3 coordinates
+        self.partial = set()
+        self.boxes = {}
+        self.reach = {}
+        # Largest bounding radius seen, so a grid query always reaches every box that could touch
+        self.max_reach = max((bounding_radius(m) for m in modules), default=0.0)
+        self.occupancy = OccupancyGrid(habitat_config)
+        self.next_slot = 0
+        # Cells wide enough that both the adjacency and the box queries stay within one ring of cells
+        self.grid = SpatialHashGrid(max(MIN_ADJACENCY_DISTANCE, 2 * self.max_reach))
+        for module in modules:
+            self._insert(self.next_slot, module)
+            self.next_slot += 1
+
+    @property
+    def modules(self):
+        """Current module list, in the order a full rescore would see it"""
+        return [self.slots[slot] for slot in sorted(self.slots)]
+
+    def _insert(self, slot, module):
+        module_id = module.get('id')
+        if module_id is not None:
+            self.slot_by_id[module_id] = slot
+        self.slots[slot] = module
+        self.type_counts[module.get('type')] += 1
+        point = module_point(module)
+        mod_type = module.get('type')
+        forbidden = FORBIDDEN_ADJACENCIES.get(mod_type, [])
+        reach = bounding_radius(module)
+        self.max_reach = max(self.max_reach, reach)
+        coords = module_coords(module)
+        near = self.grid.query_radius(point, max(MIN_ADJACENCY_DISTANCE, reach + self.max_reach))
+        touching = [other for other in near if math.dist(point, self.grid.points[other]) < reach + self.reach[other]]
+        for other in self._adjacency_candidates(slot, coords, near):
+            if adjacency_distance(coords, self.coords[other]) >= MIN_ADJACENCY_DISTANCE:
+                continue
+            other_type = self.slots[other].get('type')
+            if other_type in forbidden:
+                self.pairs.add((slot, other))
+            if mod_type in FORBIDDEN_ADJACENCIES.get(other_type, []):
+                self.pairs.add((other, slot))
+        self._insert_box(slot, module, reach, touching)
+        self.occupancy.place(slot, module, self.boxes[slot])
+        self.grid.insert(slot, point)
+        self.coords[slot] = coords
+        if len(coords) < 3:
+            self.partial.add(slot)
+        return slot
+
+    def _adjacency_candidates(self, slot, coords, near):
+        """Slots that may be within MIN_ADJACENCY_DISTANCE of a module at coords
+
+        near must hold every full-position slot within that distance of it.
+        """
+        if len(coords) < 3:
+            return [other for other in self.coords if other != slot]
+        return set(near) | (self.partial - {slot})
+
+    def _stack(self, slots):
+        """One OrientedBoxes holding the boxes of the given slots, in order"""
+        boxes = [self.boxes[slot] for slot in slots]
+        return OrientedBoxes(np.concatenate([b.centers for b in boxes]), np.concatenate([b.half_sizes for b in boxes]),
+                             np.concatenate([b.axes for b in boxes]))
+
+    def _insert_box(self, slot, module, reach, touching):
+        box = OrientedBoxes.from_modules([module])
+        self.boxes[slot] = box
+        self.reach[slot] = reach
+        self.partners[slot] = set()
+        # Each pair is measured in list order, the same way a full rescore does
+        for group, first in (([o for o in touching if o < slot], True), ([o for o in touching if o > slot], False)):
+            if not group:
+                continue
+            others = self._stack(group)
+            index, mine = np.arange(len(group)), np.zeros(len(group), dtype=np.intp)
+            centers = np.broadcast_to(box.centers[0], (len(group), 3))
+            if first:
+                gaps = box_gaps(others, index, others.centers, box, mine, centers)
+            else:
+                gaps = box_gaps(box, mine, centers, others, index, others.centers)
+            for other in np.asarray(group)[gaps < 0].tolist():
+                self.collisions.add((min(slot, other), max(slot, other)))
+                self.partners[slot].add(other)
+                self.partners[other].add(slot)
+
+    def _discard(self, slot):
+        module = self.slots.pop(slot)
+        if self.slot_by_id.get(module.get('id')) == slot:
+            del self.slot_by_id[module.get('id')]
+        self.type_counts[module.get('type')] -= 1
+        self.grid.remove(slot)
+        coords = self.coords.pop(slot)
+        self.partial.discard(slot)
+        near = self.grid.query_radius(module_point(module), MIN_ADJACENCY_DISTANCE)
+        for other in self._adjacency_candidates(slot, coords, near):
+            self.pairs.discard((slot, other))
+            self.pairs.discard((other, slot))
+        del self.boxes[slot]
+        del self.reach[slot]
+        self.occupancy.remove(slot)
+        for other in self.partners.pop(slot):
+            self.collisions.discard((min(slot, other), max(slot, other)))
+            self.partners[other].discard(slot)
+        return module
+
+    def _slot_for(self, module_id):
+        if module_id not in self.slot_by_id:
+            raise KeyError(f"Unknown module id: {module_id}")
+        return self.slot_by_id[module_id]
+
+    def add(self, module):
+        """Append a module, as if it were added to the end of the module list"""
+        if module.get('id') is not None and module.get('id') in self.slot_by_id:
+            raise ValueError(f"Duplicate module id: {module.get('id')}")
+        self._insert(self.next_slot, module)
+        self.next_slot += 1
+
+    def move(self, module):
+        """Replace the module with the same id, keeping its place in the list"""
+        slot = self._slot_for(module.get('id'))
+        previous = self._discard(slot)
+        self._insert(slot, {**previous, **module})
+
+    def remove(self, module_id):
+        """Drop the module with the given id"""
+        self._discard(self._slot_for(module_id))
+
+    def apply(self, op, module):
+        """Apply one edit: op is 'add', 'move' or 'remove'"""
+        check_edit(op, module)
+        if op == 'add':
+            self.add(module)
+        elif op == 'move':
+            self.move(module)
+        else:
+            self.remove(module.get('id'))
+
+    def score(self):
+        """Return (score, issues) exactly as calculate_compliance_score would"""
+        score = 100
+        issues = []
+
+        issue = volume_issue(self.occupancy.free_volume_per_crew())
+        if issue:
+            score -= VOLUME_PENALTY
+            issues.append(issue)
+
+        for essential in ESSENTIAL_MODULES:
+            if self.type_counts[essential] <= 0:
+                score -= MISSING_ESSENTIAL_PENALTY
+                issues.append(f"Missing essential module: {essential}")
+
+        sleep_count = self.type_counts['sleep']
+        if sleep_count < self.crew_size:
+            score -= SLEEP_SHORTAGE_PENALTY
+            issues.append(f"Insufficient sleep quarters: {sleep_count} < {self.crew_size}")
+
+        for i, j in sorted(self.pairs):
+            issues.append(f"{self.slots[i].get('type')} too close to {self.slots[j].get('type')}")
+        for i, j in sorted(self.collisions):
+            issues.append(f"{self.slots[i].get('type')} overlaps {self.slots[j].get('type')}")
+        penalty = ADJACENCY_PENALTY * len(self.pairs) + COLLISION_PENALTY * len(self.collisions)
+        return max(0, score - penalty), issues
@@ -0,0 +1,115 @@
+import math
+from itertools import product
+
+import numpy as np
+
+
+class SpatialHashGrid:
+    """Uniform hash grid over 3D points for insert and radius queries"""
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.points = {}
+
+    @classmethod
+    def for_habitat(cls, radius, height, min_distance):
+        """Size cells to the query distance, capped so a small shell is not one cell"""
+        extent = max(2 * radius, height, min_distance)
+        return cls(min(min_distance, extent / 2))
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, key):
+        return key in self.points
+
+    def _cell(self, point):
+        size = self.cell_size
+        return (math.floor(point[0] / size), math.floor(point[1] / size), math.floor(point[2] / size))
+
+    def insert(self, key, point):
+        """Add or move a point under the given key"""
+        if key in self.points:
+            self.remove(key)
+        point = (float(point[0]), float(point[1]), float(point[2]))
+        self.points[key] = point
+        self.cells.setdefault(self._cell(point), []).append(key)
+
+    def remove(self, key):
+        """Drop a point, ignoring unknown keys"""
+        point = self.points.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(point)
+        bucket = self.cells[cell]
+        bucket.remove(key)
+        if not bucket:
+            del self.cells[cell]
+
+    def _candidates(self, point, radius):
+        reach = int(math.ceil(radius / self.cell_size))
+        cx, cy, cz = self._cell(point)
+        for dx, dy, dz in product(range(-reach, reach + 1), repeat=3):
+            bucket = self.cells.get((cx + dx, cy + dy, cz + dz))
+            if bucket:
+                yield from bucket
+
+    def query_radius(self, point, radius):
+        """Return keys of points strictly closer than radius to point"""
+        found = []
+        for key in self._candidates(point, radius):
+            other = self.points[key]
+            distance = math.sqrt((point[0] - other[0])**2 + (point[1] - other[1])**2 + (point[2] - other[2])**2)
+            if distance < radius:
+                found.append(key)
+        return found
+
+
+def neighbor_pairs(points_a, points_b, radius):
+    """Vectorized grid join: (i, j) index arrays for points_a[i] within a cell reach of points_b[j]
+
+    Candidates are a superset of the pairs closer than radius; callers apply the
+    exact distance test. Pairs come back sorted by (i, j).
+    """
+    points_a = np.asarray(points_a, dtype=float).reshape(-1, 3)
+    points_b = np.asarray(points_b, dtype=float).reshape(-1, 3)
+    empty = np.empty(0, dtype=np.intp)
+    if len(points_a) == 0 or len(points_b) == 0:
+        return empty, empty
+
+    cells_a = np.floor(points_a / radius).astype(np.int64)
+    cells_b = np.floor(points_b / radius).astype(np.int64)
+    low = np.minimum(cells_a.min(axis=0), cells_b.min(axis=0)) - 1
+    span = np.maximum(cells_a.max(axis=0), cells_b.max(axis=0)) - low + 2
+
+    def cell_keys(cells):
+        shifted = cells - low
+        return (shifted[:, 0] * span[1] + shifted[:, 1]) * span[2] + shifted[:, 2]
+
+    keys_b = cell_keys(cells_b)
+    order_b = np.argsort(keys_b, kind='stable')
+    sorted_keys_b = keys_b[order_b]
+
+    found_i, found_j = [], []
+    for offset in product((-1, 0, 1), repeat=3):
+        keys = cell_keys(cells_a + np.array(offset))
+        start = np.searchsorted(sorted_keys_b, keys, side='left')
+        stop = np.searchsorted(sorted_keys_b, keys, side='right')
+        counts = stop - start
+        if not counts.any():
+            continue
+        pair_i = np.repeat(np.arange(len(points_a)), counts)
+        # Position of each pair inside its run of matching b points
+        run_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        found_i.append(pair_i)
+        found_j.append(order_b[np.repeat(start, counts) + run_offsets])
+
+    if not found_i:
+        return empty, empty
+    pair_i = np.concatenate(found_i)
+    pair_j = np.concatenate(found_j)
+    order = np.lexsort((pair_j, pair_i))
+    return pair_i[order], pair_j[order]
@@ -0,0 +1,116 @@
+import json
+import math
+import os
+import sys
+import time
+import types
+
+import pytest
+
+# The bot modules import each other by bare name, as when run from bot/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# What the stubbed Gemini answers unless a test sets genai.reply
+STUB_REPLY = json.dumps({
+    "validation": {"overallScore": 80, "compliance": "warning", "issues": [], "recommendations": []},
+    "analysis": {"volumeAnalysis": "", "zoningAnalysis": "", "adjacencyAnalysis": "", "safetyAnalysis": ""}
+})
+
+# Types with forbidden adjacency rules between them, plus a few without any
+MODULE_TYPES = ['sleep', 'food', 'hygiene', 'medical', 'exercise', 'life-support', 'storage', 'maintenance', 'airlock']
+
+
+def make_module(rng, i, spread=5.0, sizes=(0.5, 4.0), sized=0.7, turned=0.5, any_angle=False, short=0.0):
+    """Random module dict with id m{i}
+
+    sized and turned are the chances of a size and a rotation. Rotations are a
+    yaw from a few fixed angles, or any XYZ angles with any_angle. short is the
+    chance of a position with fewer than 3 coordinates, or none at all.
+    """
+    module = {'id': f'm{i}', 'type': rng.choice(MODULE_TYPES)}
+    coords = 3 if rng.random() >= short else rng.randint(-1, 2)
+    if coords >= 0:
+        module['position'] = [rng.uniform(-spread, spread) for _ in range(coords)]
+    if rng.random() < sized:
+        module['size'] = [rng.uniform(*sizes) for _ in range(3)]
+    if rng.random() < turned:
+        if any_angle:
+            module['rotation'] = [rng.uniform(-math.pi, math.pi) for _ in range(3)]
+        else:
+            module['rotation'] = [0, rng.choice([0, 0.3, math.pi / 2]), 0]
+    return module
+
+
+@pytest.fixture
+def random_module():
+    return make_module
+
+
+@pytest.fixture
+def random_layout():
+    def layout(rng, count, **kwargs):
+        return [make_module(rng, i, **kwargs) for i in range(count)]
+    return layout
+
+
+def make_genai_stub(reply=STUB_REPLY, failing=(), latency=0.0):
+    """Fake google.generativeai module
+
+    Every GenerativeModel answers with genai.reply after latency seconds, except
+    the model names in genai.failing, which raise. Calls are recorded in
+    genai.calls as (model name, prompt) pairs.
+    """
+    genai = types.ModuleType('google.generativeai')
+    genai.reply = reply
+    genai.failing = set(failing)
+    genai.calls = []
+
+    class Response:
+        def __init__(self, text):
+            self.text = text
+
+    class GenerativeModel:
+        def __init__(self, model_name=None, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, prompt, stream=False, **kwargs):
+            genai.calls.append((self.model_name, prompt))
+            time.sleep(latency)
+            if self.model_name in genai.failing:
+                raise RuntimeError(f"model {self.model_name} is unavailable")
+            if stream:
+                return iter([Response(genai.reply)])
+            return Response(genai.reply)
+
+    genai.GenerativeModel = GenerativeModel
+    genai.configure = lambda **kwargs: None
+    genai.list_models = lambda: []
+    return genai
+
+
+@pytest.fixture
+def genai_stub():
+    return make_genai_stub()
+
+
+@pytest.fixture(scope="session")
+def bot_main(tmp_path_factory):
+    """main imported against a stubbed genai, with its own model cache file and no rate limit"""
+    genai = make_genai_stub()
+    google = sys.modules.setdefault('google', types.ModuleType('google'))
+    google.generativeai = genai
+    sys.modules['google.generativeai'] = genai
+    import main
+    from rate_limiter import RateLimiter
+    main.model_discovery.cache_path = str(tmp_path_factory.mktemp('model') / '.model_cache.json')
+    main.api_limiter = RateLimiter(0, 10**9)
+    return main
+
+
+@pytest.fixture(scope="session")
+def sample_designs():
+    """The frontend's sample designs"""
+    from benchmarks.synthetic import load_samples
+    samples = load_samples()
+    assert samples, "no sample designs found"
+    return samples
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def asgi(bot_main):
+    import asgi
+    return asgi
+
+
+def echo_app(environ, start_response):
+    """WSGI app that answers with what it received, and sleeps on /slow"""
+    if environ["PATH_INFO"] == "/slow":
+        time.sleep(0.3)
+    if environ["PATH_INFO"] == "/stream":
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return iter([b"one\n", b"", b"two\n"])
+    body = environ["wsgi.input"].read()
+    start_response("201 Created", [("Content-Type", "application/json")])
+    return [json.dumps({"path": environ["PATH_INFO"], "body": body.decode(), "query": environ["QUERY_STRING"],
+                        "contentType": environ.get("CONTENT_TYPE"), "custom": environ.get("HTTP_X_CUSTOM")}).encode()]
+
+
+async def call(server, path, chunks=(b"",), headers=(), query=b""):
+    """Run one HTTP request through the ASGI app, returns (start message, body messages, finish time)"""
+    incoming = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0) if incoming else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "query_string": query, "headers": list(headers)}
+    await server(scope, receive, send)
+    return sent[0], sent[1:], time.perf_counter()
+
+
+def serve(asgi, ai_paths=(), **kwargs):
+    def needs_ai(environ, body):
+        if environ["PATH_INFO"] == "/broken":
+            raise RuntimeError("routing check failed")
+        return environ["PATH_INFO"] in ai_paths
+    routes = frozenset(["/slow", "/ai", "/broken", "/cached"])
+    return asgi.AsyncServer(echo_app, ai_routes=routes, needs_ai=needs_ai, on_startup=None, **kwargs)
+
+
+def test_requests_are_routed_to_their_pool(asgi):
+    server = serve(asgi, ai_paths={"/ai"})
+
+    async def run():
+        for path in ("/ai", "/cached", "/broken", "/plain"):
+            start, _, _ = await call(server, path)
+            assert start["status"] == 201
+    asyncio.run(run())
+    assert server.stats()["served"] == {"ai": 2, "request": 2}
+    assert server.stats()["llmWaiting"] == server.stats()["llmInUse"] == 0
+
+
+def test_body_headers_and_query_reach_the_app(asgi):
+    server = serve(asgi)
+    headers = [(b"content-type", b"application/json"), (b"x-custom", b"a"), (b"x-custom", b"b")]
+    start, body, _ = asyncio.run(call(server, "/plain", chunks=(b'{"a":', b' 1}'), headers=headers, query=b"x=1"))
+    assert (b"content-type", b"application/json") in start["headers"]
+    received = json.loads(b"".join(message["body"] for message in body))
+    assert received == {"path": "/plain", "body": '{"a": 1}', "query": "x=1", "contentType": "application/json",
+                        "custom": "a,b"}
+
+
+def test_streamed_responses_are_forwarded_chunk_by_chunk(asgi):
+    start, body, _ = asyncio.run(call(serve(asgi), "/stream"))
+    assert start["status"] == 200
+    assert [(message["body"], message["more_body"]) for message in body] == [
+        (b"one\n", True), (b"two\n", True), (b"", False)]
+
+
+def test_slow_ai_requests_do_not_hold_up_other_requests(asgi):
+    server = serve(asgi, ai_paths={"/slow"}, llm_concurrency=1, request_workers=4)
+
+    async def run():
+        started = time.perf_counter()
+        results = await asyncio.gather(call(server, "/slow"), call(server, "/slow"), call(server, "/plain"))
+        return [finished - started for _, _, finished in results]
+
+    slow, slower, plain = asyncio.run(run())
+    assert plain < 0.2
+    # One AI slot, so the second slow request waits for the first
+    assert max(slow, slower) >= 0.55
+
+
+def test_lifespan_runs_startup_once(asgi):
+    calls = []
+    server = asgi.AsyncServer(echo_app, on_startup=lambda: calls.append(1))
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(server({"type": "lifespan"}, receive, send))
+    assert calls == [1]
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+
+def test_expects_gemini_call_skips_cache_hits(bot_main):
+    from werkzeug.test import EnvironBuilder
+
+    def environ(path, body, query=""):
+        return EnvironBuilder(path=path, method="POST", json=body, query_string=query).get_environ()
+
+    design = {'modules': [{'id': 'a', 'type': 'sleep', 'position': [3, 1, 4]}], 'habitatConfig': {'radius': 7}}
+    bot_main.result_cache.clear()
+    raw = json.dumps(design).encode()
+    assert bot_main.expects_gemini_call(environ("/validate_habitat", design), raw)
+    bot_main.result_cache.set(bot_main.design_key("validate:", design), {"validation": {}})
+    assert not bot_main.expects_gemini_call(environ("/validate_habitat", design), raw)
+    assert not bot_main.expects_gemini_call(environ("/optimize_habitat", design), raw)
+    assert not bot_main.expects_gemini_call(environ("/validate_habitats_batch", [design]), None)
+    assert bot_main.expects_gemini_call(environ("/validate_habitats_batch", [design], "ai=2"), None)
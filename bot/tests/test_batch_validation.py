@@ -0,0 +1,106 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import batch_validation
+from batch_validation import iter_ndjson, run_batch, validate_item
+
+
+def design(i):
+    return {'id': f'd{i}', 'modules': [{'id': 'a', 'type': 'sleep', 'position': [i, 0, 0]},
+                                       {'id': 'b', 'type': 'food', 'position': [0, i, 0]}],
+            'habitatConfig': {'radius': 5, 'height': 10, 'mission': {'crewSize': 1}}}
+
+
+@pytest.fixture
+def client(bot_main, monkeypatch):
+    # Validate in process, a spawned pool would re-import main for every test run
+    monkeypatch.setattr(bot_main, 'run_batch', lambda items: (validate_item(i, p) for i, p in enumerate(items)))
+    bot_main.result_cache.clear()
+    return bot_main.app.test_client()
+
+
+def gemini_calls(bot_main):
+    return [prompt for _, prompt in bot_main.genai.calls if prompt != "test"]
+
+
+def batch(client, designs, ai):
+    response = client.post(f"/validate_habitats_batch?ai={ai}", json=designs)
+    assert response.status_code == 200
+    return sorted((json.loads(line) for line in response.get_data(as_text=True).splitlines()),
+                  key=lambda result: result["index"])
+
+
+def test_batch_enrichment_is_cached_for_validate_habitat(bot_main, client):
+    calls = len(gemini_calls(bot_main))
+    results = batch(client, [design(1), design(2), design(3)], ai=2)
+    assert [result["id"] for result in results] == ["d1", "d2", "d3"]
+    assert [result["ai"] is not None for result in results[:2]] == [True, True]
+    assert "ai" not in results[2]
+    assert len(gemini_calls(bot_main)) == calls + 2
+
+    assert client.post("/validate_habitat", json=design(1)).get_json() == results[0]["ai"]
+    assert len(gemini_calls(bot_main)) == calls + 2
+
+
+def test_batch_enrichment_reuses_validate_habitat_results(bot_main, client):
+    validated = client.post("/validate_habitat", json=design(4)).get_json()
+    calls = len(gemini_calls(bot_main))
+    results = batch(client, [design(4), design(4)], ai=2)
+    assert [result["ai"] for result in results] == [validated, validated]
+    assert len(gemini_calls(bot_main)) == calls
+
+
+def test_batch_reports_bad_lines_without_enrichment(bot_main, client):
+    response = client.post("/validate_habitats_batch?ai=2", data=b'{"modules": []}\nnot json\n',
+                           content_type="application/x-ndjson")
+    results = sorted((json.loads(line) for line in response.get_data(as_text=True).splitlines()),
+                     key=lambda result: result["index"])
+    assert "error" in results[1] and "ai" not in results[1]
+
+
+def test_run_batch_returns_every_index_once():
+    items = [json.dumps(design(i)) for i in range(23)] + ["[1, 2]", "{broken"]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(run_batch(iter(items), chunk_size=4, max_in_flight=2, pool=pool))
+    assert sorted(result["index"] for result in results) == list(range(25))
+    by_index = {result["index"]: result for result in results}
+    assert by_index[5]["id"] == "d5" and "validation" in by_index[5]
+    assert by_index[23]["error"] == "design must be a JSON object"
+    assert "error" in by_index[24]
+
+
+def test_run_batch_bounds_the_chunks_in_flight(monkeypatch):
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def chunk(start, payloads):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            return [{"index": start + offset} for offset in range(len(payloads))]
+        finally:
+            with lock:
+                active[0] -= 1
+
+    consumed = []
+
+    def items():
+        for i in range(40):
+            consumed.append(i)
+            yield design(i)
+
+    monkeypatch.setattr(batch_validation, 'validate_chunk', chunk)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = run_batch(items(), chunk_size=2, max_in_flight=3, pool=pool)
+        first = next(results)
+        # Only the chunks that fit in flight were read from the input so far
+        assert len(consumed) <= 2 * 4
+        assert len([first, *results]) == 40
+    assert peak[0] <= 3
+
+
+def test_iter_ndjson_skips_blank_lines():
+    assert list(iter_ndjson([b'{"a": 1}\n', b'  \n', b'{"b": 2}'])) == [b'{"a": 1}', b'{"b": 2}']
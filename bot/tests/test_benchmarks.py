@@ -0,0 +1,51 @@
+import json
+import math
+
+from benchmarks.run import compare, main_cli, measure
+from benchmarks.synthetic import MODULE_TYPES, DesignGenerator
+
+
+def test_generator_is_seeded_and_fills_the_habitat(sample_designs):
+    first = DesignGenerator(seed=3, samples=sample_designs).design(40)
+    assert first == DesignGenerator(seed=3, samples=sample_designs).design(40)
+    assert first != DesignGenerator(seed=4, samples=sample_designs).design(40)
+
+    config = first['habitatConfig']
+    assert len(first['modules']) == 40
+    assert len({m['id'] for m in first['modules']}) == 40
+    for module in first['modules']:
+        assert module['type'] in MODULE_TYPES
+        x, y, z = module['position']
+        assert math.hypot(x, z) <= config['radius']
+        assert abs(y) <= config['height'] / 2
+
+
+def test_measure_reports_ordered_latencies():
+    stats = measure(lambda: None, min_time=0, min_runs=5)
+    assert stats["runs"] == 5
+    assert 0 <= stats["minMs"] <= stats["medianMs"] <= stats["p95Ms"]
+
+
+def test_compare_flags_regressions(tmp_path, capsys):
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({"results": [
+        {"name": "score", "params": {"modules": 10}, "stats": {"medianMs": 1.0}},
+        {"name": "layout", "params": {"modules": 10}, "stats": {"medianMs": 2.0}},
+    ]}))
+    compare([{"name": "score", "params": {"modules": 10}, "stats": {"medianMs": 1.5}},
+             {"name": "layout", "params": {"modules": 10}, "stats": {"medianMs": 2.1}},
+             {"name": "new", "params": {}, "stats": {"medianMs": 1.0}}], str(baseline))
+    lines = capsys.readouterr().out.splitlines()
+    assert any(line.startswith("score") and "+50.0%  REGRESSION" in line for line in lines)
+    assert any(line.startswith("layout") and "+5.0%" in line and "REGRESSION" not in line for line in lines)
+    assert not any(line.startswith("new") for line in lines)
+
+
+def test_quick_run_writes_a_report(bot_main, tmp_path):
+    output = tmp_path / 'bench.json'
+    report = main_cli(['--sizes', '10', '--endpoint-sizes', '10', '--min-time', '0', '--threads', '2',
+                       '--requests', '4', '--output', str(output)])
+    assert json.loads(output.read_text()) == report
+    names = {result["name"] for result in report["results"]}
+    assert {"calculate_compliance_score", "path_report", "score_delta_move", "POST /validate_habitat (cache hit)",
+            "throughput /optimize_habitat"} <= names
@@ -0,0 +1,137 @@
+import time
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_threshold_of_one_class():
+    clock = FakeClock()
+    breaker = CircuitBreaker(thresholds={"other": 3, "quota": 1}, clock=clock)
+    breaker.record_failure("other")
+    breaker.record_failure("other")
+    assert breaker.allow()
+    breaker.record_success()
+    breaker.record_failure("other")
+    breaker.record_failure("other")
+    assert breaker.state == CLOSED
+    breaker.record_failure("other")
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.status()["shortCircuited"] == 1
+
+
+def test_quota_errors_open_for_longer():
+    clock = FakeClock()
+    breaker = CircuitBreaker(open_seconds=30, quota_open_seconds=300, clock=clock)
+    breaker.record_failure("quota")
+    assert breaker.status()["retryInSeconds"] == 300
+    clock.now += 299
+    assert breaker.is_open()
+    clock.now += 1
+    assert not breaker.is_open()
+
+
+def test_half_open_lets_one_probe_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(thresholds={"other": 1}, open_seconds=30, clock=clock)
+    breaker.record_failure("other")
+    clock.now += 30
+    assert breaker.status()["state"] == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_failed_probe_doubles_the_open_period():
+    clock = FakeClock()
+    breaker = CircuitBreaker(thresholds={"other": 1}, open_seconds=30, max_open_seconds=100, clock=clock)
+    breaker.record_failure("other")
+    for expected in (60, 100, 100):
+        clock.now += breaker.current_open_seconds
+        assert breaker.allow()
+        breaker.record_failure("other")
+        assert breaker.current_open_seconds == expected
+    assert breaker.trips == 4
+
+
+def test_released_probe_can_be_retried():
+    clock = FakeClock()
+    breaker = CircuitBreaker(thresholds={"other": 1}, open_seconds=30, clock=clock)
+    breaker.record_failure("other")
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_release_while_closed_is_harmless():
+    breaker = CircuitBreaker(clock=FakeClock())
+    breaker.release()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_attempt_without_an_outcome_gives_the_probe_back():
+    clock = FakeClock()
+    breaker = CircuitBreaker(thresholds={"other": 1}, open_seconds=30, clock=clock)
+    breaker.record_failure("other")
+    clock.now += 30
+    assert breaker.allow()
+    with breaker.attempt():
+        pass
+    assert breaker.allow()
+    try:
+        with breaker.attempt():
+            raise OSError("client went away")
+    except OSError:
+        pass
+    assert breaker.allow()
+
+
+def test_attempt_with_an_outcome_keeps_it():
+    clock = FakeClock()
+    breaker = CircuitBreaker(thresholds={"other": 1}, open_seconds=30, clock=clock)
+    breaker.record_failure("other")
+    clock.now += 30
+    assert breaker.allow()
+    with breaker.attempt() as call:
+        call.failure("other")
+    assert breaker.state == OPEN
+    clock.now += 60
+    assert breaker.allow()
+    with breaker.attempt() as call:
+        call.success()
+    assert breaker.state == CLOSED
+
+
+def test_ai_paths_release_the_probe_when_no_model_is_available(bot_main, monkeypatch):
+    clock = FakeClock()
+    breaker = CircuitBreaker(thresholds={"other": 1}, open_seconds=30, clock=clock)
+    breaker.record_failure("other")
+    clock.now += 30
+    monkeypatch.setattr(bot_main, 'gemini_breaker', breaker)
+    monkeypatch.setattr(bot_main, 'llm_sessions', None)
+
+    def unavailable():
+        raise RuntimeError("no model")
+
+    monkeypatch.setattr(bot_main, 'initialize_llm_sessions', unavailable)
+    design = {'modules': [{'id': 'a', 'type': 'sleep', 'position': [0, 0, 0]}], 'habitatConfig': {}}
+    with bot_main.app.test_request_context():
+        assert bot_main.ai_validation(design) is None
+    assert not breaker.probe_in_flight
+    with bot_main.app.test_request_context():
+        events = list(bot_main.stream_validation(design, 'key', time.monotonic() + 5))
+    assert not breaker.probe_in_flight
+    assert '"source": "fallback"' in events[-1]
@@ -0,0 +1,92 @@
+import random
+
+import numpy as np
+import pytest
+
+from geometry import OrientedBoxes, Shell, box_gaps, find_collisions, rotation_matrices, separation
+
+
+def random_boxes(random_layout, rng, count, spread):
+    """Boxes of every size, most of them turned at any angle"""
+    return OrientedBoxes.from_modules(random_layout(rng, count, spread=spread, sizes=(0.2, 4.0), sized=1,
+                                                    turned=0.7, any_angle=True))
+
+
+def all_pair_gaps(boxes):
+    i, j = np.triu_indices(len(boxes), k=1)
+    return i, j, separation(boxes.centers[i], boxes.half_sizes[i], boxes.axes[i],
+                            boxes.centers[j], boxes.half_sizes[j], boxes.axes[j])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_find_collisions_matches_all_pairs(seed, random_layout):
+    rng = random.Random(seed)
+    boxes = random_boxes(random_layout, rng, rng.randint(2, 40), rng.choice([2, 5, 10]))
+    i, j, gaps = all_pair_gaps(boxes)
+    for clearance in (0.0, 0.5):
+        hit = gaps < clearance if clearance > 0 else gaps < 0
+        found_i, found_j, found_gaps = find_collisions(boxes, clearance)
+        assert list(zip(found_i.tolist(), found_j.tolist())) == list(zip(i[hit].tolist(), j[hit].tolist()))
+        np.testing.assert_allclose(found_gaps, gaps[hit])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_separation_agrees_with_sampled_points(seed, random_layout):
+    rng = np.random.default_rng(seed)
+    boxes = random_boxes(random_layout, random.Random(seed), 30, 3)
+    i, j, gaps = all_pair_gaps(boxes)
+    # Points inside box i, expressed in box j's frame
+    local = rng.uniform(-1, 1, (len(i), 200, 3)) * boxes.half_sizes[i][:, None, :]
+    world = boxes.centers[i][:, None, :] + np.einsum('nij,nkj->nki', boxes.axes[i], local)
+    in_j = np.einsum('nji,nkj->nki', boxes.axes[j], world - boxes.centers[j][:, None, :])
+    shared = np.all(np.abs(in_j) <= boxes.half_sizes[j][:, None, :], axis=2).any(axis=1)
+    assert not np.any(shared & (gaps > 0))
+    # The pair's centres inside each other always overlap
+    centre_inside = np.all(np.abs(np.einsum('nji,nj->ni', boxes.axes[j], boxes.centers[i] - boxes.centers[j]))
+                           < boxes.half_sizes[j], axis=1)
+    assert np.all(gaps[centre_inside] < 0)
+
+
+def test_separation_is_rotation_invariant(random_layout):
+    boxes = random_boxes(random_layout, random.Random(3), 20, 4)
+    i, j, gaps = all_pair_gaps(boxes)
+    turn = rotation_matrices([[0.4, -1.1, 2.0]])[0]
+    centers = boxes.centers @ turn.T
+    axes = np.einsum('ab,nbc->nac', turn, boxes.axes)
+    turned = separation(centers[i], boxes.half_sizes[i], axes[i], centers[j], boxes.half_sizes[j], axes[j])
+    np.testing.assert_allclose(turned, gaps, atol=1e-9)
+
+
+def test_aligned_shortcut_matches_full_test(random_layout):
+    rng = random.Random(5)
+    modules = random_layout(rng, 30, spread=4, sized=1, turned=0)
+    for module in modules:
+        module['rotation'] = [0, rng.choice([0, np.pi / 2, np.pi, -np.pi / 2]), 0]
+    boxes = OrientedBoxes.from_modules(modules)
+    assert boxes.aligned.all()
+    i, j, gaps = all_pair_gaps(boxes)
+    # box_gaps measures aligned pairs on their AABBs instead of the full separating axis test
+    np.testing.assert_allclose(box_gaps(boxes, i, boxes.centers[i], boxes, j, boxes.centers[j]), gaps, atol=1e-9)
+
+
+def test_touching_faces_are_not_a_collision():
+    boxes = OrientedBoxes.from_modules([{'position': [0, 0, 0], 'size': [2, 2, 2]},
+                                        {'position': [2, 0, 0], 'size': [2, 2, 2]}])
+    assert len(find_collisions(boxes)[0]) == 0
+    assert len(find_collisions(boxes, clearance=0.5)[0]) == 1
+
+
+def test_shell_depths():
+    shell = Shell(radius=5, height=10)
+    boxes = OrientedBoxes.from_modules([
+        {'position': [0, 0, 0], 'size': [2, 2, 2]},
+        {'position': [11, 0, 0]},
+        {'position': [0, 4.5, 0], 'size': [2, 2, 2]},
+    ])
+    depths = shell.depths(boxes)
+    assert depths[0] == 0
+    assert depths[1] == pytest.approx(1.0)
+    assert depths[2] == pytest.approx(np.sqrt(1 + 5.5 ** 2) - 5)
+    assert shell.outside(boxes).tolist() == [False, True, True]
+    fitted = shell.fit(boxes, 2, boxes.centers[2])
+    assert shell.depths_at(boxes, [2], fitted)[0] <= 0.01
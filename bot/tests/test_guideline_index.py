@@ -0,0 +1,89 @@
+import math
+import os
+import random
+
+import pytest
+
+import guideline_index
+from guideline_index import (B, K1, BM25Index, chunk_text, design_query, estimate_tokens, load_or_build_index,
+                             tokenize)
+from guidelines import BUILTIN_GUIDELINES
+
+WORDS = "sleep quiet noise food galley storage hygiene water exercise airlock medical crew volume".split()
+
+
+def reference_scores(chunks, query):
+    """BM25 straight from the formula, scanning every chunk"""
+    documents = [tokenize(chunk) for chunk in chunks]
+    average = sum(map(len, documents)) / len(documents)
+    scores = {}
+    for chunk_id, terms in enumerate(documents):
+        score = 0.0
+        for term in set(tokenize(query)):
+            containing = sum(term in document for document in documents)
+            count = terms.count(term)
+            if not count:
+                continue
+            idf = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+            score += idf * count * (K1 + 1) / (count + K1 * (1 - B + B * len(terms) / average))
+        if score:
+            scores[chunk_id] = score
+    return scores
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_search_matches_the_bm25_formula(seed):
+    rng = random.Random(seed)
+    text = "\n\n".join(" ".join(rng.choices(WORDS, k=rng.randint(3, 30))) for _ in range(20))
+    index = BM25Index.build(text)
+    query = " ".join(rng.sample(WORDS, 3))
+    expected = reference_scores(index.chunks, query)
+    found = index.search(query, k=len(index.chunks))
+    assert {chunk_id for chunk_id, _ in found} == set(expected)
+    for chunk_id, score in found:
+        assert score == pytest.approx(expected[chunk_id])
+    assert [score for _, score in found] == sorted((score for _, score in found), reverse=True)
+
+
+def test_chunks_keep_paragraphs_and_split_long_ones():
+    long_paragraph = " ".join(f"w{i}" for i in range(25))
+    chunks = chunk_text(f"one two\n\nthree four\n  \n{long_paragraph}\n\nfive", chunk_words=10)
+    assert chunks[0] == "one two\nthree four"
+    assert chunks[1:4] == [" ".join(f"w{i}" for i in range(start, min(start + 10, 25))) for start in (0, 10, 20)]
+    assert chunks[4] == "five"
+
+
+def test_builtin_guidelines_rank_the_matching_section_first():
+    index = BM25Index.build(BUILTIN_GUIDELINES)
+    best, _ = index.search("galley food preparation storage", k=1)[0]
+    assert "Food preparation" in index.chunks[best]
+    assert "Multiple emergency exits" in index.chunks[index.search("airlock emergency exits egress", k=1)[0][0]]
+
+
+def test_select_respects_the_token_budget_and_document_order():
+    index = BM25Index.build("\n\n".join(f"food {'x ' * (10 * i)}" for i in range(1, 6)))
+    chosen = index.select("food", token_budget=60, k=5)
+    assert sum(map(estimate_tokens, chosen)) <= 60
+    assert chosen == [chunk for chunk in index.chunks if chunk in chosen]
+    assert index.select("food", token_budget=0) == []
+
+
+def test_design_query_expands_module_types():
+    query = design_query({'modules': [{'type': 'food'}, {'type': 'food'}, {'type': 'custom-lab'}, {}],
+                          'habitatConfig': {'shape': 'cylinder', 'mission': {'destination': 'mars'}}})
+    assert query.startswith("volume crew zoning adjacency safety mars cylinder")
+    assert query.count("galley") == 1
+    assert query.endswith("custom lab food preparation galley storage clean")
+
+
+def test_index_is_cached_per_text(tmp_path, monkeypatch):
+    index = load_or_build_index(BUILTIN_GUIDELINES, cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+
+    def no_build(text):
+        raise AssertionError("cached index was rebuilt")
+
+    monkeypatch.setattr(guideline_index.BM25Index, 'build', no_build)
+    cached = load_or_build_index(BUILTIN_GUIDELINES, cache_dir=str(tmp_path))
+    assert cached.chunks == index.chunks
+    assert cached.search("food storage") == index.search("food storage")
@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+import guidelines
+from guidelines import BUILTIN_GUIDELINES, extract_pdf_pages, load_guidelines
+
+
+def write_pdf(path, texts):
+    """Minimal PDF with one line of Helvetica text per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(texts)} >>"
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_missing_pdf_uses_the_builtin_text(tmp_path):
+    text, stats = load_guidelines(str(tmp_path / 'missing.pdf'), cache_dir=str(tmp_path / 'cache'))
+    assert text == BUILTIN_GUIDELINES
+    assert stats["source"] == "builtin" and stats["pages"] == 0
+    assert not (tmp_path / 'cache').exists()
+
+
+def test_pdf_is_extracted_once_then_read_from_the_cache(tmp_path, monkeypatch):
+    pdf = write_pdf(tmp_path / 'guide.pdf', ["Sleep quarters", "Exercise areas"])
+    cache_dir = str(tmp_path / 'cache')
+    text, stats = load_guidelines(pdf, cache_dir=cache_dir)
+    assert "Sleep quarters" in text and "Exercise areas" in text
+    assert stats["source"] == "pdf" and stats["pages"] == 2
+    with open(os.path.join(cache_dir, f"{stats['sha256']}.json")) as file:
+        assert json.load(file) == {"text": text, "pages": 2}
+
+    def no_extraction(*args, **kwargs):
+        raise AssertionError("cached PDF was extracted again")
+
+    monkeypatch.setattr(guidelines, 'extract_pdf_pages', no_extraction)
+    cached_text, cached_stats = load_guidelines(pdf, cache_dir=cache_dir)
+    assert cached_text == text
+    assert cached_stats["source"] == "cache" and cached_stats["sha256"] == stats["sha256"]
+
+
+def test_a_changed_pdf_misses_the_cache(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    pdf = write_pdf(tmp_path / 'guide.pdf', ["First edition"])
+    _, first = load_guidelines(pdf, cache_dir=cache_dir)
+    write_pdf(tmp_path / 'guide.pdf', ["Second edition"])
+    text, second = load_guidelines(pdf, cache_dir=cache_dir)
+    assert second["source"] == "pdf" and second["sha256"] != first["sha256"]
+    assert "Second edition" in text
+
+
+def test_corrupt_cache_entries_are_rebuilt(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    pdf = write_pdf(tmp_path / 'guide.pdf', ["Medical bay"])
+    _, stats = load_guidelines(pdf, cache_dir=str(cache_dir))
+    (cache_dir / f"{stats['sha256']}.json").write_text("{truncated")
+    text, stats = load_guidelines(pdf, cache_dir=str(cache_dir))
+    assert stats["source"] == "pdf" and "Medical bay" in text
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_extraction_keeps_page_order(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(guidelines, 'PARALLEL_MIN_PAGES', 4)
+    monkeypatch.setattr(guidelines, 'PAGES_PER_TASK', 3)
+    texts = [f"Page {i}" for i in range(10)]
+    pages = extract_pdf_pages(write_pdf(tmp_path / 'guide.pdf', texts), workers=workers)
+    assert [page.strip() for page in pages] == texts
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from json_extract import JsonExtractor, extract_json
+
+REPLY = {"validation": {"overallScore": 80, "issues": ["a}", "b{"]}, "modules": [{"id": 1}, {"id": 2}]}
+
+
+def feed_all(chunks):
+    extractor = JsonExtractor()
+    done = [extractor.feed(chunk) for chunk in chunks]
+    return extractor, done
+
+
+def test_whole_reply_with_fence_and_prose():
+    text = "Here you go:\n```json\n" + json.dumps(REPLY) + "\n```\nLet me know."
+    assert extract_json(text) == (REPLY, False)
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64])
+def test_chunked_reply_matches_whole(size):
+    text = "Sure! " + json.dumps(REPLY) + " trailing prose {not json}"
+    extractor, done = feed_all([text[i:i + size] for i in range(0, len(text), size)])
+    assert extractor.done
+    assert extractor.finish() == (REPLY, False)
+    # Completion is reported with the chunk that closes the object, not before
+    assert done.index(True) == (len("Sure! ") + len(json.dumps(REPLY)) - 1) // size
+
+
+def test_prose_braces_before_the_object_are_skipped():
+    extractor, done = feed_all(['Sure {see', ' below}: {"a":', ' 1}'])
+    assert done == [False, False, True]
+    assert extractor.finish() == ({"a": 1}, False)
+
+
+def test_object_nested_in_prose_braces():
+    assert extract_json('{note: {"a": 1} is the answer}') == ({"a": 1}, False)
+
+
+def test_non_object_json_is_skipped():
+    assert extract_json('[1, 2] {} {"a": [1]}') == ({}, False)
+    assert extract_json('{"a"} then {"b": 2}') == ({"b": 2}, False)
+
+
+def test_truncated_reply_keeps_complete_values():
+    text = json.dumps(REPLY)
+    cut = text.index('{"id": 2}') + 5
+    result, repaired = extract_json(text[:cut])
+    assert repaired
+    assert result["validation"] == REPLY["validation"]
+    assert result["modules"] == [{"id": 1}]
+
+
+def test_truncated_after_prose_braces():
+    result, repaired = extract_json('Sure {see below}: {"a": 1, "b": [2, 3')
+    assert repaired
+    assert result == {"a": 1, "b": [2]}
+
+
+def test_escaped_quotes_and_braces_in_strings():
+    reply = {"text": 'he said "{hi}" \\ ok'}
+    assert extract_json("x " + json.dumps(reply)) == (reply, False)
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "{", '{"a"'])
+def test_unrecoverable_output_raises(text):
+    with pytest.raises(ValueError):
+        extract_json(text)
+
+
+def test_feed_after_done_is_ignored():
+    extractor = JsonExtractor()
+    assert extractor.feed('{"a": 1}')
+    assert extractor.feed('{"b": 2}')
+    assert extractor.finish() == ({"a": 1}, False)
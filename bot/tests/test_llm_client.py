@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+from llm_client import DeadlineExceeded, HedgedClient, LatencyTracker
+
+
+class FakeManager:
+    """Stands in for a SessionManager: answers its own name after latency seconds, or raises error"""
+
+    def __init__(self, model_name, latency=0.0, error=None, chunks=None):
+        self.model_name = model_name
+        self.latency = latency
+        self.error = error
+        self.chunks = chunks or []
+        self.calls = []
+        self.stopped = threading.Event()
+
+    def generate(self, prompt, session_id=None, stream=False, **kwargs):
+        self.calls.append((prompt, session_id))
+        if stream:
+            return self._stream()
+        time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return self.model_name
+
+    def _stream(self):
+        try:
+            for chunk in self.chunks:
+                time.sleep(self.latency)
+                yield chunk
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.stopped.set()
+
+
+def deadline(seconds=2.0):
+    return time.monotonic() + seconds
+
+
+def test_fast_primary_is_not_hedged():
+    primary, backup = FakeManager('primary'), FakeManager('backup')
+    client = HedgedClient(primary, [backup], default_hedge_after=1.0)
+    assert client.generate("p", deadline()) == ('primary', 'primary')
+    assert backup.calls == []
+    assert client.stats()["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_the_backup_wins():
+    primary, backup = FakeManager('primary', latency=1.0), FakeManager('backup', latency=0.01)
+    client = HedgedClient(primary, [backup], default_hedge_after=0.05)
+    started = time.monotonic()
+    assert client.generate("p", deadline()) == ('backup', 'backup')
+    assert time.monotonic() - started < 0.5
+    assert client.stats()["hedged"] == 1 and client.stats()["backupWins"] == 1
+
+
+def test_failures_move_to_the_next_model_at_once():
+    primary = FakeManager('primary', error=RuntimeError("down"))
+    backup = FakeManager('backup')
+    client = HedgedClient(primary, [backup], default_hedge_after=10.0)
+    started = time.monotonic()
+    assert client.generate("p", deadline()) == ('backup', 'backup')
+    assert time.monotonic() - started < 0.5
+
+
+def test_the_last_error_is_raised_when_every_model_fails():
+    client = HedgedClient(FakeManager('primary', error=RuntimeError("one")),
+                          [FakeManager('backup', error=ValueError("two"))])
+    with pytest.raises(ValueError, match="two"):
+        client.generate("p", deadline())
+
+
+def test_calls_end_by_the_deadline():
+    client = HedgedClient(FakeManager('primary', latency=1.0), [FakeManager('backup', latency=1.0)],
+                          default_hedge_after=0.05)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        client.generate("p", deadline(0.2))
+    assert time.monotonic() - started < 0.4
+    with pytest.raises(DeadlineExceeded):
+        client.generate("p", time.monotonic() - 1)
+    assert client.stats()["deadlineExceeded"] == 2
+
+
+def test_session_calls_are_never_hedged():
+    primary, backup = FakeManager('primary', latency=0.2), FakeManager('backup')
+    client = HedgedClient(primary, [backup], default_hedge_after=0.01)
+    assert client.generate("p", deadline(), session_id="s") == ('primary', 'primary')
+    assert primary.calls == [("p", "s")] and backup.calls == []
+
+
+def test_hedge_delay_follows_recent_primary_latency():
+    client = HedgedClient(FakeManager('primary'), default_hedge_after=4.0, min_hedge_after=0.5)
+    assert client.hedge_after() == 4.0
+    for seconds in [0.1] * 9 + [2.0]:
+        client.latency.record(seconds)
+    assert client.hedge_after() == 2.0
+    client.latency.samples.clear()
+    for _ in range(10):
+        client.latency.record(0.1)
+    assert client.hedge_after() == 0.5
+
+
+def test_latency_percentile_needs_enough_samples():
+    tracker = LatencyTracker(window=5)
+    for seconds in range(1, 5):
+        tracker.record(seconds)
+    assert tracker.percentile(0.5, min_samples=5) is None
+    tracker.record(5)
+    tracker.record(6)
+    assert tracker.percentile(0.5, min_samples=5) == 4
+    assert tracker.percentile(1.0, min_samples=5) == 6
+
+
+def test_stream_yields_chunks_and_raises_the_reader_error():
+    client = HedgedClient(FakeManager('primary', chunks=["a", "b"], error=RuntimeError("cut off")))
+    received = []
+    with pytest.raises(RuntimeError, match="cut off"):
+        for chunk in client.stream("p", deadline()):
+            received.append(chunk)
+    assert received == ["a", "b"]
+
+
+def test_stalled_stream_ends_at_the_deadline_and_stops_the_reader():
+    primary = FakeManager('primary', latency=0.3, chunks=["a", "b", "c"])
+    client = HedgedClient(primary)
+    started = time.monotonic()
+    received = []
+    with pytest.raises(DeadlineExceeded):
+        for chunk in client.stream("p", deadline(0.4)):
+            received.append(chunk)
+    assert received == ["a"]
+    assert time.monotonic() - started < 0.6
+    assert primary.stopped.wait(1.0)
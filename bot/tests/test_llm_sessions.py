@@ -0,0 +1,82 @@
+import types
+
+import pytest
+
+import llm_sessions
+from llm_sessions import SessionManager, classify_error
+
+
+class ResourceExhausted(Exception):
+    code = 429
+
+
+class TooManyRequests(Exception):
+    code = 429
+
+
+class HttpError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@pytest.fixture
+def api_exceptions(monkeypatch):
+    module = types.SimpleNamespace(ResourceExhausted=ResourceExhausted, TooManyRequests=TooManyRequests)
+    monkeypatch.setattr(llm_sessions, 'api_exceptions', module)
+    return module
+
+
+def test_errors_are_classified_by_type(api_exceptions):
+    assert classify_error(ResourceExhausted("429 Quota exceeded")) == "quota"
+    assert classify_error(TooManyRequests("slow down")) == "rate"
+
+
+def test_status_code_429_without_google_exceptions(monkeypatch):
+    monkeypatch.setattr(llm_sessions, 'api_exceptions', None)
+    assert classify_error(HttpError("Too many requests", 429)) == "429"
+    assert classify_error(ResourceExhausted("anything")) == "429"
+    assert classify_error(HttpError("Server error", 500)) == "other"
+
+
+@pytest.mark.parametrize("message", ["Failed to generate content", "quota exceeded", "rate limited", "HTTP 429"])
+def test_messages_never_decide_the_class(api_exceptions, message):
+    assert classify_error(RuntimeError(message)) == "other"
+
+
+
+
+def test_stateless_calls_send_only_the_prompt(genai_stub):
+    sessions = SessionManager(genai_stub, 'gemini-1.5-flash', {}, "system")
+    sessions.generate("hello")
+    sessions.generate("again")
+    assert [prompt for _, prompt in genai_stub.calls] == ["hello", "again"]
+
+
+def test_sessions_keep_only_the_last_turns(genai_stub):
+    sessions = SessionManager(genai_stub, 'gemini-1.5-flash', {}, "system", history_turns=1, max_sessions=2)
+    for prompt in ("one", "two", "three"):
+        sessions.generate(prompt, session_id="a")
+    history = genai_stub.calls[-1][1]
+    assert [turn["parts"][0] for turn in history] == ["two", genai_stub.reply, "three"]
+    sessions.generate("x", session_id="b")
+    sessions.generate("y", session_id="c")
+    assert list(sessions.sessions) == ["b", "c"]
+
+
+def test_failed_turns_are_not_kept(genai_stub):
+    sessions = SessionManager(genai_stub, 'broken', {}, "system")
+    genai_stub.failing = {'broken'}
+    with pytest.raises(RuntimeError):
+        sessions.generate("lost", session_id="a")
+    genai_stub.failing = set()
+    sessions.generate("kept", session_id="a")
+    assert [turn["parts"][0] for turn in genai_stub.calls[-1][1]] == ["kept"]
+
+
+def test_zero_history_turns_resend_nothing(genai_stub):
+    sessions = SessionManager(genai_stub, 'gemini-1.5-flash', {}, "system", history_turns=0)
+    sessions.generate("one", session_id="a")
+    sessions.generate("two", session_id="a")
+    assert [turn["parts"][0] for turn in genai_stub.calls[-1][1]] == ["two"]
+    assert sessions.stats() == {"model": 'gemini-1.5-flash', "sessions": 1, "maxSessions": 64, "historyTurns": 0}
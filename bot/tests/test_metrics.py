@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from metrics import CONTENT_TYPE, Registry
+
+
+def test_counter_renders_labelled_totals():
+    registry = Registry()
+    fallbacks = registry.counter("fallback_total", "Fallbacks", ("endpoint", "reason"))
+    fallbacks.inc(endpoint="validate", reason="api_quota")
+    fallbacks.inc(2, endpoint="validate", reason="api_quota")
+    fallbacks.inc(endpoint="optimize", reason='say "hi"\n')
+    assert registry.render().splitlines() == [
+        "# HELP fallback_total Fallbacks",
+        "# TYPE fallback_total counter",
+        'fallback_total{endpoint="optimize",reason="say \\"hi\\"\\n"} 1',
+        'fallback_total{endpoint="validate",reason="api_quota"} 3',
+    ]
+
+
+def test_labels_must_match_the_declaration():
+    counter = Registry().counter("calls_total", "Calls", ("endpoint",))
+    with pytest.raises(ValueError):
+        counter.inc(route="x")
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value)
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_gauges_read_their_callback_and_broken_ones_are_skipped():
+    registry = Registry()
+    registry.gauge("entries", "Entries", lambda: 7)
+    registry.gauge("hits_total", "Hits", lambda: {"hit": 3, "miss": 1}, ("result",), kind="counter")
+    registry.gauge("broken", "Broken", lambda: 1 / 0)
+    lines = registry.render().splitlines()
+    assert "entries 7" in lines
+    assert "# TYPE hits_total counter" in lines
+    assert 'hits_total{result="hit"} 3' in lines and 'hits_total{result="miss"} 1' in lines
+    assert not any(line.startswith("broken") or "Broken" in line for line in lines)
+
+
+def test_duplicate_names_are_rejected():
+    registry = Registry()
+    registry.counter("calls_total", "Calls")
+    with pytest.raises(ValueError):
+        registry.histogram("calls_total", "Calls again")
+
+
+def test_concurrent_updates_are_not_lost():
+    registry = Registry()
+    counter = registry.counter("calls_total", "Calls", ("endpoint",))
+    histogram = registry.histogram("latency_seconds", "Latency")
+
+    def work():
+        for _ in range(2000):
+            counter.inc(endpoint="x")
+            histogram.observe(0.01)
+
+    threads = [threading.Thread(target=work) for _ in range(24)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.values() == {("x",): 48000}
+    assert histogram.values()[()][-2] == 0
+    assert sum(histogram.values()[()][:-1]) == 48000
+
+
+def test_metrics_endpoint_serves_the_registry(bot_main):
+    client = bot_main.app.test_client()
+    client.get("/api_status")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type == CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert "# TYPE habitat_fallback_total counter" in text
+    assert "habitat_result_cache_entries" in text
@@ -0,0 +1,84 @@
+import json
+import time
+
+from model_discovery import DEFAULT_MODEL, FREE_TIER_MODELS, ModelDiscovery
+
+
+def discovery(genai, tmp_path, **kwargs):
+    return ModelDiscovery(genai, cache_path=str(tmp_path / 'model_cache.json'), **kwargs)
+
+
+def write_cache(tmp_path, model, age=0):
+    (tmp_path / 'model_cache.json').write_text(json.dumps({"model": model, "checked_at": time.time() - age}))
+
+
+def test_nothing_is_probed_until_first_use(genai_stub, tmp_path):
+    discovery(genai_stub, tmp_path)
+    assert genai_stub.calls == []
+
+
+def test_cache_hit_skips_probing(genai_stub, tmp_path):
+    write_cache(tmp_path, 'gemini-pro')
+    models = discovery(genai_stub, tmp_path)
+    assert models.get_model() == 'gemini-pro'
+    assert models.stats["source"] == "disk"
+    assert genai_stub.calls == []
+
+
+def test_cache_miss_probes_and_writes_the_cache(genai_stub, tmp_path):
+    genai_stub.failing = {FREE_TIER_MODELS[0]}
+    models = discovery(genai_stub, tmp_path)
+    assert models.get_model() == FREE_TIER_MODELS[1]
+    assert models.stats["source"] == "probe"
+    assert models.stats["probes"][FREE_TIER_MODELS[0]] != "ok"
+    assert models.backup_models(FREE_TIER_MODELS[1]) == FREE_TIER_MODELS[2:]
+    assert json.loads((tmp_path / 'model_cache.json').read_text())["model"] == FREE_TIER_MODELS[1]
+
+    # A second instance, like a restarted worker, reads the cache instead of probing
+    calls = len(genai_stub.calls)
+    assert discovery(genai_stub, tmp_path).get_model() == FREE_TIER_MODELS[1]
+    assert len(genai_stub.calls) == calls
+
+
+def test_expired_or_unknown_cache_entries_are_probed_again(genai_stub, tmp_path):
+    write_cache(tmp_path, 'gemini-pro', age=7200)
+    assert discovery(genai_stub, tmp_path, ttl=3600).get_model() == FREE_TIER_MODELS[0]
+    write_cache(tmp_path, 'not-a-free-model')
+    assert discovery(genai_stub, tmp_path).get_model() == FREE_TIER_MODELS[0]
+    (tmp_path / 'model_cache.json').write_text("{not json")
+    assert discovery(genai_stub, tmp_path).get_model() == FREE_TIER_MODELS[0]
+
+
+def test_refresh_ignores_the_cache_and_rewrites_it(genai_stub, tmp_path):
+    write_cache(tmp_path, 'gemini-pro')
+    models = discovery(genai_stub, tmp_path)
+    assert models.get_model() == 'gemini-pro'
+    assert models.get_model(refresh=True) == FREE_TIER_MODELS[0]
+    assert models.stats["source"] == "probe"
+    assert json.loads((tmp_path / 'model_cache.json').read_text())["model"] == FREE_TIER_MODELS[0]
+
+
+def test_no_usable_model_falls_back_to_the_default_uncached(genai_stub, tmp_path):
+    genai_stub.failing = set(FREE_TIER_MODELS)
+    models = discovery(genai_stub, tmp_path)
+    assert models.get_model() == DEFAULT_MODEL
+    assert models.stats["source"] == "default"
+    assert models.backup_models(DEFAULT_MODEL) == []
+    assert not (tmp_path / 'model_cache.json').exists()
+
+
+def test_slow_preferred_model_loses_at_the_deadline_and_is_not_cached(genai_stub, tmp_path):
+    slow = genai_stub.GenerativeModel.generate_content
+
+    def generate_content(self, prompt, **kwargs):
+        if self.model_name == FREE_TIER_MODELS[0]:
+            time.sleep(1.0)
+        return slow(self, prompt, **kwargs)
+
+    genai_stub.GenerativeModel.generate_content = generate_content
+    models = discovery(genai_stub, tmp_path, deadline=0.2)
+    started = time.perf_counter()
+    assert models.get_model() == FREE_TIER_MODELS[1]
+    assert time.perf_counter() - started < 0.8
+    assert models.stats["source"] == "deadline"
+    assert not (tmp_path / 'model_cache.json').exists()
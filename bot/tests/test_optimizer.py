@@ -0,0 +1,107 @@
+import random
+import time
+
+import numpy as np
+import pytest
+
+from geometry import OrientedBoxes, Shell
+from optimizer import AnnealingOptimizer, iteration_budget, optimize_layout
+from scoring import calculate_compliance_score
+
+CONFIG = {'radius': 8, 'height': 12, 'mission': {'crewSize': 2}}
+
+
+def random_modules(random_layout, rng, count):
+    return random_layout(rng, count, spread=3, sizes=(0.5, 2.5), sized=1, turned=0.3)
+
+
+def weights_for(rng):
+    return rng.choice([None, {'egress': 1.0, 'noise': 0.5, 'spread': 0.3}])
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_single_move_deltas_match_full_recompute(seed, random_layout):
+    rng = random.Random(seed)
+    modules = random_modules(random_layout, rng, rng.randint(3, 15))
+    optimizer = AnnealingOptimizer(modules, CONFIG, seed=seed, weights=weights_for(rng))
+    n = len(optimizer.modules)
+    for _ in range(30):
+        before = optimizer._totals()
+        k = rng.randrange(n)
+        j = rng.randrange(n)
+        if rng.random() < 0.3 and j != k:
+            point_k, point_j = optimizer.positions[k].copy(), optimizer.positions[j].copy()
+            delta = optimizer._change([(k, point_k, point_j, j), (j, point_j, point_k, k)])
+            optimizer.positions[[k, j]] = optimizer.positions[[j, k]]
+        else:
+            point = optimizer._propose_point(k, rng.random())
+            delta = optimizer._change([(k, optimizer.positions[k].copy(), point, None)])
+            optimizer.positions[k] = point
+        after = optimizer._totals()
+        assert delta[0] == after[0] - before[0]
+        assert delta[1] == after[1] - before[1]
+        assert delta[2] == pytest.approx(after[2] - before[2], abs=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_running_totals_match_after_a_search(seed, random_layout):
+    rng = random.Random(seed)
+    optimizer = AnnealingOptimizer(random_modules(random_layout, rng, 12), CONFIG, seed=seed, weights=weights_for(rng))
+    optimizer.run(0, iterations=500)
+    penalty, overlaps, secondary = optimizer._totals()
+    assert optimizer.penalty == penalty
+    assert optimizer.overlaps == overlaps
+    assert optimizer.secondary == pytest.approx(secondary, abs=1e-6)
+
+
+def test_same_seed_repeats_the_search(random_layout):
+    modules = random_modules(random_layout, random.Random(1), 10)
+    first = AnnealingOptimizer(modules, CONFIG, seed=42).run(0, iterations=400)
+    second = AnnealingOptimizer(modules, CONFIG, seed=42).run(0, iterations=400)
+    assert first['modules'] == second['modules']
+    assert first['scoreTrajectory'] == second['scoreTrajectory']
+
+
+def test_result_is_scored_and_inside_the_shell(random_layout):
+    modules = random_modules(random_layout, random.Random(2), 12)
+    result = AnnealingOptimizer(modules, CONFIG, seed=7).run(0, iterations=800)
+    assert (result['score'], result['issues']) == calculate_compliance_score(result['modules'], CONFIG)
+    boxes = OrientedBoxes.from_modules(result['modules'])
+    assert not np.any(Shell.from_config(CONFIG).outside(boxes))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_sample_layouts_stay_inside_the_shell(seed, bot_main, sample_designs):
+    for design in sample_designs:
+        config = design['habitatConfig']
+        shell = Shell.from_config(config)
+        layout = bot_main.create_nasa_compliant_layout(design['modules'], config)
+        assert not np.any(shell.outside(OrientedBoxes.from_modules(layout)))
+        optimizer = AnnealingOptimizer(layout, config, seed=seed)
+        optimizer.scatter()
+        modules = optimizer.run(0, iterations=200)['modules']
+        assert not np.any(shell.outside(OrientedBoxes.from_modules(modules)))
+
+
+def test_time_budget_is_a_hard_cap(random_layout):
+    modules = random_modules(random_layout, random.Random(4), 40)
+    started = time.perf_counter()
+    result = AnnealingOptimizer(modules, CONFIG, seed=1).run(0.05, iterations=10**9)
+    assert time.perf_counter() - started < 0.5
+    assert result["truncated"]
+    assert result["iterations"] < 10**9
+
+
+def test_unseeded_search_uses_the_budget(random_layout):
+    modules = random_modules(random_layout, random.Random(4), 40)
+    # Weighted searches never stop early on a clean layout
+    result = optimize_layout(modules, CONFIG, time_budget=0.1, weights={'egress': 1.0, 'noise': 1.0})
+    assert result["iterationBudget"] is None
+    assert not result["truncated"]
+    assert 80 <= result["elapsedMs"] < 500
+
+
+def test_seeded_search_has_a_fixed_iteration_count(random_layout):
+    modules = random_modules(random_layout, random.Random(4), 10)
+    result = optimize_layout(modules, CONFIG, time_budget=0.05, seed=3)
+    assert result["iterationBudget"] == iteration_budget(0.05)
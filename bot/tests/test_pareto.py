@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from pareto import (SECONDARY_WEIGHT, constraint_violations, front_candidates, non_dominated, objective_matrix,
+                    pareto_optimize, rank_front, start_weights)
+
+
+def test_non_dominated_keeps_the_front_and_drops_duplicates():
+    matrix = np.array([
+        [90, 10],
+        [80, 20],
+        [80, 5],   # dominated by the second row
+        [90, 10],  # duplicate of the first row
+        [70, 30],
+    ], dtype=float)
+    assert non_dominated(matrix).tolist() == [True, True, False, False, True]
+
+
+def test_missing_objectives_rank_worst():
+    results = [{"objectives": {"score": 90, "freeVolume": None, "worstEgress": 3.0, "noiseSeparation": None}},
+               {"objectives": {"score": 90, "freeVolume": 40.0, "worstEgress": 2.0, "noiseSeparation": 5.0}}]
+    matrix = objective_matrix(results)
+    assert matrix[0, 1] == -np.inf
+    # Lower egress is better, so it is negated
+    assert matrix[1, 2] == -2.0
+    assert non_dominated(matrix).tolist() == [False, True]
+
+
+def test_rank_front_orders_by_score_then_balance():
+    matrix = np.array([[80, 50, -2], [90, 10, -9], [90, 40, -3]], dtype=float)
+    assert rank_front(matrix).tolist() == [2, 1, 0]
+
+
+def test_front_candidates_prefer_fewest_violations():
+    assert front_candidates([{"constraintViolations": v} for v in (2, 0, 1, 0)]).tolist() == [1, 3]
+    assert front_candidates([{"constraintViolations": v} for v in (2, 1, 1)]).tolist() == [1, 2]
+
+
+def test_start_weights_are_seeded_splits():
+    weights = start_weights(7)
+    assert weights == start_weights(7)
+    assert weights != start_weights(8)
+    assert sum(weights.values()) == pytest.approx(SECONDARY_WEIGHT, abs=1e-3)
+
+
+def test_constraint_violations_count_collisions_and_protrusions():
+    config = {'radius': 5, 'height': 10}
+    modules = [{'position': [0, 0, 0], 'size': [2, 2, 2]}, {'position': [1, 0, 0], 'size': [2, 2, 2]},
+               {'position': [0, 4.5, 0], 'size': [2, 2, 2]}]
+    assert constraint_violations(modules, config) == 2
+    assert constraint_violations(modules[:1], config) == 0
+
+
+def test_sample_designs_have_a_feasible_front(bot_main, sample_designs):
+    # One start at a time, so the wall-clock budget of each is not split across threads by the GIL
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for design in sample_designs:
+            config = design['habitatConfig']
+            layout = bot_main.create_nasa_compliant_layout(design['modules'], config)
+            result = pareto_optimize(layout, config, starts=3, time_budget=0.25, seed=0, pool=pool)
+            assert result["stats"]["feasibleStarts"] >= 1
+            assert result["front"]
+            for entry in result["front"]:
+                assert entry["feasible"]
+                assert entry["objectives"]["freeVolume"] is not None
+                assert constraint_violations(entry["modules"], config) == 0
@@ -0,0 +1,112 @@
+import random
+from collections import deque
+
+import numpy as np
+import pytest
+
+from geometry import OrientedBoxes
+from pathing import FreeSpace, path_report
+from scoring import fallback_validation
+from voxels import OccupancyGrid
+
+SMALL = {'radius': 2, 'height': 2, 'mission': {'crewSize': 2}}
+CONFIG = {'radius': 5, 'height': 10, 'mission': {'crewSize': 2}}
+
+
+def module(i, module_type, position, size=(1, 2, 1)):
+    return {'id': f'm{i}', 'type': module_type, 'position': list(position), 'size': list(size)}
+
+
+def reference_steps(space, sources):
+    """Plain breadth-first search over the padded grid"""
+    walkable = space.walkable.reshape(space.shape)
+    steps = np.full(space.shape, -1)
+    queue = deque()
+    for source in np.unique(sources).tolist():
+        cell = np.unravel_index(source, space.shape)
+        if walkable[cell]:
+            steps[cell] = 0
+            queue.append(cell)
+    while queue:
+        cell = queue.popleft()
+        for axis in range(3):
+            for step in (1, -1):
+                near = list(cell)
+                near[axis] += step
+                near = tuple(near)
+                if walkable[near] and steps[near] < 0:
+                    steps[near] = steps[cell] + 1
+                    queue.append(near)
+    return steps.ravel()
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_distances_match_a_plain_breadth_first_search(seed, random_layout):
+    rng = random.Random(seed)
+    occupancy = OccupancyGrid(SMALL, random_layout(rng, 6, spread=2, sizes=(0.3, 1.5), sized=1), resolution=0.25)
+    space = FreeSpace(occupancy)
+    walkable = np.flatnonzero(space.walkable)
+    sources = np.array(rng.sample(walkable.tolist(), 3))
+    assert (space.distances(sources) == reference_steps(space, sources)).all()
+
+
+def test_egress_from_two_airlocks():
+    modules = [module(0, 'airlock', (-6, 0, 0)), module(1, 'airlock', (6, 0, 0)),
+               module(2, 'sleep', (-3, 0, 0)), module(3, 'food', (1, 0, 0))]
+    report = path_report(modules, CONFIG)
+    assert report["exits"] == 2
+    assert not any("airlock" in violation for violation in report["violations"])
+    egress = {entry["id"]: entry["distance"] for entry in report["egress"]}
+    assert set(egress) == {"m2", "m3"}
+    # A walk is never shorter than the straight gap between the boxes
+    assert 2 - 0.25 <= egress["m2"] < 6
+    assert 4 - 0.25 <= egress["m3"] < 10
+    assert report["worstEgress"] == {"id": "m3", "distance": egress["m3"]}
+    assert 0 < report["reachableVolume"] <= report["walkableVolume"]
+
+
+def test_missing_and_unreachable_exits_are_violations():
+    report = path_report([module(0, 'sleep', (0, 0, 0))], CONFIG)
+    assert report["exits"] == 0 and report["egress"] == [] and report["worstEgress"] is None
+    assert report["reachableVolume"] is None
+    assert "Only 0 airlock(s), at least 2 emergency exits required" in report["violations"]
+
+    # Airlocks outside the shell have no walkable door
+    modules = [module(0, 'airlock', (0, 0, 20)), module(1, 'airlock', (0, 0, -20)), module(2, 'sleep', (0, 0, 0))]
+    report = path_report(modules, CONFIG)
+    assert report["egress"] == [{"id": "m2", "distance": None}]
+    assert "sleep has no walkable path to an airlock" in report["violations"]
+
+
+def test_required_adjacencies_are_walked():
+    near = path_report([module(0, 'food', (0, 0, 0)), module(1, 'storage', (2, 0, 0))], CONFIG)
+    far = path_report([module(0, 'food', (-6, 0, 0)), module(1, 'storage', (6, 0, 0))], CONFIG)
+    alone = path_report([module(0, 'food', (0, 0, 0))], CONFIG)
+    assert near["adjacencyPaths"][0]["distance"] <= 3
+    assert not any("walk from storage" in violation for violation in near["violations"])
+    assert any(violation.startswith("food is a ") and "walk from storage (max 3m)" in violation
+               for violation in far["violations"])
+    assert "No storage module for food to reach" in alone["violations"]
+
+
+def test_doors_touch_their_box(random_layout):
+    rng = random.Random(3)
+    modules = random_layout(rng, 8, spread=3, sized=1)
+    occupancy = OccupancyGrid(CONFIG, modules)
+    space = FreeSpace(occupancy)
+    boxes = OrientedBoxes.from_modules(modules)
+    for k, doors in enumerate(space.doors(boxes)):
+        assert space.walkable[doors].all()
+        cells = np.stack(np.unravel_index(doors, space.shape), axis=-1) - 1
+        centers = occupancy.grid.origin + (cells + 0.5) * space.resolution
+        reach = np.abs(centers - boxes.centers[k]) - boxes.extents[k]
+        assert (reach <= 1.5 * space.resolution).all()
+
+
+def test_fallback_validation_adds_paths_only_on_request():
+    design = {'modules': [module(0, 'airlock', (-6, 0, 0)), module(1, 'sleep', (0, 0, 0))], 'habitatConfig': CONFIG}
+    assert "paths" not in fallback_validation(design)
+    assert "paths" not in fallback_validation({**design, 'paths': 'yes'})
+    result = fallback_validation({**design, 'paths': True})
+    assert result["paths"] == path_report(design['modules'], CONFIG)
+    assert "1 path issue(s)" in result["analysis"]["safetyAnalysis"]
@@ -0,0 +1,90 @@
+import json
+import math
+import random
+
+import pytest
+
+from prompt_codec import (MODULE_TABLE_HEADER, POSITION_STEP, decode_modules, encode_modules,
+                          expand_optimization_result)
+
+
+def table_rows(modules):
+    """Parse encode_modules output back into (id, type, position, size, rotation) tuples"""
+    lines = encode_modules(modules).split("\n")
+    assert lines[0] == MODULE_TABLE_HEADER
+    rows = []
+    for line in lines[1:]:
+        module_id, module_type, position, size, rotation = line.split("|")
+        parse = lambda text: [float(v) for v in text.split(",")] if text else None
+        rows.append((module_id, module_type, parse(position), parse(size), parse(rotation)))
+    return rows
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_round_trip_keeps_every_module(random_layout, seed):
+    rng = random.Random(seed)
+    modules = random_layout(rng, 12, any_angle=True)
+    for module in modules:
+        module['position'] = [rng.uniform(-5, 5) for _ in range(3)]
+    rows = table_rows(modules)
+    decoded = decode_modules([[module_id, *position] for module_id, _, position, _, _ in rows], modules)
+    assert [m['id'] for m in decoded] == [m['id'] for m in modules]
+    for original, module, row in zip(modules, decoded, rows):
+        assert row[1] == original['type']
+        assert module['position'] == pytest.approx(original['position'], abs=POSITION_STEP / 2 + 1e-9)
+        assert module.get('rotation') == original.get('rotation')
+        if original.get('rotation') and any(original['rotation']):
+            assert row[4] == pytest.approx(original['rotation'], abs=0.005 + 1e-9)
+        else:
+            assert row[4] is None
+
+
+def test_rotation_column_is_empty_for_unrotated_modules():
+    modules = [{'id': 'a', 'type': 'sleep', 'position': [0, 0, 0], 'rotation': [0, 0, 0]},
+               {'id': 'b', 'type': 'food', 'position': [1, 0, 0], 'rotation': [0, math.pi / 2, 0]},
+               {'id': 'c', 'type': 'storage'}]
+    assert encode_modules(modules).split("\n")[1:] == [
+        "a|sleep|0,0,0|0,0,0|",
+        "b|food|1,0,0|0,0,0|0,1.57,0",
+        "c|storage|0,0,0|0,0,0|",
+    ]
+
+
+def test_null_coordinates_keep_the_current_ones():
+    modules = [{'id': 'a', 'position': [1, 2, 3]}, {'id': 'b'}]
+    decoded = decode_modules([["a", None, 5, None], ["b", 4, None, 6]], modules)
+    assert [m['position'] for m in decoded] == [[1.0, 5.0, 3.0], [4.0, 0.0, 6.0]]
+
+
+@pytest.mark.parametrize("row", [
+    ["a", 1, 2],
+    ["a", "x", 2, 3],
+    ["a", [1], 2, 3],
+    ["a", {"x": 1}, 2, 3],
+    ["a", True, 2, 3],
+    ["a", float("nan"), 2, 3],
+    ["a", float("inf"), 2, 3],
+    ["unknown", 1, 2, 3],
+    [["a"], 1, 2, 3],
+    "a,1,2,3",
+    None,
+])
+def test_malformed_rows_are_skipped(row):
+    modules = [{'id': 'a', 'position': [0, 0, 0]}, {'id': 'b', 'position': [0, 0, 0]}]
+    assert decode_modules([row, ["b", 1, 2, 3]], modules) == [{'id': 'b', 'position': [1.0, 2.0, 3.0]}]
+
+
+def test_expand_tolerates_a_modules_field_that_is_not_a_list():
+    result = expand_optimization_result({"modules": 5, "changes": ["x"]}, [{'id': 'a'}], {})
+    assert result["optimizedLayout"]["modules"] == []
+    assert result["optimizedLayout"]["changes"] == ["x"]
+
+
+def test_ai_reply_with_bad_module_rows_is_rejected_not_a_server_error(bot_main, monkeypatch):
+    modules = [{'id': 'a', 'type': 'sleep', 'position': [0, 0, 0]}, {'id': 'b', 'type': 'food', 'position': [2, 0, 0]}]
+    rows = [[m['id'], None, None, None] for m in bot_main.ensure_essential_modules(modules, {})]
+    rows[-1][1] = "left"
+    monkeypatch.setattr(bot_main.genai, 'reply', json.dumps({"modules": rows, "changes": []}))
+    response = bot_main.app.test_client().post("/optimize_habitat_ai", json={"modules": modules, "habitatConfig": {}})
+    assert response.status_code == 422
+    assert "expected" in response.get_json()["error"]
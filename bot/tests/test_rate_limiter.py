@@ -0,0 +1,73 @@
+import pytest
+
+from rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_min_interval_between_calls():
+    clock = FakeClock()
+    limiter = RateLimiter(min_interval=2, max_per_hour=100, clock=clock)
+    assert limiter.try_acquire() == (True, 0.0)
+    allowed, wait = limiter.try_acquire()
+    assert not allowed
+    assert wait == pytest.approx(2)
+    clock.now += 1.5
+    assert limiter.try_acquire()[1] == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.try_acquire()[0]
+
+
+def test_hourly_quota_slides():
+    clock = FakeClock()
+    limiter = RateLimiter(min_interval=0, max_per_hour=3, clock=clock)
+    for _ in range(3):
+        assert limiter.try_acquire()[0]
+        clock.now += 10
+    allowed, wait = limiter.try_acquire()
+    assert not allowed
+    assert wait == pytest.approx(3600 - 30)
+    clock.now += wait
+    assert limiter.try_acquire()[0]
+    assert limiter.status()['remaining_calls'] == 0
+
+
+def test_per_client_buckets():
+    clock = FakeClock()
+    limiter = RateLimiter(min_interval=0, max_per_hour=100, client_interval=5, max_clients=2, clock=clock)
+    assert limiter.try_acquire('a')[0]
+    assert not limiter.try_acquire('a')[0]
+    assert limiter.try_acquire('b')[0]
+    assert limiter.try_acquire()[0]
+    # A third client pushes out the least recently seen one
+    assert limiter.try_acquire('c')[0]
+    assert 'a' not in limiter.client_buckets
+    assert limiter.try_acquire('a')[0]
+
+
+def test_wait_time_takes_nothing():
+    clock = FakeClock()
+    limiter = RateLimiter(min_interval=2, max_per_hour=100, clock=clock)
+    assert limiter.wait_time() == 0
+    assert limiter.wait_time() == 0
+    assert limiter.try_acquire()[0]
+    assert limiter.wait_time() == pytest.approx(2)
+    assert limiter.status()['granted'] == 1
+    assert limiter.status()['denied'] == 0
+
+
+def test_denials_are_counted():
+    clock = FakeClock()
+    limiter = RateLimiter(min_interval=10, max_per_hour=100, clock=clock)
+    limiter.try_acquire()
+    limiter.try_acquire()
+    limiter.try_acquire()
+    assert limiter.status()['granted'] == 1
+    assert limiter.status()['denied'] == 2
+    assert limiter.status()['next_call_in_seconds'] == pytest.approx(10)
@@ -0,0 +1,84 @@
+import pytest
+
+import result_cache
+from result_cache import ResultCache, design_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', fake)
+    return fake
+
+
+def test_design_key_ignores_key_order_and_color():
+    a = {'modules': [{'id': 'a', 'type': 'sleep', 'color': '#fff'}], 'habitatConfig': {'radius': 5, 'height': 10}}
+    b = {'habitatConfig': {'height': 10, 'radius': 5}, 'modules': [{'type': 'sleep', 'id': 'a', 'color': '#000'}]}
+    assert design_key('validate', a) == design_key('validate', b)
+    assert design_key('validate', a) != design_key('optimize', a)
+    assert design_key('validate', a) != design_key('validate', {**a, 'habitatConfig': {'radius': 6, 'height': 10}})
+
+
+def test_get_counts_hits_and_misses(clock):
+    cache = ResultCache()
+    assert cache.get('k') is None
+    cache.set('k', {'score': 90})
+    assert cache.get('k') == {'score': 90}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_entries_expire(clock):
+    cache = ResultCache(ttl=10)
+    cache.set('k', 1)
+    cache.set('short', 2, ttl=1)
+    clock.now += 5
+    assert cache.get('short') is None
+    assert cache.get('k') == 1
+    clock.now += 5
+    assert not cache.contains('k')
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResultCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_size_bound(clock):
+    cache = ResultCache(max_bytes=20)
+    cache.set('big', 'x' * 50)
+    assert not cache.contains('big')
+    cache.set('a', 'x' * 9)
+    cache.set('b', 'y' * 9)
+    assert not cache.contains('a')
+    assert cache.contains('b')
+    assert cache.stats()['bytes'] <= 20
+
+
+def test_contains_is_a_peek(clock):
+    cache = ResultCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.contains('a')
+    cache.set('c', 3)
+    # contains() did not refresh 'a', so it was the one evicted
+    assert not cache.contains('a')
+    assert cache.stats()['hits'] == 0
+    assert cache.stats()['misses'] == 0
@@ -0,0 +1,96 @@
+import random
+import threading
+
+import pytest
+
+from scoring import ScoreState, calculate_compliance_score
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_incremental_edits_match_full_rescore(seed, random_module):
+    rng = random.Random(seed)
+    spread = rng.choice([3, 6, 15])
+    config = {'radius': rng.choice([5, 8, 12]), 'height': rng.choice([6, 10]),
+              'mission': {'crewSize': rng.randint(1, 5)}}
+    modules = [random_module(rng, i, spread) for i in range(rng.randint(0, 25))]
+    state = ScoreState([dict(m) for m in modules], config)
+    assert state.score() == calculate_compliance_score(modules, config)
+
+    next_id = len(modules)
+    for _ in range(15):
+        op = rng.choice(['add', 'move', 'remove']) if modules else 'add'
+        if op == 'add':
+            module = random_module(rng, next_id, spread)
+            next_id += 1
+            state.apply('add', dict(module))
+            modules.append(module)
+        elif op == 'move':
+            k = rng.randrange(len(modules))
+            edit = {'id': modules[k]['id'], 'position': [rng.uniform(-spread, spread) for _ in range(3)]}
+            if rng.random() < 0.3:
+                edit['size'] = [rng.uniform(0.5, 6) for _ in range(3)]
+            state.apply('move', edit)
+            modules[k] = {**modules[k], **edit}
+        else:
+            k = rng.randrange(len(modules))
+            state.apply('remove', {'id': modules[k]['id']})
+            modules.pop(k)
+        assert state.score() == calculate_compliance_score(modules, config)
+
+
+def test_unknown_module_is_rejected():
+    state = ScoreState([{'id': 'a', 'type': 'sleep', 'position': [0, 0, 0]}], {'radius': 5, 'height': 10})
+    with pytest.raises((KeyError, ValueError)):
+        state.apply('move', {'id': 'missing', 'position': [1, 0, 0]})
+
+
+def test_concurrent_edits_under_the_state_lock(random_module):
+    rng = random.Random(0)
+    modules = [random_module(rng, i, 6) for i in range(20)]
+    config = {'radius': 8, 'height': 10}
+    state = ScoreState([dict(m) for m in modules], config)
+    moves = [[{'id': f'm{i}', 'position': [rng.uniform(-6, 6) for _ in range(3)]} for i in range(20)]
+             for _ in range(4)]
+
+    def edit(batch):
+        for move in batch:
+            with state.lock:
+                state.apply('move', move)
+                state.score()
+
+    threads = [threading.Thread(target=edit, args=(batch,)) for batch in moves]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state.score() == calculate_compliance_score(state.modules, config)
+
+
+@pytest.mark.parametrize("op, module", [
+    ('move', {'id': 'm0', 'position': None}),
+    ('move', {'id': 'm0', 'position': [1, 2, 3, 4]}),
+    ('move', {'id': 'm0', 'rotation': [0, 1]}),
+    ('move', {'id': 'm0', 'position': [1, 'x', 2]}),
+    ('move', {'id': 'm0', 'position': [1, float('nan'), 2]}),
+    ('move', {'id': 'm0', 'size': None}),
+    ('move', {'position': [1, 2, 3]}),
+    ('move', {'id': ['m0'], 'position': [1, 2, 3]}),
+    ('remove', {}),
+    ('add', {'id': 'new', 'position': 'here'}),
+    ('add', {'id': {'a': 1}}),
+    ('move', ['m0', 1, 2, 3]),
+    ('rotate', {'id': 'm0'}),
+    (None, {'id': 'm0'}),
+])
+def test_malformed_edits_are_a_400_and_leave_the_state_alone(bot_main, op, module):
+    client = bot_main.app.test_client()
+    design = {'modules': [{'id': 'm0', 'type': 'sleep', 'position': [0, 0, 0]},
+                          {'id': 'm1', 'type': 'food', 'position': [1, 0, 0]}],
+              'habitatConfig': {'radius': 5, 'height': 10}}
+    first = client.post("/score_delta", json=design).get_json()
+    response = client.post("/score_delta", json={'stateId': first['stateId'], 'op': op, 'module': module})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith("Invalid edit")
+    unchanged = client.post("/score_delta", json={'stateId': first['stateId'], 'op': 'move',
+                                                  'module': {'id': 'm0', 'position': [0, 0, 0]}})
+    assert unchanged.get_json()['validation'] == first['validation']
@@ -0,0 +1,78 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import scoring
+from scoring import LayoutScorer, ScoreState, calculate_compliance_score
+
+
+def reference_adjacency(modules):
+    """Adjacency issues exactly as the original per-pair loop found them"""
+    issues = []
+    for module in modules:
+        mod_type = module.get('type')
+        position = module.get('position', [0, 0, 0])
+        forbidden = scoring.FORBIDDEN_ADJACENCIES.get(mod_type, [])
+        for other in modules:
+            if other.get('type') in forbidden:
+                other_pos = other.get('position', [0, 0, 0])
+                distance = math.sqrt(sum((a - b) ** 2 for a, b in zip(position, other_pos)))
+                if distance < 4:
+                    issues.append(f"{mod_type} too close to {other.get('type')}")
+    return issues
+
+
+def short_layout(random_layout, rng, count, spread):
+    """Unsized modules, with a third of the positions short or missing"""
+    return random_layout(rng, count, spread=spread, sized=0, turned=0, short=0.4)
+
+
+def adjacency_issues(issues):
+    return [issue for issue in issues if ' too close to ' in issue]
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_adjacency_matches_original_loop(seed, random_layout):
+    rng = random.Random(seed)
+    modules = short_layout(random_layout, rng, rng.randint(0, 30), rng.choice([2, 5, 12]))
+    _, issues = calculate_compliance_score(modules, {'radius': 8, 'height': 10})
+    assert adjacency_issues(issues) == reference_adjacency(modules)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_grid_path_matches_dense_path(seed, monkeypatch, random_layout):
+    rng = random.Random(seed)
+    modules = short_layout(random_layout, rng, 150, 20)
+    scorer = LayoutScorer(modules, {'radius': 8, 'height': 10})
+    positions = scoring.adjacency_positions(modules)
+    dense = scorer.violations(positions)
+    monkeypatch.setattr(scoring, 'GRID_PAIR_THRESHOLD', 0)
+    grid = scorer.violations(positions)
+    assert dense[0].tolist() == grid[0].tolist()
+    assert dense[1].tolist() == grid[1].tolist()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_state_with_short_positions(seed, random_layout):
+    rng = random.Random(seed)
+    config = {'radius': 8, 'height': 10}
+    modules = short_layout(random_layout, rng, rng.randint(1, 20), 5)
+    state = ScoreState([dict(m) for m in modules], config)
+    assert state.score() == calculate_compliance_score(modules, config)
+    for _ in range(10):
+        k = rng.randrange(len(modules))
+        edit = {'id': modules[k]['id'], 'position': short_layout(random_layout, rng, 1, 5)[0].get('position', [])}
+        state.apply('move', edit)
+        modules[k] = {**modules[k], **edit}
+        assert state.score() == calculate_compliance_score(modules, config)
+
+
+def test_score_batch_matches_score(random_layout):
+    rng = random.Random(7)
+    modules = short_layout(random_layout, rng, 20, 6)
+    scorer = LayoutScorer(modules, {'radius': 8, 'height': 10})
+    batch = [[[rng.uniform(-6, 6) for _ in range(3)] for _ in modules] for _ in range(4)]
+    expected = [scorer.score(np.asarray(layout, dtype=float))[0] for layout in batch]
+    assert scorer.score_batch(batch).tolist() == expected
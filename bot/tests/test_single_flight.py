@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, count, results):
+    def call():
+        try:
+            results.append(flight.do(key, fn, timeout=5))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_for_waiters(flight, key, count):
+    while True:
+        with flight.lock:
+            call = flight.calls.get(key)
+            if call is not None and call.waiters == count:
+                return
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        release.wait(5)
+        return {'score': 90}
+
+    results = []
+    threads = run_concurrently(flight, 'k', work, 5, results)
+    wait_for_waiters(flight, 'k', 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(runs) == 1
+    assert all(result[0] == {'score': 90} for result in results)
+    assert sorted(result[1] for result in results) == [False, True, True, True, True]
+    assert flight.stats() == {'inFlight': 0, 'executions': 1, 'shared': 4}
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        raise RuntimeError("quota")
+
+    results = []
+    threads = run_concurrently(flight, 'k', work, 3, results)
+    wait_for_waiters(flight, 'k', 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_nothing_is_remembered_after_completion():
+    flight = SingleFlight()
+    assert flight.do('k', lambda: 1) == (1, False)
+    assert flight.do('k', lambda: 2) == (2, False)
+    assert flight.stats()['executions'] == 2
+
+
+def test_waiter_times_out():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=('k', lambda: release.wait(5)))
+    leader.start()
+    while not flight.stats()['inFlight']:
+        time.sleep(0.001)
+    with pytest.raises(TimeoutError):
+        flight.do('k', lambda: None, timeout=0.01)
+    release.set()
+    leader.join()
@@ -0,0 +1,77 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from spatial_index import SpatialHashGrid, neighbor_pairs
+
+
+def random_points(rng, count, spread=10.0):
+    return [(rng.uniform(-spread, spread), rng.uniform(-spread, spread), rng.uniform(-spread, spread))
+            for _ in range(count)]
+
+
+def brute_force_within(points_a, points_b, radius):
+    return {(i, j) for i, a in enumerate(points_a) for j, b in enumerate(points_b) if math.dist(a, b) < radius}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_query_radius_matches_brute_force(seed):
+    rng = random.Random(seed)
+    points = random_points(rng, 80)
+    cell_size = rng.uniform(0.5, 4.0)
+    grid = SpatialHashGrid(cell_size)
+    for key, point in enumerate(points):
+        grid.insert(key, point)
+    for _ in range(20):
+        center = random_points(rng, 1, spread=12.0)[0]
+        radius = rng.uniform(0.1, 3 * cell_size)
+        expected = {key for key, point in enumerate(points) if math.dist(center, point) < radius}
+        assert set(grid.query_radius(center, radius)) == expected
+
+
+def test_insert_moves_and_remove_drops_points():
+    grid = SpatialHashGrid(1.0)
+    grid.insert('a', (0, 0, 0))
+    grid.insert('a', (5, 5, 5))
+    assert len(grid) == 1 and 'a' in grid
+    assert grid.query_radius((0, 0, 0), 1.0) == []
+    assert grid.query_radius((5, 5, 5), 0.5) == ['a']
+    grid.remove('a')
+    grid.remove('missing')
+    assert len(grid) == 0 and grid.cells == {}
+
+
+def test_query_radius_is_strict():
+    grid = SpatialHashGrid(1.0)
+    grid.insert('a', (2, 0, 0))
+    assert grid.query_radius((0, 0, 0), 2.0) == []
+    assert grid.query_radius((0, 0, 0), 2.0001) == ['a']
+
+
+def test_cell_size_must_be_positive():
+    with pytest.raises(ValueError):
+        SpatialHashGrid(0)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_neighbor_pairs_cover_brute_force_and_are_sorted(seed):
+    rng = random.Random(seed)
+    points_a = random_points(rng, rng.randint(1, 60))
+    points_b = random_points(rng, rng.randint(1, 60))
+    radius = rng.uniform(0.5, 5.0)
+    pair_i, pair_j = neighbor_pairs(points_a, points_b, radius)
+    candidates = list(zip(pair_i.tolist(), pair_j.tolist()))
+    assert candidates == sorted(set(candidates))
+    assert brute_force_within(points_a, points_b, radius) <= set(candidates)
+    # Candidates only come from neighboring cells, so they stay within the cell diagonal
+    for i, j in candidates:
+        assert math.dist(points_a[i], points_b[j]) < 2 * math.sqrt(3) * radius
+
+
+def test_neighbor_pairs_of_empty_inputs():
+    pair_i, pair_j = neighbor_pairs([], [(0, 0, 0)], 1.0)
+    assert len(pair_i) == len(pair_j) == 0
+    pair_i, pair_j = neighbor_pairs(np.zeros((2, 3)), np.zeros((0, 3)), 1.0)
+    assert len(pair_i) == len(pair_j) == 0
@@ -0,0 +1,73 @@
+import json
+import time
+import types
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+
+DESIGN = {'modules': [{'id': 'a', 'type': 'sleep', 'position': [0, 0, 0]}], 'habitatConfig': {}}
+REPLY = '{"validation": {"overallScore": 75, "issues": [], "recommendations": []}, "analysis": {}}'
+
+
+class QuotaError(Exception):
+    code = 429
+
+
+class FakeClient:
+    """Streams the given chunks, then raises error if one is given"""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def stream(self, prompt, deadline, **kwargs):
+        yield from self.chunks
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture
+def stream(bot_main, monkeypatch):
+    monkeypatch.setattr(bot_main, 'gemini_breaker', CircuitBreaker())
+    monkeypatch.setattr(bot_main, 'ensure_llm_sessions', lambda endpoint: True)
+
+    def run(client):
+        monkeypatch.setattr(bot_main, 'llm_client', client)
+        with bot_main.app.test_request_context():
+            events = list(bot_main.stream_validation(DESIGN, f'stream-{time.monotonic()}', time.monotonic() + 5))
+        return json.loads(events[-1].split("data: ", 1)[1])
+    return run
+
+
+def fallbacks(bot_main, reason):
+    return bot_main.fallback_counter.values().get(("validate_habitat_stream", reason), 0)
+
+
+def test_streamed_reply_records_token_usage(bot_main, stream):
+    usage = types.SimpleNamespace(prompt_token_count=321, candidates_token_count=12)
+    chunks = [types.SimpleNamespace(text=REPLY[:20]), types.SimpleNamespace(text=REPLY[20:], usage_metadata=usage)]
+    before = bot_main.token_ledger.stats()["requests"]
+    assert stream(FakeClient(chunks))["source"] == "ai"
+    stats = bot_main.token_ledger.stats()
+    assert stats["requests"] == before + 1
+    entry = stats["recent"][-1]
+    assert entry["endpoint"] == "validate_habitat_stream"
+    assert (entry["promptTokens"], entry["responseTokens"], entry["estimated"]) == (321, 12, False)
+
+
+def test_streamed_reply_without_usage_is_estimated(bot_main, stream):
+    assert stream(FakeClient([types.SimpleNamespace(text=REPLY)]))["source"] == "ai"
+    entry = bot_main.token_ledger.stats()["recent"][-1]
+    assert entry["endpoint"] == "validate_habitat_stream"
+    assert entry["estimated"] and entry["responseTokens"] > 0
+
+
+@pytest.mark.parametrize("error, reason", [(QuotaError("quota exceeded"), "api_quota"),
+                                           (RuntimeError("boom"), "api_error")])
+def test_stream_failures_are_counted_like_non_streaming_calls(bot_main, stream, error, reason):
+    before = fallbacks(bot_main, reason)
+    requests = bot_main.token_ledger.stats()["requests"]
+    assert stream(FakeClient([types.SimpleNamespace(text='{"valid')], error))["source"] == "fallback"
+    assert fallbacks(bot_main, reason) == before + 1
+    assert bot_main.token_ledger.stats()["requests"] == requests
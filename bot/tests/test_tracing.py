@@ -0,0 +1,95 @@
+import threading
+import time
+
+from tracing import Trace, TraceBuffer, current_trace, end_trace, span, start_trace
+
+
+def test_spans_are_recorded_on_the_current_trace():
+    trace, token = start_trace("POST /validate_habitat")
+    try:
+        assert current_trace() is trace
+        with span("parse", attempt=1):
+            time.sleep(0.002)
+        with span("parse"):
+            pass
+    finally:
+        end_trace(token)
+    assert current_trace() is None
+    assert [s["name"] for s in trace.spans] == ["parse", "parse"]
+    assert trace.spans[0]["attributes"] == {"attempt": 1} and "attributes" not in trace.spans[1]
+    assert trace.spans[0]["durationMs"] >= 2
+    assert trace.breakdown()["parse"] == round(sum(s["durationMs"] for s in trace.spans), 3)
+
+
+def test_span_outside_a_trace_is_a_no_op():
+    with span("orphan"):
+        pass
+    assert current_trace() is None
+
+
+def test_failed_blocks_still_close_their_span():
+    trace, token = start_trace("t")
+    try:
+        with span("gemini"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    finally:
+        end_trace(token)
+    assert [s["name"] for s in trace.spans] == ["gemini"]
+
+
+def test_threads_keep_their_own_traces():
+    seen = {}
+
+    def worker(name):
+        trace, token = start_trace(name)
+        with span(f"{name}-work"):
+            time.sleep(0.001)
+        seen[name] = [s["name"] for s in current_trace().spans]
+        end_trace(token)
+
+    threads = [threading.Thread(target=worker, args=(f"t{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seen == {f"t{i}": [f"t{i}-work"] for i in range(8)}
+
+
+def test_server_timing_lists_each_span_name_and_the_total():
+    trace = Trace("t")
+    trace.add_span("cache lookup", trace.started, trace.started + 0.001)
+    trace.add_span("gemini", trace.started, trace.started + 0.25)
+    trace.finish()
+    entries = trace.server_timing().split(", ")
+    assert entries[:2] == ["cache_lookup;dur=1.0", "gemini;dur=250.0"]
+    assert entries[2].startswith("total;dur=")
+
+
+def test_buffer_keeps_slow_and_forced_traces_newest_first():
+    buffer = TraceBuffer(capacity=2, slow_ms=100)
+    fast, slow, forced, latest = (Trace(name) for name in ("fast", "slow", "forced", "latest"))
+    for trace, ms in ((fast, 5), (slow, 150), (forced, 1), (latest, 300)):
+        trace.duration_ms = ms
+    assert not buffer.offer(fast)
+    assert buffer.offer(slow)
+    assert buffer.offer(forced, force=True)
+    assert buffer.offer(latest)
+    assert [t["name"] for t in buffer.recent()] == ["latest", "forced"]
+    assert [t["name"] for t in buffer.recent(min_ms=100)] == ["latest"]
+    assert buffer.stats() == {"buffered": 2, "capacity": 2, "recorded": 3, "slowMs": 100}
+
+
+def test_debug_header_returns_timings_and_keeps_the_trace(bot_main):
+    client = bot_main.app.test_client()
+    design = {'modules': [{'id': 'a', 'type': 'sleep', 'position': [0, 0, 0]}], 'habitatConfig': {}}
+    response = client.post("/score_delta", json=design, headers={"X-Debug-Trace": "1"})
+    trace_id = response.headers["X-Trace-Id"]
+    assert "total;dur=" in response.headers["Server-Timing"]
+    traces = client.get(f"/debug/traces?id={trace_id}").get_json()["traces"]
+    assert len(traces) == 1
+    assert traces[0]["attributes"] == {"route": "/score_delta", "status": 200}
+
+    plain = client.post("/score_delta", json=design)
+    assert "X-Trace-Id" not in plain.headers
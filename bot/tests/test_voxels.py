@@ -0,0 +1,85 @@
+import math
+import random
+
+import pytest
+
+from geometry import Shell
+from voxels import OccupancyGrid, ShellGrid, shell_grid
+
+CONFIG = {'radius': 5, 'height': 10, 'mission': {'crewSize': 4}}
+
+
+def box(i, position, size=(2, 2, 2), rotation=None):
+    module = {'id': f'm{i}', 'type': 'storage', 'position': list(position), 'size': list(size)}
+    if rotation is not None:
+        module['rotation'] = list(rotation)
+    return module
+
+
+def test_shell_volume_matches_the_capsule():
+    grid = ShellGrid(Shell(5, 10))
+    capsule = math.pi * 5 ** 2 * 10 + 4 / 3 * math.pi * 5 ** 3
+    assert grid.volume == pytest.approx(capsule, rel=0.02)
+
+
+def test_grid_is_coarsened_to_the_cell_budget():
+    grid = ShellGrid(Shell(5, 10), resolution=0.1, max_voxels=10_000)
+    assert grid.resolution > 0.1
+    assert grid.dims.prod() <= 10_000
+
+
+def test_shell_grids_are_cached_per_dimensions():
+    assert shell_grid(CONFIG) is shell_grid({'radius': 5, 'height': 10})
+    assert shell_grid(CONFIG) is not shell_grid({'radius': 6, 'height': 10})
+
+
+def test_aligned_box_on_voxel_boundaries_is_exact():
+    occupancy = OccupancyGrid(CONFIG, [box(0, (0, 0, 0))])
+    stats = occupancy.stats()
+    assert stats["usedVolume"] == 8.0
+    assert stats["overlapVolume"] == 0.0
+    assert occupancy.free_volume == pytest.approx(occupancy.grid.volume - 8.0)
+    assert occupancy.free_volume_per_crew() == pytest.approx(occupancy.free_volume / 4)
+
+
+def test_overlapping_boxes_count_their_shared_volume_once():
+    stats = OccupancyGrid(CONFIG, [box(0, (0, 0, 0)), box(1, (1, 0, 0))]).stats()
+    assert stats["usedVolume"] == 12.0
+    assert stats["overlapVolume"] == 4.0
+
+
+def test_rotated_box_covers_about_its_volume():
+    stats = OccupancyGrid(CONFIG, [box(0, (0.1, 0.2, 0.3), size=(3, 2, 1), rotation=(0.4, 0.7, 0.2))]).stats()
+    assert stats["usedVolume"] == pytest.approx(6.0, rel=0.1)
+
+
+def test_volume_outside_the_shell_is_not_used():
+    stats = OccupancyGrid(CONFIG, [box(0, (0, 0, 20)), box(1, (0, 0, 5))]).stats()
+    # Only the half of the second box below z = 5 can be inside the shell
+    assert 0 < stats["usedVolume"] <= 4.0
+
+
+def test_pointlike_modules_use_no_volume():
+    occupancy = OccupancyGrid(CONFIG, [{'id': 'a', 'type': 'sleep', 'position': [0, 0, 0]}])
+    assert occupancy.used == 0
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_incremental_updates_match_a_fresh_grid(seed, random_layout):
+    rng = random.Random(seed)
+    modules = random_layout(rng, 12, spread=6, any_angle=True)
+    occupancy = OccupancyGrid(CONFIG)
+    for k, module in enumerate(modules):
+        occupancy.place(k, module)
+    assert occupancy.stats() == OccupancyGrid(CONFIG, modules).stats()
+    for _ in range(20):
+        k = rng.randrange(len(modules))
+        if rng.random() < 0.2:
+            occupancy.remove(k)
+            modules[k] = {'id': modules[k]['id'], 'type': modules[k]['type']}
+        else:
+            modules[k] = {**modules[k], 'position': [rng.uniform(-6, 6) for _ in range(3)]}
+            occupancy.place(k, modules[k])
+        fresh = OccupancyGrid(CONFIG, modules)
+        assert occupancy.stats() == fresh.stats()
+        assert (occupancy.counts == fresh.counts).all()
@@ -0,0 +1,119 @@
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    """Timed spans for one request, relative to when the request started"""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.duration_ms = None
+        self.attributes = {}
+
+    def add_span(self, name, started, ended, **attributes):
+        span = {
+            "name": name,
+            "startMs": round((started - self.started) * 1000, 3),
+            "durationMs": round((ended - started) * 1000, 3),
+        }
+        if attributes:
+            span["attributes"] = attributes
+        self.spans.append(span)
+
+    def finish(self, **attributes):
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 3)
+        self.attributes.update(attributes)
+        return self
+
+    def breakdown(self):
+        """Total milliseconds per span name"""
+        totals = {}
+        for span in self.spans:
+            totals[span["name"]] = round(totals.get(span["name"], 0.0) + span["durationMs"], 3)
+        return totals
+
+    def server_timing(self):
+        """Server-Timing header value, one entry per span name plus the total"""
+        entries = [f"{name.replace(' ', '_')};dur={ms}" for name, ms in self.breakdown().items()]
+        if self.duration_ms is not None:
+            entries.append(f"total;dur={self.duration_ms}")
+        return ", ".join(entries)
+
+    def to_dict(self):
+        return {
+            "traceId": self.id,
+            "name": self.name,
+            "startedAt": self.started_at,
+            "durationMs": self.duration_ms,
+            "attributes": self.attributes,
+            "breakdown": self.breakdown(),
+            "spans": list(self.spans),
+        }
+
+
+def start_trace(name):
+    """Make a new trace current for this thread or context, returns the trace and a reset token"""
+    trace = Trace(name)
+    return trace, _current.set(trace)
+
+
+def end_trace(token):
+    _current.reset(token)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block as a span of the current trace; a no-op outside a trace"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, started, time.perf_counter(), **attributes)
+
+
+class TraceBuffer:
+    """Most recent slow or explicitly requested traces, oldest dropped first"""
+
+    def __init__(self, capacity=100, slow_ms=1000.0):
+        self.traces = deque(maxlen=capacity)
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()
+        self.recorded = 0
+
+    def offer(self, trace, force=False):
+        """Keep the trace if it was slow or force is set, returns whether it was kept"""
+        if not force and (trace.duration_ms is None or trace.duration_ms < self.slow_ms):
+            return False
+        with self.lock:
+            self.traces.append(trace.to_dict())
+            self.recorded += 1
+        return True
+
+    def recent(self, limit=None, min_ms=0.0):
+        with self.lock:
+            traces = [t for t in self.traces if (t["durationMs"] or 0) >= min_ms]
+        traces.reverse()
+        return traces[:limit] if limit else traces
+
+    def stats(self):
+        with self.lock:
+            return {"buffered": len(self.traces), "capacity": self.traces.maxlen,
+                    "recorded": self.recorded, "slowMs": self.slow_ms}
@@ -0,0 +1,200 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from geometry import OrientedBoxes, Shell
+
+# Voxel edge length in meters
+DEFAULT_RESOLUTION = float(os.getenv('VOXEL_RESOLUTION', '0.25'))
+# Large habitats are voxelized more coarsely so a grid never exceeds this many cells
+MAX_VOXELS = int(os.getenv('VOXEL_MAX_CELLS', str(1_000_000)))
+# Shell grids kept in memory, keyed by dimensions and resolution
+SHELL_CACHE_SIZE = 8
+
+
+class ShellGrid:
+    """Boolean voxel grid of the space inside a habitat shell
+
+    Voxel (i, j, k) is the cube whose centre is origin + (index + 0.5) *
+    resolution, and it is inside when its centre is inside the shell. The grid
+    is read-only once built, so one instance is shared by every layout in the
+    same habitat.
+    """
+
+    def __init__(self, shell, resolution=DEFAULT_RESOLUTION, max_voxels=MAX_VOXELS):
+        self.shell = shell
+        half = shell.half_extents
+        # Coarsen until the grid fits the cell budget
+        resolution = max(float(resolution), float(np.cbrt(np.prod(2 * half) / max_voxels)))
+        # Each axis rounds up to whole voxels, which can still overshoot the budget
+        while np.prod(np.maximum(np.ceil(2 * half / resolution), 1)) > max_voxels:
+            resolution *= 1.01
+        self.resolution = resolution
+        self.voxel_volume = resolution ** 3
+        self.dims = np.maximum(np.ceil(2 * half / resolution).astype(int), 1)
+        self.origin = -self.dims * resolution / 2
+        self.axes = [self.origin[a] + (np.arange(self.dims[a]) + 0.5) * resolution for a in range(3)]
+        x, y, z = np.meshgrid(*self.axes, indexing='ij', sparse=True)
+        self.inside = shell.distance(np.stack(np.broadcast_arrays(x, y, z), axis=-1)) <= 0
+        self.inside.flags.writeable = False
+        self.inside_count = int(np.count_nonzero(self.inside))
+
+    @property
+    def volume(self):
+        return self.inside_count * self.voxel_volume
+
+    def footprints(self, boxes):
+        """Voxels covered by each box as (slices, mask), or None for a box that misses the grid
+
+        mask is None when the box is aligned with the grid axes, since then the
+        covered voxels are exactly the block the slices select.
+        """
+        low = (boxes.centers - boxes.extents - self.origin) / self.resolution
+        high = (boxes.centers + boxes.extents - self.origin) / self.resolution
+        # Aligned boxes get the exact range of voxel centres within their extent
+        aligned = boxes.aligned[:, None]
+        low = np.where(aligned, np.ceil(low - 0.5), np.floor(low)).astype(int)
+        high = np.where(aligned, np.floor(high - 0.5) + 1, np.ceil(high)).astype(int)
+        low, high = np.maximum(low, 0), np.minimum(high, self.dims)
+        found = []
+        for k, (box_low, box_high) in enumerate(zip(low.tolist(), high.tolist())):
+            if any(b <= a for a, b in zip(box_low, box_high)):
+                found.append(None)
+                continue
+            block = tuple(slice(a, b) for a, b in zip(box_low, box_high))
+            found.append((block, None) if boxes.aligned[k] else self._mask(boxes, k, block))
+        return found
+
+    def _mask(self, boxes, k, block):
+        center = boxes.centers[k]
+        dx = self.axes[0][block[0], None, None] - center[0]
+        dy = self.axes[1][None, block[1], None] - center[1]
+        dz = self.axes[2][None, None, block[2]] - center[2]
+        rotation = boxes.axes[k]
+        half = boxes.half_sizes[k]
+        mask = None
+        for axis in range(3):
+            # Voxel centre offset along the box's own axis
+            local = rotation[0, axis] * dx + rotation[1, axis] * dy + rotation[2, axis] * dz
+            within = np.abs(local) <= half[axis]
+            mask = within if mask is None else mask & within
+        if not mask.any():
+            return None
+        return block, mask
+
+
+_shell_cache = OrderedDict()
+_shell_cache_lock = threading.Lock()
+
+
+def shell_grid(habitat_config, resolution=DEFAULT_RESOLUTION):
+    """Cached ShellGrid for a habitat config; only the radius and height matter"""
+    shell = Shell.from_config(habitat_config)
+    key = (shell.radius, shell.height, float(resolution))
+    with _shell_cache_lock:
+        grid = _shell_cache.get(key)
+        if grid is not None:
+            _shell_cache.move_to_end(key)
+            return grid
+    grid = ShellGrid(shell, resolution)
+    with _shell_cache_lock:
+        _shell_cache[key] = grid
+        while len(_shell_cache) > SHELL_CACHE_SIZE:
+            _shell_cache.popitem(last=False)
+    return grid
+
+
+class OccupancyGrid:
+    """Per-voxel module counts over a cached shell grid, updated one module at a time
+
+    Each module's voxels are remembered under a caller-chosen key, so placing
+    a module again under the same key (a move or a resize) only touches the
+    old and new footprints. Used and overlapping voxel counts are kept
+    up to date on every change, so stats() never scans the grid.
+    """
+
+    def __init__(self, habitat_config, modules=(), resolution=DEFAULT_RESOLUTION, boxes=None):
+        self.grid = shell_grid(habitat_config, resolution)
+        self.crew_size = habitat_config.get('mission', {}).get('crewSize', 4)
+        self.counts = np.zeros(tuple(self.grid.dims), dtype=np.uint16)
+        self.footprints = {}
+        self.used = 0
+        self.overlapping = 0
+        if len(modules):
+            self._fill(boxes if boxes is not None else OrientedBoxes.from_modules(modules))
+
+    def _fill(self, boxes):
+        """Mark a whole layout under keys 0..n-1, counting used voxels once at the end"""
+        low, high = self.grid.dims, np.zeros(3, dtype=int)
+        for k, footprint in enumerate(self.grid.footprints(boxes)):
+            self.footprints[k] = footprint
+            if footprint is None:
+                continue
+            block, mask = footprint
+            self.counts[block] += 1 if mask is None else mask
+            low = np.minimum(low, [s.start for s in block])
+            high = np.maximum(high, [s.stop for s in block])
+        if np.any(high <= low):
+            return
+        # Only the block spanned by the modules can hold marked voxels
+        block = tuple(slice(int(a), int(b)) for a, b in zip(low, high))
+        counts, inside = self.counts[block], self.grid.inside[block]
+        self.used = int(np.count_nonzero((counts > 0) & inside))
+        self.overlapping = int(np.count_nonzero((counts > 1) & inside))
+
+    def _apply(self, footprint, step):
+        block, mask = footprint
+        counts = self.counts[block]
+        inside = self.grid.inside[block]
+        if mask is not None:
+            inside = inside & mask
+        before = counts[inside]
+        if step > 0:
+            self.used += int(np.count_nonzero(before == 0))
+            self.overlapping += int(np.count_nonzero(before == 1))
+        else:
+            self.used -= int(np.count_nonzero(before == 1))
+            self.overlapping -= int(np.count_nonzero(before == 2))
+        change = 1 if mask is None else mask
+        if step > 0:
+            counts += change
+        else:
+            counts -= change
+
+    def place(self, key, module, box=None):
+        """Add a module under key, replacing whatever was there before
+
+        box can be the module's OrientedBoxes when the caller already built it.
+        """
+        self.remove(key)
+        footprint = self.grid.footprints(box if box is not None else OrientedBoxes.from_modules([module]))[0]
+        if footprint is not None:
+            self._apply(footprint, 1)
+        self.footprints[key] = footprint
+
+    def remove(self, key):
+        """Drop the module stored under key, ignoring unknown keys"""
+        footprint = self.footprints.pop(key, None)
+        if footprint is not None:
+            self._apply(footprint, -1)
+
+    @property
+    def free_volume(self):
+        return (self.grid.inside_count - self.used) * self.grid.voxel_volume
+
+    def free_volume_per_crew(self):
+        return self.free_volume / self.crew_size if self.crew_size > 0 else 0
+
+    def stats(self):
+        """Volumes in m³, all measured inside the shell"""
+        voxel = self.grid.voxel_volume
+        return {
+            "resolutionM": round(self.grid.resolution, 4),
+            "shellVolume": round(self.grid.volume, 2),
+            "usedVolume": round(self.used * voxel, 2),
+            "freeVolume": round(self.free_volume, 2),
+            "overlapVolume": round(self.overlapping * voxel, 2),
+            "freeVolumePerCrew": round(self.free_volume_per_crew(), 2),
+        }